@@ -0,0 +1,145 @@
+import io
+import os
+import csv
+import json
+import mimetypes
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from agents.image_derivatives import fetch_source, render_derivatives, DERIVATIVES_DIR
+from agents.platform_agent import PLATFORMS, select_platforms
+from services.blob_store import get_image_store
+from services.metrics import timed
+
+# Images fetched (and their format crops rendered) ahead of the one being written to the archive
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "4"))
+EXPORT_FETCH_TIMEOUT = float(os.getenv("EXPORT_FETCH_TIMEOUT", "15"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def export_entries(campaign: dict, derivatives: bool = True):
+    """
+    ZIP entries (arcname, bytes or file path, compress) for stream_zip(): campaign.json, the copy
+    and variations as CSV, every image and, with `derivatives`, its crop in every format of the
+    campaign's platforms. Images are fetched EXPORT_CONCURRENCY at a time, each one while the
+    previous ones are being written, and copied from the image store on disk, never held in memory.
+    An image that cannot be fetched is left out and listed in manifest.json, the last entry.
+    """
+    platforms = select_platforms(list(campaign.get("platforms") or {}) or (campaign.get("brief") or {}).get("platforms"))
+    formats = [(key, f) for key in platforms for f in PLATFORMS[key].formats] if derivatives else []
+    sizes = list(dict.fromkeys((f.width, f.height) for _, f in formats))
+    files, skipped = [], []
+
+    yield "campaign.json", _json_bytes(_campaign_summary(campaign)), True
+    yield "copy.csv", _variations_csv(campaign), True
+    yield "platforms.csv", _platforms_csv(campaign), True
+    files += ["campaign.json", "copy.csv", "platforms.csv"]
+
+    prepared = _prepared_images(campaign.get("images") or [], sizes)
+    for position, (image, blob, rendered, error) in enumerate(prepared, 1):
+        stem = _image_stem(image, position)
+        if error:
+            skipped.append({"image": image.get("url"), "error": error})
+            continue
+        arcname = f"images/{stem}{_extension(blob['content_type'])}"
+        yield arcname, blob["path"], False
+        files.append(arcname)
+        for key, f in formats:
+            filename = rendered.get((f.width, f.height))
+            if filename:
+                arcname = f"formats/{key}/{stem}-{_slug(f.name)}-{f.width}x{f.height}{os.path.splitext(filename)[1]}"
+                yield arcname, os.path.join(DERIVATIVES_DIR, filename), False
+                files.append(arcname)
+
+    yield "manifest.json", _json_bytes({"files": files, "skipped": skipped}), True
+
+
+def _prepared_images(images: list, sizes: list):
+    """(image, blob, rendered, error) for each image in order, with at most EXPORT_CONCURRENCY in flight."""
+    executor = _get_executor()
+    pending = iter(images)
+    window = deque((image, executor.submit(_prepare_image, image, sizes))
+                   for image in islice(pending, EXPORT_CONCURRENCY))
+    while window:
+        image, future = window.popleft()
+        following = next(pending, None)
+        if following is not None:
+            window.append((following, executor.submit(_prepare_image, following, sizes)))
+        yield (image, *future.result())
+
+
+@timed("agent", agent="export_image")
+def _prepare_image(image: dict, sizes: list) -> tuple:
+    """Fetch one image into the image store and render its format crops: (blob, rendered, error)."""
+    try:
+        path = fetch_source(image["url"], timeout=EXPORT_FETCH_TIMEOUT)
+        meta = get_image_store().get(image["url"]) or {}
+        blob = {"path": path, "content_type": meta.get("content_type", "image/jpeg")}
+    except Exception as e:
+        print(f"Export fetch error: {e}, skipping image {image.get('index')}")
+        return None, {}, str(e)
+    rendered = {}
+    if sizes:
+        try:
+            rendered = render_derivatives(path, sizes)
+        except Exception as e:
+            print(f"Export rendering error: {e}, exporting the original only")
+    return blob, rendered, None
+
+
+def _campaign_summary(campaign: dict) -> dict:
+    summary = {k: campaign.get(k) for k in ("brief", "copy", "images", "variations", "platforms",
+                                              "seed", "content_hash", "catalog_version", "generated_at")
+               if campaign.get(k) is not None}
+    if "brief" in summary:
+        summary["brief"] = {k: v for k, v in summary["brief"].items() if not k.startswith("_")}
+    return summary
+
+
+def _variations_csv(campaign: dict) -> bytes:
+    """The primary copy and every tone variation, one row each."""
+    rows = campaign.get("variations") or [{**(campaign.get("copy") or {}), "is_primary": True}]
+    return _csv_bytes(["tone", "is_primary", "headline", "body", "cta"], rows)
+
+
+def _platforms_csv(campaign: dict) -> bytes:
+    """Each platform's adapted copy."""
+    rows = [{"platform": key, **(entry.get("adapted_copy") or {})}
+            for key, entry in (campaign.get("platforms") or {}).items()]
+    return _csv_bytes(["platform", "headline", "body", "cta"], rows)
+
+
+def _csv_bytes(fields: list, rows: list) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    # BOM so spreadsheet apps read the emoji and accents as UTF-8
+    return out.getvalue().encode("utf-8-sig")
+
+
+def _json_bytes(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _image_stem(image: dict, position: int) -> str:
+    return f"image-{position}" + (f"-{_slug(image['tone'])}" if image.get("tone") else "")
+
+
+def _slug(text: str) -> str:
+    return "-".join("".join(c if c.isalnum() else " " for c in text.lower()).split())
+
+
+def _extension(content_type: str) -> str:
+    return mimetypes.guess_extension(content_type.split(";")[0].strip()) or ".jpg"
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_CONCURRENCY, thread_name_prefix="export")
+        return _executor
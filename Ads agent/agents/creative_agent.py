@@ -1,12 +1,18 @@
 import os
 import json
-import random
-from dotenv import load_dotenv
+from config import config
+from services.cache import get_cache, make_key
+from agents.openai_client import call_openai, call_openai_async
+from services.metrics import timed, span
+from agents.seeding import seeded_random
 
-load_dotenv()
+DEMO_MODE = config.demo_mode
+OPENAI_API_KEY = config.openai_api_key
+# Send a second copy of a completion that has not answered after this many ms (0 = off)
+COPY_HEDGE_AFTER_MS = float(os.getenv("COPY_HEDGE_AFTER_MS", "0"))
 
-DEMO_MODE = os.getenv("DEMO_MODE", "true").lower() == "true"
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# Identical briefs produce identical prompts; cache completions by prompt hash
+_copy_cache = get_cache("copy")
 
 DEMO_COPY = {
     "professional": {
@@ -64,30 +70,42 @@ DEMO_COPY = {
 }
 
 
-def _fill_template(text, product_name, audience):
-    return text.replace("{product}", product_name).replace("{audience}", audience)
+def _compile_templates(copy: dict) -> dict:
+    """Bound str.format for every template, built once: {tone: {field: [format, ...]}}."""
+    return {
+        tone: {field: [text.format for text in options] for field, options in fields.items()}
+        for tone, fields in copy.items()
+    }
+
+
+DEMO_FORMATTERS = _compile_templates(DEMO_COPY)
 
 
+@timed("agent", agent="creative")
 def generate_copy(brief: dict) -> dict:
     """
     Creative Agent: Generates ad copy from a product brief.
     Uses OpenAI GPT-4 if available, otherwise returns demo copy.
     """
+    if not DEMO_MODE and OPENAI_API_KEY:
+        return _generate_copy_openai(brief)
+
+    return _generate_copy_demo(brief)
+
+
+def _generate_copy_demo(brief: dict) -> dict:
+    """Demo mode: return realistic mock copy, chosen by a seed derived from the brief."""
     product_name = brief.get("product_name", "Our Product")
-    description = brief.get("description", "")
     audience = brief.get("audience", "customers")
     tone = brief.get("tone", "professional")
 
-    if not DEMO_MODE and OPENAI_API_KEY:
-        return _generate_copy_openai(brief)
-
-    # Demo mode: return realistic mock copy
-    tone_key = tone if tone in DEMO_COPY else "professional"
-    copy_data = DEMO_COPY[tone_key]
+    tone_key = tone if tone in DEMO_FORMATTERS else "professional"
+    formatters = DEMO_FORMATTERS[tone_key]
+    rng = seeded_random(brief, "copy", tone_key)
 
-    headline = _fill_template(random.choice(copy_data["headline"]), product_name, audience)
-    body = _fill_template(random.choice(copy_data["body"]), product_name, audience)
-    cta = _fill_template(random.choice(copy_data["cta"]), product_name, audience)
+    headline = rng.choice(formatters["headline"])(product=product_name, audience=audience)
+    body = rng.choice(formatters["body"])(product=product_name, audience=audience)
+    cta = rng.choice(formatters["cta"])(product=product_name, audience=audience)
 
     return {
         "headline": headline,
@@ -99,31 +117,279 @@ def generate_copy(brief: dict) -> dict:
     }
 
 
+@timed("agent", agent="creative")
+async def generate_copy_async(brief: dict) -> dict:
+    """Creative Agent on the async OpenAI client: same output as generate_copy without blocking a thread."""
+    if not DEMO_MODE and OPENAI_API_KEY:
+        return await _generate_copy_openai_async(brief)
+
+    return _generate_copy_demo(brief)
+
+
+def _chat_request(prompt: str, key: str = None):
+    """request(client, timeout) for call_openai: one GPT-4 JSON completion of `prompt`, parsed."""
+    def request(client, timeout):
+        with span("provider", provider="openai-chat"):
+            response = client.chat.completions.create(**_chat_kwargs(prompt, timeout))
+        return _completion_json(response, key)
+    return request
+
+
+def _chat_request_async(prompt: str, key: str = None):
+    """_chat_request for call_openai_async."""
+    async def request(client, timeout):
+        with span("provider", provider="openai-chat"):
+            response = await client.chat.completions.create(**_chat_kwargs(prompt, timeout))
+        return _completion_json(response, key)
+    return request
+
+
+def _chat_kwargs(prompt: str, timeout: float) -> dict:
+    return {
+        "model": "gpt-4",
+        "messages": [{"role": "user", "content": prompt}],
+        "response_format": {"type": "json_object"},
+        "timeout": timeout
+    }
+
+
+def _completion_json(response, key: str = None) -> dict:
+    """The completion's JSON object; with `key`, it must hold an object under that key."""
+    data = json.loads(response.choices[0].message.content)
+    if key is not None and not isinstance(data.get(key), dict):
+        raise ValueError(f"completion has no '{key}' object")
+    return data
+
+
+def _copy_result(brief: dict, result: dict) -> dict:
+    result["product_name"] = brief.get("product_name")
+    result["audience"] = brief.get("audience")
+    return result
+
+
+def _copy_prompt(brief: dict) -> str:
+    return f"""You are an expert advertising copywriter. Generate compelling ad copy for:
+Product: {brief.get('product_name')}
+Description: {brief.get('description')}
+Target Audience: {brief.get('audience')}
+Tone: {brief.get('tone')}
+
+Return a JSON object with keys: headline, body, cta, tone, product_name, audience.
+Keep headline under 10 words, body under 50 words, cta under 5 words."""
+
+
 def _generate_copy_openai(brief: dict) -> dict:
     """Generate copy using OpenAI GPT-4."""
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        prompt = _copy_prompt(brief)
+        result = _copy_cache.get_or_compute(
+            make_key("gpt-4", prompt),
+            lambda: call_openai("chat", "copy", _chat_request(prompt), hedge_after=COPY_HEDGE_AFTER_MS / 1000),
+            bypass=brief.get("_no_cache", False)
+        )
+        return _copy_result(brief, result)
+    except Exception as e:
+        print(f"OpenAI error: {e}, falling back to demo mode")
+        return _generate_copy_demo(brief)
+
+
+async def _generate_copy_openai_async(brief: dict) -> dict:
+    """Generate copy using GPT-4 on the async client."""
+    try:
+        prompt = _copy_prompt(brief)
+        result = await _copy_cache.get_or_compute_async(
+            make_key("gpt-4", prompt),
+            lambda: call_openai_async("chat", "copy", _chat_request_async(prompt),
+                                      hedge_after=COPY_HEDGE_AFTER_MS / 1000),
+            bypass=brief.get("_no_cache", False)
+        )
+        return _copy_result(brief, result)
+    except Exception as e:
+        print(f"OpenAI error: {e}, falling back to demo mode")
+        return _generate_copy_demo(brief)
+
+
+@timed("agent", agent="creative_tones")
+def generate_copy_all_tones(brief: dict, tones: list = None) -> dict:
+    """
+    Creative Agent (multi-tone): Generates copy for every tone in one pass.
+    Returns a dict keyed by tone. In OpenAI mode all tones are packed into a single prompt.
+    """
+    tones = tones or list(DEMO_COPY.keys())
+
+    if not DEMO_MODE and OPENAI_API_KEY:
+        return _generate_tones_openai(brief, tones)
+
+    return {tone: _generate_copy_demo({**brief, "tone": tone}) for tone in tones}
+
+
+@timed("agent", agent="creative_tones")
+async def generate_copy_all_tones_async(brief: dict, tones: list = None) -> dict:
+    """generate_copy_all_tones on the async OpenAI client."""
+    tones = tones or list(DEMO_COPY.keys())
+
+    if not DEMO_MODE and OPENAI_API_KEY:
+        return await _generate_tones_openai_async(brief, tones)
+
+    return {tone: _generate_copy_demo({**brief, "tone": tone}) for tone in tones}
+
+
+# Expected shape of each tone variant in a multi-tone completion: field -> max characters
+VARIANT_SCHEMA = {"headline": 120, "body": 600, "cta": 60}
+
+
+def _valid_variant(variant) -> bool:
+    """Check a variant against VARIANT_SCHEMA: every field a non-empty string within its limit."""
+    if not isinstance(variant, dict):
+        return False
+    for field, max_len in VARIANT_SCHEMA.items():
+        value = variant.get(field)
+        if not isinstance(value, str) or not value.strip() or len(value) > max_len:
+            return False
+    return True
+
+
+def _generate_tones_openai(brief: dict, tones: list) -> dict:
+    """
+    Generate copy for several tones with one structured GPT-4 completion.
+    Tones whose variant fails schema validation fall back to demo copy.
+    """
+    try:
+        prompt = _tones_prompt(brief, tones)
+        data = _copy_cache.get_or_compute(
+            make_key("gpt-4", prompt),
+            lambda: call_openai("chat", "tones", _chat_request(prompt, "variations"),
+                                hedge_after=COPY_HEDGE_AFTER_MS / 1000),
+            bypass=brief.get("_no_cache", False)
+        )
+        return _tones_result(brief, tones, data)
+    except Exception as e:
+        print(f"OpenAI error: {e}, falling back to demo mode")
+        return {tone: _generate_copy_demo({**brief, "tone": tone}) for tone in tones}
+
 
-        prompt = f"""You are an expert advertising copywriter. Generate compelling ad copy for:
+async def _generate_tones_openai_async(brief: dict, tones: list) -> dict:
+    """_generate_tones_openai on the async client."""
+    try:
+        prompt = _tones_prompt(brief, tones)
+        data = await _copy_cache.get_or_compute_async(
+            make_key("gpt-4", prompt),
+            lambda: call_openai_async("chat", "tones", _chat_request_async(prompt, "variations"),
+                                      hedge_after=COPY_HEDGE_AFTER_MS / 1000),
+            bypass=brief.get("_no_cache", False)
+        )
+        return _tones_result(brief, tones, data)
+    except Exception as e:
+        print(f"OpenAI error: {e}, falling back to demo mode")
+        return {tone: _generate_copy_demo({**brief, "tone": tone}) for tone in tones}
+
+
+def _tones_prompt(brief: dict, tones: list) -> str:
+    return f"""You are an expert advertising copywriter. Generate compelling ad copy in several tones for:
 Product: {brief.get('product_name')}
 Description: {brief.get('description')}
 Target Audience: {brief.get('audience')}
-Tone: {brief.get('tone')}
+Tones: {', '.join(tones)}
 
-Return a JSON object with keys: headline, body, cta, tone, product_name, audience.
+Return a JSON object of the form {{"variations": {{"<tone>": {{"headline": "...", "body": "...", "cta": "..."}}}}}}
+with one entry for each tone listed above, all values plain strings.
 Keep headline under 10 words, body under 50 words, cta under 5 words."""
 
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
+
+@timed("agent", agent="creative_options")
+def generate_copy_options(brief: dict, tones: list = None, per_field: int = 3) -> dict:
+    """
+    Creative Agent (over-generation): alternative headlines, bodies and CTAs for each tone,
+    {tone: {"headline": [...], "body": [...], "cta": [...]}}, to be combined and ranked.
+    In OpenAI mode one completion asks for `per_field` options of each field for every tone;
+    demo mode returns every DEMO_COPY template.
+    """
+    tones = tones or list(DEMO_COPY.keys())
+
+    if not DEMO_MODE and OPENAI_API_KEY:
+        return _generate_options_openai(brief, tones, per_field)
+
+    return {tone: _demo_options(brief, tone) for tone in tones}
+
+
+def _demo_options(brief: dict, tone: str) -> dict:
+    formatters = DEMO_FORMATTERS.get(tone, DEMO_FORMATTERS["professional"])
+    values = {"product": brief.get("product_name", "Our Product"), "audience": brief.get("audience", "customers")}
+    return {field: [fmt(**values) for fmt in options] for field, options in formatters.items()}
+
+
+def _generate_options_openai(brief: dict, tones: list, per_field: int) -> dict:
+    """Copy options for several tones from one GPT-4 completion; tones without valid options use demo templates."""
+    try:
+        prompt = _options_prompt(brief, tones, per_field)
+        data = _copy_cache.get_or_compute(
+            make_key("gpt-4", prompt),
+            lambda: call_openai("chat", "options", _chat_request(prompt, "options")),
+            bypass=brief.get("_no_cache", False)
         )
-        result = json.loads(response.choices[0].message.content)
-        result["product_name"] = brief.get("product_name")
-        result["audience"] = brief.get("audience")
+        result = {}
+        for tone in tones:
+            options = _parse_options(data["options"].get(tone))
+            if options is None:
+                print(f"OpenAI options for tone '{tone}' failed validation, using demo copy")
+                options = _demo_options(brief, tone)
+            result[tone] = options
         return result
     except Exception as e:
         print(f"OpenAI error: {e}, falling back to demo mode")
-        brief_copy = dict(brief)
-        return generate_copy({**brief_copy, "_force_demo": True})
+        return {tone: _demo_options(brief, tone) for tone in tones}
+
+
+def _parse_options(entry) -> dict:
+    """
+    {field: [options]} from one tone's entry of an options completion, keeping the valid strings,
+    or None unless every field is a list with at least one valid option.
+    """
+    if not isinstance(entry, dict):
+        return None
+    options = {}
+    for field in VARIANT_SCHEMA:
+        values = entry.get(field)
+        if not isinstance(values, list):
+            return None
+        options[field] = [text.strip() for text in values if _valid_option(field, text)]
+        if not options[field]:
+            return None
+    return options
+
+
+def _valid_option(field: str, text) -> bool:
+    return isinstance(text, str) and bool(text.strip()) and len(text) <= VARIANT_SCHEMA[field]
+
+
+def _options_prompt(brief: dict, tones: list, per_field: int) -> str:
+    return f"""You are an expert advertising copywriter. Write alternative ad copy in several tones for:
+Product: {brief.get('product_name')}
+Description: {brief.get('description')}
+Target Audience: {brief.get('audience')}
+Option tones: {', '.join(tones)}
+Options per field: {per_field}
+
+Return a JSON object of the form {{"options": {{"<tone>": {{"headline": ["..."], "body": ["..."], "cta": ["..."]}}}}}}
+with one entry for each tone listed above and {per_field} distinct strings in each list.
+Keep headlines under 10 words, bodies under 50 words, ctas under 5 words."""
+
+
+def _tones_result(brief: dict, tones: list, data: dict) -> dict:
+    """Copy per tone from a multi-tone completion; invalid variants fall back to demo copy."""
+    result = {}
+    for tone in tones:
+        variant = data["variations"].get(tone)
+        if not _valid_variant(variant):
+            print(f"OpenAI variant for tone '{tone}' failed validation, using demo copy")
+            result[tone] = _generate_copy_demo({**brief, "tone": tone})
+            continue
+        result[tone] = {
+            "headline": variant["headline"].strip(),
+            "body": variant["body"].strip(),
+            "cta": variant["cta"].strip(),
+            "tone": tone,
+            "product_name": brief.get("product_name"),
+            "audience": brief.get("audience")
+        }
+    return result
@@ -1,11 +1,46 @@
 import os
-import random
-from dotenv import load_dotenv
+import asyncio
+import weakref
+import contextvars
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import config, env_flag
+from services.cache import get_cache, make_key
+from agents.openai_client import call_openai, call_openai_async
+from agents.image_derivatives import fetch_source
+from services.metrics import timed, span
+from agents.seeding import seeded_random
+from agents.intents import detect_category
 
-load_dotenv()
+DEMO_MODE = config.demo_mode
+OPENAI_API_KEY = config.openai_api_key
 
-DEMO_MODE = os.getenv("DEMO_MODE", "true").lower() == "true"
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# DALL-E result URLs expire after about an hour, so cached images must expire sooner
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "3000"))
+_image_cache = get_cache("images", ttl=IMAGE_CACHE_TTL)
+
+# Images per brief (default, and the most a request may ask for with `num_images`).
+# DALL-E 3 returns one image per call, so each image is its own request.
+IMAGES_PER_BRIEF = int(os.getenv("IMAGES_PER_BRIEF", "3"))
+MAX_IMAGES_PER_BRIEF = int(os.getenv("MAX_IMAGES_PER_BRIEF", "6"))
+# DALL-E calls in flight per process, across all requests
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "8"))
+# Copy each generated image into the local image store as soon as it exists,
+# before its DALL-E URL expires. Size-capped by BLOB_MAX_OBJECT_BYTES.
+IMAGE_DOWNLOAD = env_flag("IMAGE_DOWNLOAD", "true")
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "15"))
+
+# Visual direction per tone: each image of a brief follows one tone variation
+TONE_STYLES = {
+    "professional": "clean studio lighting, polished and trustworthy",
+    "playful": "bright colours, energetic and fun composition",
+    "urgent": "bold contrast, dynamic angle, a sense of momentum",
+    "emotional": "warm natural light, a candid and heartfelt moment",
+}
+
+# DALL-E calls run on this pool (sync pipeline) or under a per-loop semaphore (async pipeline)
+_image_executor = None
+_image_semaphores = weakref.WeakKeyDictionary()  # loop -> asyncio.Semaphore
 
 # Curated Unsplash image collections by category (free, no auth needed)
 DEMO_IMAGES = {
@@ -43,33 +78,50 @@ DEMO_IMAGES = {
 
 
 def _detect_category(brief: dict) -> str:
-    """Detect image category from brief keywords."""
-    text = f"{brief.get('product_name', '')} {brief.get('description', '')}".lower()
-    if any(k in text for k in ["tech", "app", "software", "device", "phone", "laptop", "computer"]):
-        return "tech"
-    if any(k in text for k in ["food", "drink", "eat", "restaurant", "meal", "snack", "beverage"]):
-        return "food"
-    if any(k in text for k in ["fashion", "cloth", "wear", "style", "outfit", "dress", "shoe"]):
-        return "fashion"
-    if any(k in text for k in ["fit", "gym", "workout", "health", "sport", "exercise", "yoga"]):
-        return "fitness"
-    if any(k in text for k in ["life", "home", "family", "travel", "people", "social"]):
-        return "lifestyle"
-    return "default"
-
-
-def generate_images(brief: dict, copy: dict) -> list:
+    """Detect image category from brief keywords (highest-scoring category, or "default")."""
+    return detect_category(f"{brief.get('product_name', '')} {brief.get('description', '')}") or "default"
+
+
+def image_count(brief: dict) -> int:
+    """Images to generate for a brief: its `num_images`, within 1..MAX_IMAGES_PER_BRIEF."""
+    return max(1, min(int(brief.get("_num_images", IMAGES_PER_BRIEF)), MAX_IMAGES_PER_BRIEF))
+
+
+@timed("agent", agent="design")
+def generate_images(brief: dict, copy: dict, on_image=None, tone_copies: dict = None) -> list:
     """
     Design Agent: Generates visual assets for the ad creative.
     Uses DALL-E 3 if available, otherwise returns curated Unsplash images.
+    on_image(image) is called as each image is ready, before the full list is returned.
+    tone_copies ({tone: copy}, when already generated) gives each image prompt its tone's headline.
     """
     if not DEMO_MODE and OPENAI_API_KEY:
-        return _generate_images_dalle(brief, copy)
+        return _generate_images_dalle(brief, copy, on_image, tone_copies)
+
+    return _announce(_demo_images(brief), on_image)
+
+
+@timed("agent", agent="design")
+async def generate_images_async(brief: dict, copy: dict, on_image=None, tone_copies: dict = None) -> list:
+    """Design Agent on the async OpenAI client."""
+    if not DEMO_MODE and OPENAI_API_KEY:
+        return await _generate_images_dalle_async(brief, copy, on_image, tone_copies)
+
+    return _announce(_demo_images(brief), on_image)
 
-    # Demo mode: return curated Unsplash images
+
+def _announce(images: list, on_image) -> list:
+    if on_image:
+        for image in images:
+            on_image(image)
+    return images
+
+
+def _demo_images(brief: dict) -> list:
+    """Demo mode: curated Unsplash images, picked with the brief's seed."""
     category = _detect_category(brief)
     images = DEMO_IMAGES.get(category, DEMO_IMAGES["default"])
-    selected = random.sample(images, min(3, len(images)))
+    selected = seeded_random(brief, "images").sample(images, min(image_count(brief), len(images)))
 
     return [
         {
@@ -82,34 +134,155 @@ def generate_images(brief: dict, copy: dict) -> list:
     ]
 
 
-def _generate_images_dalle(brief: dict, copy: dict) -> list:
-    """Generate images using DALL-E 3."""
+def _image_prompt(brief: dict, tone: str = None, headline: str = None, take: int = 1) -> str:
+    prompt = (
+        f"Professional advertising photo for {brief.get('product_name')}. "
+        f"{brief.get('description')}. "
+        f"Target audience: {brief.get('audience')}. "
+        f"Style: modern, clean, high-quality commercial photography. "
+    )
+    if tone:
+        prompt += f"Mood: {TONE_STYLES.get(tone, tone)}. "
+    if headline:
+        prompt += f"Concept: {headline}. "
+    if take > 1:
+        prompt += f"Alternative take {take}. "
+    return prompt + "No text overlay."
+
+
+def _image_prompts(brief: dict, copy: dict, count: int, tone_copies: dict = None) -> list:
+    """
+    (tone, prompt) for each image: the brief's own tone first, then the other tone variations
+    in turn, each with its own copy's headline when that copy exists. Past one image per tone
+    the prompts ask for another take, so no two images share a prompt (or a cache entry).
+    """
+    base = copy.get("tone") or brief.get("tone", "professional")
+    tones = [base] + [t for t in TONE_STYLES if t != base]
+    prompts = []
+    for i in range(count):
+        tone = tones[i % len(tones)]
+        source = copy if tone == base else (tone_copies or {}).get(tone) or {}
+        prompts.append((tone, _image_prompt(brief, tone, source.get("headline"), i // len(tones) + 1)))
+    return prompts
+
+
+def _store_locally(image: dict) -> dict:
+    """
+    Copy a generated image into the local image store while its URL is still valid.
+    The copy is served from local_url (and reused by derivative rendering) after the URL expires.
+    """
+    if not IMAGE_DOWNLOAD:
+        return image
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        prompt = (
-            f"Professional advertising photo for {brief.get('product_name')}. "
-            f"{brief.get('description')}. "
-            f"Target audience: {brief.get('audience')}. "
-            f"Style: modern, clean, high-quality commercial photography. "
-            f"No text overlay."
-        )
+        fetch_source(image["url"], timeout=IMAGE_DOWNLOAD_TIMEOUT)
+    except Exception as e:
+        print(f"Image download failed: {e}, keeping the remote URL only")
+        return image
+    return {**image, "local_url": f"/api/download-image?url={quote(image['url'], safe='')}"}
 
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1
+
+def _generate_images_dalle(brief: dict, copy: dict, on_image=None, tone_copies: dict = None) -> list:
+    """Generate images using DALL-E 3, one call per image, at most IMAGE_CONCURRENCY at once per process."""
+    prompts = _image_prompts(brief, copy, image_count(brief), tone_copies)
+    executor = _get_image_executor()
+    # Each call carries the caller's context, so the request deadline reaches it
+    futures = {
+        executor.submit(contextvars.copy_context().run, _dalle_image, brief, prompt, tone, i + 1): i
+        for i, (tone, prompt) in enumerate(prompts)
+    }
+    images = [None] * len(prompts)
+    for future in as_completed(futures):
+        image = images[futures[future]] = future.result()
+        if image and on_image:
+            on_image(image)
+    return [image for image in images if image] or _demo_images(brief)
+
+
+def _dalle_image(brief: dict, prompt: str, tone: str, index: int) -> dict:
+    """One DALL-E 3 image, downloaded locally; None when the call fails."""
+    try:
+        image = _image_cache.get_or_compute(
+            make_key("dall-e-3", prompt),
+            lambda: _store_locally(call_openai("images", "images", _image_request(prompt, tone))),
+            bypass=brief.get("_no_cache", False)
         )
+        return {**image, "index": index}
+    except Exception as e:
+        print(f"DALL-E error: {e}, skipping image {index}")
+        return None
+
+
+async def _generate_images_dalle_async(brief: dict, copy: dict, on_image=None, tone_copies: dict = None) -> list:
+    """Generate images using DALL-E 3 on the async client, concurrently under the per-loop cap."""
+    semaphore = _get_image_semaphore()
 
-        return [{
-            "url": response.data[0].url,
-            "prompt": prompt,
-            "style": "ai-generated",
-            "index": 1
-        }]
+    async def one(index: int, tone: str, prompt: str) -> dict:
+        async with semaphore:
+            image = await _dalle_image_async(brief, prompt, tone, index)
+        if image and on_image:
+            on_image(image)
+        return image
+
+    prompts = _image_prompts(brief, copy, image_count(brief), tone_copies)
+    images = await asyncio.gather(*(one(i + 1, tone, prompt) for i, (tone, prompt) in enumerate(prompts)))
+    return [image for image in images if image] or _demo_images(brief)
+
+
+async def _dalle_image_async(brief: dict, prompt: str, tone: str, index: int) -> dict:
+    """_dalle_image on the async client; the download runs on a thread."""
+    try:
+        async def generate():
+            image = await call_openai_async("images", "images", _image_request_async(prompt, tone))
+            return await asyncio.to_thread(_store_locally, image)
+
+        image = await _image_cache.get_or_compute_async(
+            make_key("dall-e-3", prompt),
+            generate,
+            bypass=brief.get("_no_cache", False)
+        )
+        return {**image, "index": index}
     except Exception as e:
-        print(f"DALL-E error: {e}, falling back to demo images")
-        return generate_images(brief, copy)
+        print(f"DALL-E error: {e}, skipping image {index}")
+        return None
+
+
+def _image_request(prompt: str, tone: str):
+    """request(client, timeout) for call_openai: one DALL-E 3 image, as an image dict."""
+    def request(client, timeout):
+        with span("provider", provider="openai-images"):
+            response = client.images.generate(**_image_kwargs(prompt, timeout))
+        return _image_result(response, prompt, tone)
+    return request
+
+
+def _image_request_async(prompt: str, tone: str):
+    """_image_request for call_openai_async."""
+    async def request(client, timeout):
+        with span("provider", provider="openai-images"):
+            response = await client.images.generate(**_image_kwargs(prompt, timeout))
+        return _image_result(response, prompt, tone)
+    return request
+
+
+def _image_kwargs(prompt: str, timeout: float) -> dict:
+    return {"model": "dall-e-3", "prompt": prompt, "size": "1024x1024", "quality": "standard", "n": 1,
+            "timeout": timeout}
+
+
+def _image_result(response, prompt: str, tone: str) -> dict:
+    return {"url": response.data[0].url, "prompt": prompt, "style": "ai-generated", "tone": tone}
+
+
+def _get_image_executor() -> ThreadPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ThreadPoolExecutor(max_workers=IMAGE_CONCURRENCY, thread_name_prefix="dalle")
+    return _image_executor
+
+
+def _get_image_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _image_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _image_semaphores[loop] = asyncio.Semaphore(IMAGE_CONCURRENCY)
+    return semaphore
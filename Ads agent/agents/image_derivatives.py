@@ -0,0 +1,178 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+from services.blob_store import get_image_store
+from services.lazy_import import lazy_module
+from services.metrics import timed
+
+# Pillow is imported when the first derivative is rendered, not at app start
+Image = lazy_module("PIL.Image")
+ImageFilter = lazy_module("PIL.ImageFilter")
+ImageOps = lazy_module("PIL.ImageOps")
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DERIVATIVES_DIR = os.getenv("DERIVATIVES_DIR", os.path.join(APP_DIR, "derivatives"))
+# Output encoding: "webp" or "jpeg"
+DERIVATIVE_FORMAT = os.getenv("DERIVATIVE_FORMAT", "webp").lower()
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "82"))
+# Crop mode: "smart" (edge-energy saliency) or "center"
+DERIVATIVE_CROP = os.getenv("DERIVATIVE_CROP", "smart").lower()
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 2)))
+RENDER_DERIVATIVES = os.getenv("RENDER_DERIVATIVES", "false").lower() == "true"
+
+# Remote sources we are willing to download
+ALLOWED_IMAGE_DOMAINS = ["images.unsplash.com", "oaidalleapiprodscus.blob.core.windows.net"]
+
+_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def smart_crop_box(image: "Image.Image", width: int, height: int, mode: str = DERIVATIVE_CROP) -> tuple:
+    """
+    Choose the crop box with the target aspect ratio. "smart" slides the window
+    along the free axis to the position with the most edge energy; "center" centers it.
+    """
+    src_w, src_h = image.size
+    target = width / height
+    # At least one pixel, however extreme the ratio
+    if src_w / src_h > target:
+        crop_w, crop_h = min(src_w, max(1, round(src_h * target))), src_h
+    else:
+        crop_w, crop_h = src_w, min(src_h, max(1, round(src_w / target)))
+
+    if mode != "smart" or (crop_w == src_w and crop_h == src_h):
+        left = (src_w - crop_w) // 2
+        top = (src_h - crop_h) // 2
+        return left, top, left + crop_w, top + crop_h
+
+    # Saliency on a small grayscale thumbnail: edge energy summed per column or row
+    scale = min(1.0, 128 / max(src_w, src_h))
+    thumb = image.convert("L").resize((max(1, round(src_w * scale)), max(1, round(src_h * scale))))
+    edges = thumb.filter(ImageFilter.FIND_EDGES)
+    tw, th = edges.size
+    pixels = edges.load()
+    if crop_w < src_w:
+        energy = [sum(pixels[x, y] for y in range(th)) for x in range(tw)]
+        window = max(1, round(crop_w * scale))
+    else:
+        energy = [sum(pixels[x, y] for x in range(tw)) for y in range(th)]
+        window = max(1, round(crop_h * scale))
+
+    best = _best_window(energy, window)
+    offset = round(best / scale)
+    if crop_w < src_w:
+        left = min(offset, src_w - crop_w)
+        return left, 0, left + crop_w, crop_h
+    top = min(offset, src_h - crop_h)
+    return 0, top, crop_w, top + crop_h
+
+
+def _best_window(energy: list, window: int) -> int:
+    """Start index of the contiguous window with the highest total energy."""
+    window = min(window, len(energy))
+    total = best_total = sum(energy[:window])
+    best = 0
+    for start in range(1, len(energy) - window + 1):
+        total += energy[start + window - 1] - energy[start - 1]
+        if total > best_total:
+            best_total, best = total, start
+    return best
+
+
+def render_derivative(source_path: str, width: int, height: int, out_path: str,
+                      encoding: str = DERIVATIVE_FORMAT, quality: int = DERIVATIVE_QUALITY,
+                      mode: str = DERIVATIVE_CROP) -> str:
+    """Crop and resize one source image to width x height and encode it. Runs in a worker process."""
+    if os.path.exists(out_path):
+        return out_path
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        box = smart_crop_box(image, width, height, mode)
+        output = image.resize((width, height), Image.LANCZOS, box=box)
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    if encoding == "webp":
+        output.save(tmp_path, "WEBP", quality=quality, method=4)
+    else:
+        output.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+    # Atomic publish, so concurrent renders of the same derivative are harmless
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def derivative_filename(source_hash: str, width: int, height: int,
+                        encoding: str = DERIVATIVE_FORMAT, mode: str = DERIVATIVE_CROP) -> str:
+    return f"{source_hash[:24]}-{width}x{height}-{mode}.{_EXTENSIONS.get(encoding, 'jpg')}"
+
+
+def render_derivatives(source_path: str, sizes: list, out_dir: str = DERIVATIVES_DIR) -> dict:
+    """
+    Render every (width, height) in `sizes` from one source file on the process pool.
+    Derivatives are named by source content hash and size, so each one is computed once.
+    Returns a dict mapping (width, height) to the derivative's filename.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    source_hash = _file_hash(source_path)
+
+    filenames = {}
+    missing = []
+    for width, height in dict.fromkeys(sizes):
+        filename = derivative_filename(source_hash, width, height)
+        filenames[(width, height)] = filename
+        if not os.path.exists(os.path.join(out_dir, filename)):
+            missing.append((width, height, os.path.join(out_dir, filename)))
+
+    if missing:
+        pool = _get_pool()
+        futures = [pool.submit(render_derivative, source_path, w, h, path) for w, h, path in missing]
+        for future in futures:
+            future.result()
+
+    return filenames
+
+
+def fetch_source(url: str, timeout: float = 15) -> str:
+    """Path of a local copy of a source image, fetched once through the image store."""
+    parsed = urlparse(url)
+    if not any(parsed.netloc.endswith(d) for d in ALLOWED_IMAGE_DOMAINS):
+        raise ValueError(f"Image domain not allowed: {parsed.netloc}")
+    return get_image_store().fetch(url, timeout=timeout)["path"]
+
+
+@timed("agent", agent="derivatives")
+def render_platform_images(images: list, platforms: list) -> dict:
+    """
+    Derivative stage: render the primary image in every format of the given platform specs.
+    Returns a dict mapping "WIDTHxHEIGHT" to the derivative URL, or {} if rendering fails
+    (the browser then falls back to CSS cropping of the original).
+    """
+    if not images:
+        return {}
+    try:
+        sizes = [(f.width, f.height) for spec in platforms for f in spec.formats]
+        filenames = render_derivatives(fetch_source(images[0]["url"]), sizes)
+    except Exception as e:
+        print(f"Derivative rendering error: {e}, using original image")
+        return {}
+    return {f"{w}x{h}": f"/api/derivatives/{name}" for (w, h), name in filenames.items()}
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+        return _pool
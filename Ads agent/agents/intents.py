@@ -0,0 +1,153 @@
+import re
+
+# Keyword tables: label -> keywords. Matching is case-insensitive on whole words;
+# a trailing "*" matches any word ending ("humor*" -> humor, humorous), spaces match any whitespace.
+TONE_KEYWORDS = {
+    "professional": ["professional*", "formal", "business*", "corporate", "serious", "b2b", "polished"],
+    "playful": ["playful", "fun", "funny", "funnier", "casual", "light", "lighter", "humor*", "humour*",
+                "witty", "young*", "cheeky"],
+    "urgent": ["urgent", "urgency", "scarcity", "limited", "hurry", "fast", "quick*", "now", "sale*",
+               "asap", "fomo"],
+    "emotional": ["emotional", "emotive", "heartfelt", "touching", "warm*", "inspir*", "story", "stories",
+                  "feel*", "sentimental"]
+}
+
+CATEGORY_KEYWORDS = {
+    "tech": ["tech*", "app", "apps", "software", "device*", "phone*", "smartphone*", "laptop*", "computer*",
+             "gadget*", "saas"],
+    "food": ["food*", "drink*", "eat", "eating", "restaurant*", "meal*", "snack*", "beverage*", "coffee",
+             "tea", "recipe*"],
+    "fashion": ["fashion*", "cloth*", "wear", "apparel", "style*", "outfit*", "dress*", "shoe*", "sneaker*",
+                "jacket*"],
+    "fitness": ["fit", "fitness", "gym*", "workout*", "health*", "sport*", "exercise*", "yoga", "running",
+                "athlet*"],
+    "lifestyle": ["life", "lifestyle", "home*", "family", "families", "travel*", "people", "social"]
+}
+
+DIRECTIVE_KEYWORDS = {
+    "length:short": ["shorter", "short", "concise", "brief", "briefer", "trim*", "tighter", "less text",
+                     "fewer words", "cut it down", "shorten"],
+    "length:long": ["longer", "more detail*", "expand*", "elaborat*", "more text", "lengthen", "detailed"],
+    "cta": ["cta", "ctas", "call to action", "call-to-action", "button", "action line"],
+    "emoji:remove": ["no emoji*", "without emoji*", "remove emoji*", "remove the emoji*", "drop the emoji*",
+                     "fewer emoji*", "less emoji*", "no emoticons"],
+    "emoji:add": ["emoji*", "more emoji*", "add emoji*", "with emoji*", "emoticon*"]
+}
+
+# Everyday words that only hint at an intent count for less ("okay, now make it warmer")
+KEYWORD_WEIGHTS = {"now": 0.5, "fast": 0.5, "light": 0.5, "feel*": 0.5, "story": 0.5, "life": 0.5,
+                   "people": 0.5, "wear": 0.5, "brief": 0.5, "short": 0.5}
+
+
+class KeywordMatcher:
+    """
+    Multi-label keyword matcher compiled into a single regex with word boundaries.
+    The keywords are merged into a character trie first, so the regex shares prefixes
+    and rejects a position after a character or two instead of trying every keyword.
+    One scan of the text scores every label.
+    """
+
+    def __init__(self, tables: dict, weights: dict = None):
+        weights = weights or {}
+        self.exact = {}  # keyword -> [(label, weight)]
+        self.stems = {}  # stem -> [(label, weight)]
+        for namespace, table in tables.items():
+            for label, keywords in table.items():
+                label = f"{namespace}:{label}" if namespace else label
+                for keyword in keywords:
+                    weight = weights.get(keyword, 1.0)
+                    keyword = " ".join(keyword.lower().split())
+                    if keyword.endswith("*"):
+                        self.stems.setdefault(keyword[:-1], []).append((label, weight))
+                    else:
+                        self.exact.setdefault(keyword, []).append((label, weight))
+        trie = {}
+        for keyword in list(self.exact) + [f"{stem}*" for stem in self.stems]:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = True
+        self.pattern = re.compile(r"\b(?:" + _trie_pattern(trie) + r")\b", re.IGNORECASE)
+        self._max_stem = max(map(len, self.stems), default=0)
+
+    def scores(self, text: str) -> dict:
+        """{label: (score, first_position)} for every label found in `text`; score sums keyword weights."""
+        found = {}
+        for match in self.pattern.finditer(text):
+            for label, weight in self._labels(" ".join(match.group().lower().split())):
+                score, first = found.get(label, (0.0, match.start()))
+                found[label] = (score + weight, first)
+        return found
+
+    def _labels(self, matched: str) -> list:
+        labels = self.exact.get(matched)
+        if labels:
+            return labels
+        # Longest stem the match starts with
+        for end in range(min(len(matched), self._max_stem), 0, -1):
+            labels = self.stems.get(matched[:end])
+            if labels:
+                return labels
+        return []
+
+
+def _trie_pattern(node: dict) -> str:
+    """Regex for a trie node: child branches first (longest match wins), optional if a keyword ends here."""
+    branches = []
+    for char, child in sorted(node.items()):
+        if char == "":
+            continue
+        if char == "*":
+            branches.append(r"\w*")
+        else:
+            branches.append((r"\s+" if char == " " else re.escape(char)) + _trie_pattern(child))
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    return f"(?:{pattern})?" if "" in node else pattern
+
+
+# Every table in one automaton: a message is scanned once for tones, categories and directives
+_MATCHER = KeywordMatcher({"tone": TONE_KEYWORDS, "category": CATEGORY_KEYWORDS, "": DIRECTIVE_KEYWORDS},
+                          KEYWORD_WEIGHTS)
+
+
+def analyze(text: str) -> dict:
+    """
+    Score a message in one pass. Returns
+    {tones: {tone: score}, categories: {category: score}, tone, category,
+     length: "short" | "long" | None, cta: bool, emoji: "add" | "remove" | None}.
+    The best tone or category has the highest score; ties go to the one mentioned first.
+    """
+    found = _MATCHER.scores(text)
+    tones = _namespace(found, "tone:")
+    categories = _namespace(found, "category:")
+    return {
+        "tones": {label: score for label, (score, _) in tones.items()},
+        "categories": {label: score for label, (score, _) in categories.items()},
+        "tone": _best(tones),
+        "category": _best(categories),
+        "length": _best(_namespace(found, "length:")),
+        "cta": "cta" in found,
+        "emoji": _best(_namespace(found, "emoji:"))
+    }
+
+
+def detect_tone(text: str) -> str:
+    """Highest-scoring tone in `text`, or None."""
+    return analyze(text)["tone"]
+
+
+def detect_category(text: str) -> str:
+    """Highest-scoring product category in `text`, or None."""
+    return analyze(text)["category"]
+
+
+def _namespace(found: dict, prefix: str) -> dict:
+    return {label[len(prefix):]: score for label, score in found.items() if label.startswith(prefix)}
+
+
+def _best(scored: dict) -> str:
+    if not scored:
+        return None
+    return min(scored, key=lambda label: (-scored[label][0], scored[label][1]))
@@ -0,0 +1,429 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import itertools
+import threading
+import weakref
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import config
+from services.lazy_import import lazy_module
+from services.rate_limit import TokenBucket
+from services.resilience import CircuitBreaker, CircuitOpenError, RetryBudget, DeadlineExceeded, remaining
+from services.metrics import inc, register_collector
+
+# Imported with the first OpenAI client, not at app start
+httpx = lazy_module("httpx")
+
+OPENAI_API_KEY = config.openai_api_key
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Connection pool, keep-alive and timeout settings (seconds)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+# The async client's limits are split across this many pools. httpcore rescans every pooled
+# connection on each request, so one large pool gets quadratically slower under high concurrency.
+OPENAI_ASYNC_POOLS = max(1, int(os.getenv("OPENAI_ASYNC_POOLS", "8")))
+# Retries per call, with exponential backoff and jitter; each retry also needs room in the
+# calling agent's retry budget (at most OPENAI_RETRY_BUDGET x its recent requests, plus a floor)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BUDGET = float(os.getenv("OPENAI_RETRY_BUDGET", "0.2"))
+OPENAI_RETRY_MIN = int(os.getenv("OPENAI_RETRY_MIN", "10"))
+
+# Per-provider circuit breakers: open at this error rate over the window, for the cooldown (seconds)
+OPENAI_BREAKER_ERROR_RATE = float(os.getenv("OPENAI_BREAKER_ERROR_RATE", "0.5"))
+OPENAI_BREAKER_MIN_CALLS = int(os.getenv("OPENAI_BREAKER_MIN_CALLS", "10"))
+OPENAI_BREAKER_WINDOW = float(os.getenv("OPENAI_BREAKER_WINDOW", "30"))
+OPENAI_BREAKER_COOLDOWN = float(os.getenv("OPENAI_BREAKER_COOLDOWN", "15"))
+# A half-open probe not heard from in this long is written off and another call may probe
+OPENAI_BREAKER_PROBE_TIMEOUT = float(os.getenv("OPENAI_BREAKER_PROBE_TIMEOUT", str(OPENAI_TIMEOUT + 30)))
+
+# Per-provider request rate limits (requests per minute, 0 = unlimited)
+OPENAI_CHAT_RPM = float(os.getenv("OPENAI_CHAT_RPM", "0"))
+OPENAI_IMAGES_RPM = float(os.getenv("OPENAI_IMAGES_RPM", "0"))
+
+# Serve canned responses locally instead of calling the API (benchmarks, offline dev)
+OPENAI_FAKE_TRANSPORT = os.getenv("OPENAI_FAKE_TRANSPORT", "false").lower() == "true"
+OPENAI_FAKE_LATENCY_MS = float(os.getenv("OPENAI_FAKE_LATENCY_MS", "0"))
+
+_client = None
+_client_lock = threading.Lock()
+# Async clients hold connections bound to an event loop, so keep one set per loop
+_async_clients = weakref.WeakKeyDictionary()  # loop -> itertools.cycle of AsyncOpenAI clients
+
+_provider_buckets = {
+    "chat": TokenBucket(OPENAI_CHAT_RPM / 60),
+    "images": TokenBucket(OPENAI_IMAGES_RPM / 60),
+}
+
+breakers = {
+    provider: CircuitBreaker(f"openai-{provider}", OPENAI_BREAKER_ERROR_RATE, OPENAI_BREAKER_MIN_CALLS,
+                             OPENAI_BREAKER_WINDOW, OPENAI_BREAKER_COOLDOWN, OPENAI_BREAKER_PROBE_TIMEOUT)
+    for provider in _provider_buckets
+}
+# One retry budget per agent, created on first use
+_retry_budgets = {}
+_retry_budgets_lock = threading.Lock()
+# Threads for hedged requests (created on first use)
+_hedge_executor = None
+
+
+def get_client():
+    """Return the process-wide OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(
+                    api_key=OPENAI_API_KEY or "fake-key",
+                    base_url=OPENAI_BASE_URL,
+                    # Retries happen in call_openai, under the retry budget and deadline
+                    max_retries=0,
+                    http_client=httpx.Client(
+                        limits=_limits(),
+                        timeout=_timeout(),
+                        transport=httpx.MockTransport(_fake_handler) if OPENAI_FAKE_TRANSPORT else None
+                    )
+                )
+    return _client
+
+
+def get_async_client():
+    """Return an AsyncOpenAI client for the running event loop, rotating over its connection pools."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        from openai import AsyncOpenAI
+        limits = _limits(OPENAI_ASYNC_POOLS)
+        clients = itertools.cycle([
+            AsyncOpenAI(
+                api_key=OPENAI_API_KEY or "fake-key",
+                base_url=OPENAI_BASE_URL,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=limits,
+                    timeout=_timeout(),
+                    transport=httpx.MockTransport(_fake_handler_async) if OPENAI_FAKE_TRANSPORT else None
+                )
+            )
+            for _ in range(OPENAI_ASYNC_POOLS)
+        ])
+        _async_clients[loop] = clients
+    return next(clients)
+
+
+def throttle(provider: str):
+    """
+    Block until the rate limit for `provider` ("chat" or "images") allows another request.
+    Raises DeadlineExceeded if that would be after the request deadline.
+    """
+    if not _provider_buckets[provider].acquire(timeout=remaining()):
+        raise DeadlineExceeded(f"rate limit wait for '{provider}' exceeds the request deadline")
+
+
+async def throttle_async(provider: str):
+    """throttle() for coroutines: waits on the event loop instead of blocking the thread."""
+    bucket = _provider_buckets[provider]
+    while True:
+        wait = bucket.try_acquire()
+        if not wait:
+            return
+        left = remaining()
+        if left is not None and wait > left:
+            raise DeadlineExceeded(f"rate limit wait for '{provider}' exceeds the request deadline")
+        await asyncio.sleep(wait)
+
+
+def call_openai(provider: str, agent: str, request, hedge_after: float = 0):
+    """
+    Call the OpenAI API through the provider's circuit breaker, rate limit and the request deadline.
+    request(client, timeout) makes one API call. Transient failures (connection errors, timeouts,
+    429 and 5xx) are retried with backoff while the agent's retry budget and the deadline allow.
+    With hedge_after (seconds), a second identical request is sent if the first has not answered
+    by then, and whichever finishes first wins.
+    Raises CircuitOpenError while the breaker is open and DeadlineExceeded once the deadline passes.
+    """
+    breaker, budget = breakers[provider], _retry_budget(agent)
+    budget.record_request()
+    attempt = 0
+    while True:
+        _check_breaker(breaker, agent)
+        # The breaker slot is held until the attempt has a verdict: see _release_on_exit()
+        with _release_on_exit(breaker):
+            throttle(provider)
+            timeout = _attempt_timeout()
+            try:
+                if hedge_after and hedge_after < timeout:
+                    result = _hedged(request, timeout, hedge_after, provider, agent, budget)
+                else:
+                    result = request(get_client(), timeout)
+            except Exception as e:
+                delay = _after_failure(e, breaker, budget, agent, attempt)
+            else:
+                breaker.record_success()
+                return result
+        time.sleep(delay)
+        attempt += 1
+
+
+async def call_openai_async(provider: str, agent: str, request, hedge_after: float = 0):
+    """call_openai on the async client: request(client, timeout) returns an awaitable."""
+    breaker, budget = breakers[provider], _retry_budget(agent)
+    budget.record_request()
+    attempt = 0
+    while True:
+        _check_breaker(breaker, agent)
+        with _release_on_exit(breaker):
+            await throttle_async(provider)
+            timeout = _attempt_timeout()
+            try:
+                if hedge_after and hedge_after < timeout:
+                    result = await _hedged_async(request, timeout, hedge_after, provider, agent, budget)
+                else:
+                    result = await request(get_async_client(), timeout)
+            except Exception as e:
+                delay = _after_failure(e, breaker, budget, agent, attempt)
+            else:
+                breaker.record_success()
+                return result
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _check_breaker(breaker: CircuitBreaker, agent: str):
+    if not breaker.allow():
+        inc("openai_short_circuits_total", provider=breaker.name, agent=agent)
+        raise CircuitOpenError(breaker.name, breaker.retry_in())
+
+
+@contextmanager
+def _release_on_exit(breaker: CircuitBreaker):
+    """
+    Release the breaker slot when an attempt raises anything: a deadline hit while throttling, a
+    cancelled task or an error already recorded. Otherwise a half-open breaker's only probe could
+    stay taken forever and the breaker would never close.
+    """
+    try:
+        yield
+    except BaseException:
+        breaker.release()
+        raise
+
+
+def _attempt_timeout() -> float:
+    """Timeout for the next attempt: the client timeout, cut to what is left of the deadline."""
+    left = remaining()
+    if left is None:
+        return OPENAI_TIMEOUT
+    if left <= 0:
+        raise DeadlineExceeded("request deadline passed")
+    return min(OPENAI_TIMEOUT, left)
+
+
+def _after_failure(error: Exception, breaker: CircuitBreaker, budget: RetryBudget, agent: str,
+                   attempt: int) -> float:
+    """Record a failed attempt. Returns the backoff before the retry, or re-raises if there is none."""
+    if not _retryable(error):
+        # The provider answered (bad request, unparseable output): not an availability problem
+        breaker.record_success()
+        raise error
+    left = remaining()
+    if left is not None and left <= 0:
+        # Cut off by the caller's deadline, which says nothing about the provider
+        breaker.release()
+        raise error
+    breaker.record_failure()
+    delay = min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.75, 1.0)
+    if attempt >= OPENAI_MAX_RETRIES or (left is not None and left <= delay) or not budget.try_spend():
+        raise error
+    inc("openai_retries_total", provider=breaker.name, agent=agent)
+    return delay
+
+
+def _retryable(error: Exception) -> bool:
+    from openai import APIConnectionError, APIStatusError
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (APIConnectionError, httpx.TransportError))
+
+
+def _hedged(request, timeout: float, hedge_after: float, provider: str, agent: str, budget: RetryBudget):
+    """
+    Run request(), sending a second copy after `hedge_after` seconds if the budget and rate limit
+    allow. The first success wins; a losing thread cannot be interrupted and finishes on its own.
+    """
+    executor = _get_hedge_executor()
+    client = get_client()
+    primary = executor.submit(request, client, timeout)
+    if wait([primary], timeout=hedge_after).done or not _may_hedge(provider, agent, budget):
+        return primary.result()
+    pending = {primary, executor.submit(request, client, max(0.001, timeout - hedge_after))}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def _hedged_async(request, timeout: float, hedge_after: float, provider: str, agent: str,
+                        budget: RetryBudget):
+    """_hedged on the event loop; the losing request is cancelled."""
+    client = get_async_client()
+    primary = asyncio.ensure_future(request(client, timeout))
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done or not _may_hedge(provider, agent, budget):
+            return await primary
+        pending.add(asyncio.ensure_future(request(client, max(0.001, timeout - hedge_after))))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _may_hedge(provider: str, agent: str, budget: RetryBudget) -> bool:
+    # A hedge is an extra request: it must fit the rate limit now and comes out of the retry budget
+    if _provider_buckets[provider].try_acquire() or not budget.try_spend():
+        return False
+    inc("openai_hedges_total", provider=f"openai-{provider}", agent=agent)
+    return True
+
+
+def _retry_budget(agent: str) -> RetryBudget:
+    budget = _retry_budgets.get(agent)
+    if budget is None:
+        with _retry_budgets_lock:
+            budget = _retry_budgets.setdefault(agent, RetryBudget(OPENAI_RETRY_BUDGET, OPENAI_RETRY_MIN))
+    return budget
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _client_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=OPENAI_MAX_CONNECTIONS,
+                                                     thread_name_prefix="hedge")
+    return _hedge_executor
+
+
+def _collect_breaker_metrics() -> list:
+    states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    samples = []
+    for breaker in breakers.values():
+        labels = (("provider", breaker.name),)
+        samples.append(("gauge", "circuit_state", labels, states[breaker.state]))
+        samples.append(("counter", "circuit_trips_total", labels, breaker.trips))
+    return samples
+
+
+register_collector(_collect_breaker_metrics)
+
+
+def reset_clients():
+    """Drop cached clients so the next call picks up changed settings."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+    _async_clients.clear()
+
+
+def _limits(pools: int = 1) -> "httpx.Limits":
+    """Connection limits for one of `pools` pools that share the configured totals."""
+    return httpx.Limits(
+        max_connections=max(1, OPENAI_MAX_CONNECTIONS // pools),
+        max_keepalive_connections=max(1, OPENAI_MAX_KEEPALIVE // pools),
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> "httpx.Timeout":
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+# ── Fake transport ──
+
+def fake_openai_response(path: str, payload: dict) -> tuple:
+    """
+    Canned OpenAI API response for a request path and JSON payload.
+    Returns (status_code, body). Output is derived from the prompt hash,
+    so the same request always returns the same response.
+    """
+    now = int(time.time())
+    if path.endswith("/chat/completions"):
+        prompt = payload.get("messages", [{}])[-1].get("content", "")
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        copy = {
+            "headline": f"Fake Headline {digest}",
+            "body": f"Fake body copy generated locally for prompt {digest}.",
+            "cta": "Shop Now"
+        }
+        tones = next((line.split(":", 1)[1] for line in prompt.splitlines() if line.startswith("Tones:")), None)
+        option_tones = next((line.split(":", 1)[1] for line in prompt.splitlines()
+                             if line.startswith("Option tones:")), None)
+        if option_tones:
+            # Copy options prompt: `Options per field` alternatives of each field per tone
+            count = int(next(line.split(":", 1)[1] for line in prompt.splitlines()
+                             if line.startswith("Options per field:")))
+            content = json.dumps({"options": {
+                t.strip(): {field: [f"{text} ({i + 1})" for i in range(count)] for field, text in copy.items()}
+                for t in option_tones.split(",")
+            }})
+        elif tones:
+            # Multi-tone prompt: one entry per requested tone
+            content = json.dumps({"variations": {t.strip(): dict(copy) for t in tones.split(",")}})
+        else:
+            content = json.dumps({**copy, "tone": "professional"})
+        return 200, {
+            "id": f"chatcmpl-{digest}",
+            "object": "chat.completion",
+            "created": now,
+            "model": payload.get("model", "gpt-4"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": 40, "total_tokens": len(prompt.split()) + 40}
+        }
+    if path.endswith("/images/generations"):
+        digest = hashlib.sha256(payload.get("prompt", "").encode("utf-8")).hexdigest()[:16]
+        return 200, {
+            "created": now,
+            "data": [
+                {"url": f"https://oaidalleapiprodscus.blob.core.windows.net/fake/{digest}-{i}.png",
+                 "revised_prompt": payload.get("prompt", "")}
+                for i in range(payload.get("n", 1))
+            ]
+        }
+    return 404, {"error": {"message": f"Unknown fake endpoint {path}", "type": "invalid_request_error"}}
+
+
+def _fake_handler(request: "httpx.Request") -> "httpx.Response":
+    if OPENAI_FAKE_LATENCY_MS:
+        time.sleep(OPENAI_FAKE_LATENCY_MS / 1000)
+    status, body = fake_openai_response(request.url.path, json.loads(request.content or b"{}"))
+    return httpx.Response(status, json=body)
+
+
+async def _fake_handler_async(request: "httpx.Request") -> "httpx.Response":
+    if OPENAI_FAKE_LATENCY_MS:
+        await asyncio.sleep(OPENAI_FAKE_LATENCY_MS / 1000)
+    status, body = fake_openai_response(request.url.path, json.loads(request.content or b"{}"))
+    return httpx.Response(status, json=body)
@@ -0,0 +1,404 @@
+import os
+import time
+import queue
+import asyncio
+import inspect
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from agents.creative_agent import generate_copy, generate_copy_all_tones, generate_copy_async
+from agents.design_agent import generate_images, generate_images_async, image_count
+from agents.variation_agent import generate_variations, generate_variations_async, build_variations
+from agents.platform_agent import adapt_for_platforms, select_platforms, PLATFORMS
+from agents.image_derivatives import render_platform_images, RENDER_DERIVATIVES
+from agents import creative_agent, design_agent
+from services.brief_index import get_brief_index, BRIEF_SIMILARITY
+from services.blob_store import get_image_store
+
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "16"))
+# Threads that drive streamed pipelines (they mostly wait on agent stages)
+PIPELINE_DRIVERS = int(os.getenv("PIPELINE_DRIVERS", "32"))
+
+# Per-agent timeouts in seconds
+AGENT_TIMEOUTS = {
+    "copy": float(os.getenv("AGENT_TIMEOUT_COPY", "60")),
+    "images": float(os.getenv("AGENT_TIMEOUT_IMAGES", "90")),
+    "variations": float(os.getenv("AGENT_TIMEOUT_VARIATIONS", "60")),
+    "platforms": float(os.getenv("AGENT_TIMEOUT_PLATFORMS", "10")),
+    "derivatives": float(os.getenv("AGENT_TIMEOUT_DERIVATIVES", "60")),
+}
+
+# Shared pools for agent stages and pipeline drivers (created on first use)
+_executor = None
+_driver_executor = None
+
+
+class AgentTimeoutError(Exception):
+    """Raised when a pipeline stage does not finish within its timeout."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Agent '{stage}' timed out after {timeout:g}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class AgentGraph:
+    """
+    A small DAG scheduler for agents.
+    Each stage runs on the thread pool as soon as all of its dependencies
+    have produced a result. Stage functions receive a dict of the results
+    completed so far and run in a copy of the caller's context, so the
+    request deadline reaches every agent.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def add(self, name: str, fn, deps=(), timeout: float = None):
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Unknown dependency '{dep}' for stage '{name}'")
+        self._stages[name] = {"fn": fn, "deps": tuple(deps), "timeout": timeout}
+        return self
+
+    def run(self, on_complete=None, executor=None) -> tuple:
+        """
+        Execute the graph. Returns (results, timings).
+        on_complete(name, value) is called from this thread as each stage finishes.
+        """
+        executor = executor or _get_executor()
+        pending = dict(self._stages)
+        running = {}
+        results = {}
+        timings = {}
+        started = time.perf_counter()
+
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage["deps"]):
+                        future = executor.submit(contextvars.copy_context().run,
+                                                 _timed_call, stage["fn"], dict(results))
+                        deadline = time.monotonic() + stage["timeout"] if stage["timeout"] else None
+                        running[future] = (name, deadline)
+                        del pending[name]
+
+                deadlines = [d for _, d in running.values() if d is not None]
+                wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    now = time.monotonic()
+                    for future, (name, deadline) in running.items():
+                        if deadline is not None and deadline <= now:
+                            raise AgentTimeoutError(name, self._stages[name]["timeout"])
+                    continue
+
+                for future in done:
+                    name, _ = running.pop(future)
+                    value, stage_start, stage_end = future.result()
+                    results[name] = value
+                    timings[name] = {
+                        "started_ms": round((stage_start - started) * 1000, 2),
+                        "duration_ms": round((stage_end - stage_start) * 1000, 2),
+                    }
+                    if on_complete:
+                        on_complete(name, value)
+        finally:
+            # Timed-out or failed runs: drop stages that have not started yet.
+            # Threads already running cannot be interrupted and finish in the background.
+            for future in running:
+                future.cancel()
+
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return results, timings
+
+    async def run_async(self, on_complete=None) -> tuple:
+        """
+        Execute the graph as tasks on the running event loop. Returns (results, timings).
+        A stage function may return an awaitable, which is awaited under the stage timeout,
+        or a plain value; blocking work must be moved off the loop by the stage (asyncio.to_thread).
+        """
+        tasks = {}
+        results = {}
+        timings = {}
+        started = time.perf_counter()
+
+        async def run_stage(name: str, stage: dict):
+            if stage["deps"]:
+                await asyncio.gather(*(tasks[dep] for dep in stage["deps"]))
+            stage_start = time.perf_counter()
+            value = stage["fn"](dict(results))
+            if inspect.isawaitable(value):
+                try:
+                    value = await asyncio.wait_for(value, stage["timeout"])
+                except asyncio.TimeoutError:
+                    raise AgentTimeoutError(name, stage["timeout"])
+            results[name] = value
+            timings[name] = {
+                "started_ms": round((stage_start - started) * 1000, 2),
+                "duration_ms": round((time.perf_counter() - stage_start) * 1000, 2),
+            }
+            if on_complete:
+                on_complete(name, value)
+
+        # Stages are added after their dependencies, so every dependency task exists first
+        for name, stage in self._stages.items():
+            tasks[name] = asyncio.ensure_future(run_stage(name, stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return results, timings
+
+
+def _timed_call(fn, results: dict) -> tuple:
+    start = time.perf_counter()
+    value = fn(results)
+    return value, start, time.perf_counter()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=AGENT_WORKERS, thread_name_prefix="agent")
+    return _executor
+
+
+def _get_driver_executor() -> ThreadPoolExecutor:
+    global _driver_executor
+    if _driver_executor is None:
+        _driver_executor = ThreadPoolExecutor(max_workers=PIPELINE_DRIVERS, thread_name_prefix="pipeline")
+    return _driver_executor
+
+
+def build_generate_graph(brief: dict, packed_tones: bool = False, reuse: dict = None, on_image=None) -> AgentGraph:
+    """
+    Build the generation graph:
+    copy -> (images, variations) in parallel, images -> platforms.
+    With derivative rendering on, images -> derivatives -> platforms.
+    With packed_tones, copy for every tone comes from one creative call and
+    variations are assembled from it instead of running the variation agent.
+    With `reuse` (a near-duplicate match), copy and images are taken from it.
+    on_image(image) is called from the images stage as each generated image is ready.
+    """
+    graph = AgentGraph()
+    if packed_tones:
+        graph.add("tones", lambda r: generate_copy_all_tones(brief), timeout=AGENT_TIMEOUTS["copy"])
+        graph.add("copy", lambda r: _primary_copy(brief, r["tones"]), deps=["tones"])
+        graph.add("variations", lambda r: build_variations(r["copy"], r["tones"]), deps=["tones", "copy"])
+    else:
+        graph.add("copy", lambda r: reuse["copy"] if reuse else generate_copy(brief), timeout=AGENT_TIMEOUTS["copy"])
+        graph.add("variations", lambda r: generate_variations(brief, r["copy"]),
+                  deps=["copy"], timeout=AGENT_TIMEOUTS["variations"])
+    # Packed tones are ready before the images, so each image prompt can use its tone's copy
+    graph.add("images", lambda r: reuse["images"] if reuse else generate_images(brief, r["copy"], on_image,
+                                                                                 r.get("tones")),
+              deps=["copy"], timeout=AGENT_TIMEOUTS["images"])
+    if brief.get("_render_derivatives", RENDER_DERIVATIVES):
+        # Real crops for every platform format, rendered once images resolve
+        specs = [PLATFORMS[key] for key in select_platforms(brief["platforms"])]
+        graph.add("derivatives", lambda r: render_platform_images(r["images"], specs),
+                  deps=["images"], timeout=AGENT_TIMEOUTS["derivatives"])
+        graph.add("platforms", lambda r: adapt_for_platforms(brief, r["copy"], r["images"], brief["platforms"],
+                                                             derivatives=r["derivatives"]),
+                  deps=["copy", "images", "derivatives"], timeout=AGENT_TIMEOUTS["platforms"])
+    else:
+        graph.add("platforms", lambda r: adapt_for_platforms(brief, r["copy"], r["images"], brief["platforms"]),
+                  deps=["copy", "images"], timeout=AGENT_TIMEOUTS["platforms"])
+    return graph
+
+
+def build_generate_graph_async(brief: dict, reuse: dict = None, on_image=None) -> AgentGraph:
+    """The generation graph of build_generate_graph, with the agents on the async OpenAI client."""
+    graph = AgentGraph()
+    graph.add("copy", lambda r: reuse["copy"] if reuse else generate_copy_async(brief),
+              timeout=AGENT_TIMEOUTS["copy"])
+    graph.add("variations", lambda r: generate_variations_async(brief, r["copy"]),
+              deps=["copy"], timeout=AGENT_TIMEOUTS["variations"])
+    graph.add("images", lambda r: reuse["images"] if reuse else generate_images_async(brief, r["copy"], on_image),
+              deps=["copy"], timeout=AGENT_TIMEOUTS["images"])
+    if brief.get("_render_derivatives", RENDER_DERIVATIVES):
+        specs = [PLATFORMS[key] for key in select_platforms(brief["platforms"])]
+        # Pillow rendering blocks, so it runs on a thread while the loop keeps serving
+        graph.add("derivatives", lambda r: asyncio.to_thread(render_platform_images, r["images"], specs),
+                  deps=["images"], timeout=AGENT_TIMEOUTS["derivatives"])
+        graph.add("platforms", lambda r: adapt_for_platforms(brief, r["copy"], r["images"], brief["platforms"],
+                                                             derivatives=r["derivatives"]),
+                  deps=["copy", "images", "derivatives"], timeout=AGENT_TIMEOUTS["platforms"])
+    else:
+        graph.add("platforms", lambda r: adapt_for_platforms(brief, r["copy"], r["images"], brief["platforms"]),
+                  deps=["copy", "images"], timeout=AGENT_TIMEOUTS["platforms"])
+    return graph
+
+
+def _primary_copy(brief: dict, tones: dict) -> dict:
+    tone = brief.get("tone", "professional")
+    return tones.get(tone) or next(iter(tones.values()))
+
+
+def find_near_duplicate(brief: dict) -> dict:
+    """
+    Copy and images generated for a near-identical earlier brief (services.brief_index), or None.
+    Only OpenAI generations are indexed, since demo output costs nothing. Briefs asking for
+    fresh output (no_cache) or a specific variant (seed) always generate.
+    """
+    if not _reuse_enabled() or brief.get("_no_cache") or "_seed" in brief:
+        return None
+    match = get_brief_index().lookup(brief)
+    # An earlier generation with fewer images than this brief asks for is not a substitute
+    if match and (len(match["images"]) < image_count(brief) or not _images_servable(match)):
+        return None
+    return match
+
+
+def _images_servable(match: dict) -> bool:
+    """
+    DALL-E URLs expire about an hour after generation (see design_agent.IMAGE_CACHE_TTL). A match
+    older than that is only reusable if every image still has its copy in the local image store.
+    """
+    if time.time() - match["created_at"] < design_agent.IMAGE_CACHE_TTL:
+        return True
+    store = get_image_store()
+    return all(image.get("local_url") and store.get(image["url"]) for image in match["images"])
+
+
+def remember_generation(brief: dict, results: dict, reuse: dict):
+    """Index a fresh generation for near-duplicate reuse. Demo fallbacks after OpenAI errors are left out."""
+    if reuse is not None or not _reuse_enabled():
+        return
+    if (results["copy"] == creative_agent._generate_copy_demo(brief)
+            or results["images"] == design_agent._demo_images(brief)):
+        return
+    get_brief_index().add(brief, results["copy"], results["images"])
+
+
+def _reuse_enabled() -> bool:
+    return bool(BRIEF_SIMILARITY) and not creative_agent.DEMO_MODE and bool(creative_agent.OPENAI_API_KEY)
+
+
+def _near_duplicate(reuse: dict) -> dict:
+    """What a result reports about the generation its copy and images came from."""
+    return {
+        "id": reuse["id"],
+        "similarity": reuse["similarity"],
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(reuse["created_at"]))
+    }
+
+
+def run_generate_pipeline(brief: dict, on_complete=None, on_image=None) -> tuple:
+    """
+    Run all 4 agents for a brief. Returns (results, timings).
+    on_image(image) is called as each image is generated, ahead of the images stage.
+    When a near-identical brief was generated before, its copy and images are reused
+    and results["near_duplicate"] says which generation they came from.
+    """
+    reuse = find_near_duplicate(brief)
+    results, timings = build_generate_graph(brief, reuse=reuse, on_image=on_image).run(on_complete=on_complete)
+    remember_generation(brief, results, reuse)
+    if reuse:
+        results["near_duplicate"] = _near_duplicate(reuse)
+    return results, timings
+
+
+async def run_generate_pipeline_async(brief: dict, on_complete=None, on_image=None) -> tuple:
+    """run_generate_pipeline on the event loop: waiting on OpenAI holds no thread."""
+    # The index may touch SQLite, so it is used from a thread
+    reuse = await asyncio.to_thread(find_near_duplicate, brief)
+    graph = build_generate_graph_async(brief, reuse=reuse, on_image=on_image)
+    results, timings = await graph.run_async(on_complete=on_complete)
+    await asyncio.to_thread(remember_generation, brief, results, reuse)
+    if reuse:
+        results["near_duplicate"] = _near_duplicate(reuse)
+    return results, timings
+
+
+async def aiter_generate_pipeline(brief: dict):
+    """Async iter_generate_pipeline: yields (stage, value) as agents finish, then ("done", {"timings"})."""
+    events = asyncio.Queue()
+    run = asyncio.ensure_future(run_generate_pipeline_async(
+        brief,
+        on_complete=lambda name, value: events.put_nowait((name, value)),
+        on_image=lambda image: events.put_nowait(("image", image))
+    ))
+    run.add_done_callback(lambda _: events.put_nowait(("finished", None)))
+    try:
+        while True:
+            name, value = await events.get()
+            if name == "finished":
+                break
+            yield name, value
+        results, timings = run.result()
+        yield "done", _done_event(results, timings)
+    finally:
+        run.cancel()
+
+
+def iter_generate_pipeline(brief: dict):
+    """
+    Start the pipeline in the background (in the caller's context) and return an
+    iterator of (stage, value) as each agent finishes, followed by
+    ("done", {"timings": ...}). Each generated image is also yielded as ("image", image)
+    as soon as it is ready, before the images stage completes. Stage errors are re-raised.
+    """
+    events = queue.Queue()
+
+    def drive():
+        try:
+            results, timings = run_generate_pipeline(brief, on_complete=lambda name, value: events.put((name, value)),
+                                                     on_image=lambda image: events.put(("image", image)))
+            events.put(("done", _done_event(results, timings)))
+        except Exception as e:
+            events.put(("error", e))
+
+    _get_driver_executor().submit(contextvars.copy_context().run, drive)
+    return _drain_events(events)
+
+
+def _done_event(results: dict, timings: dict) -> dict:
+    done = {"timings": timings}
+    if "near_duplicate" in results:
+        done["near_duplicate"] = results["near_duplicate"]
+    return done
+
+
+def _drain_events(events: queue.Queue):
+    while True:
+        name, value = events.get()
+        if name == "error":
+            raise value
+        yield name, value
+        if name == "done":
+            return
+
+
+def iter_batch_pipeline(briefs: list, concurrency: int):
+    """
+    Run the pipeline for many briefs, at most `concurrency` at a time.
+    Yields (index, results, timings, error) in completion order.
+    Each brief packs all tones into one creative call.
+    """
+    executor = _get_driver_executor()
+    remaining = iter(enumerate(briefs))
+    running = {}
+
+    def submit_next():
+        for index, brief in remaining:
+            running[executor.submit(build_generate_graph(brief, packed_tones=True).run)] = index
+            return
+
+    for _ in range(max(1, concurrency)):
+        submit_next()
+
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = running.pop(future)
+            submit_next()
+            try:
+                results, timings = future.result()
+                yield index, results, timings, None
+            except Exception as e:
+                yield index, None, None, e
@@ -1,103 +1,307 @@
-def adapt_for_platforms(brief: dict, copy: dict, images: list, platforms: list) -> dict:
-    """
-    Platform Agent: Adapts creatives to platform-specific formats and specs.
-    Returns a dict keyed by platform name with adapted specs and copy.
-    """
-    all_platforms = {
-        "instagram": {
-            "name": "Instagram",
-            "icon": "📸",
-            "color": "#E1306C",
-            "formats": [
-                {"name": "Feed Post", "ratio": "1:1", "width": 1080, "height": 1080, "css_ratio": "1/1"},
-                {"name": "Story", "ratio": "9:16", "width": 1080, "height": 1920, "css_ratio": "9/16"},
-                {"name": "Reel Cover", "ratio": "9:16", "width": 1080, "height": 1920, "css_ratio": "9/16"},
-            ],
-            "copy_limits": {"headline": 40, "body": 125, "cta": 20},
-            "tips": "Use bold visuals, minimal text. Stories perform best with motion.",
-            "audience_reach": "2B+ users",
-            "best_for": "Visual brands, lifestyle, fashion, food"
-        },
-        "facebook": {
-            "name": "Facebook",
-            "icon": "👥",
-            "color": "#1877F2",
-            "formats": [
-                {"name": "Feed Ad", "ratio": "1.91:1", "width": 1200, "height": 628, "css_ratio": "1.91/1"},
-                {"name": "Square Post", "ratio": "1:1", "width": 1080, "height": 1080, "css_ratio": "1/1"},
-                {"name": "Story", "ratio": "9:16", "width": 1080, "height": 1920, "css_ratio": "9/16"},
-            ],
-            "copy_limits": {"headline": 40, "body": 125, "cta": 20},
-            "tips": "Longer copy works well. Include social proof and clear value proposition.",
-            "audience_reach": "3B+ users",
-            "best_for": "All demographics, retargeting, lead generation"
-        },
-        "twitter": {
-            "name": "Twitter / X",
-            "icon": "🐦",
-            "color": "#000000",
-            "formats": [
-                {"name": "Promoted Tweet", "ratio": "16:9", "width": 1200, "height": 675, "css_ratio": "16/9"},
-                {"name": "Card Image", "ratio": "2:1", "width": 800, "height": 400, "css_ratio": "2/1"},
-            ],
-            "copy_limits": {"headline": 70, "body": 280, "cta": 20},
-            "tips": "Be concise and punchy. Use trending hashtags. Engage with replies.",
-            "audience_reach": "550M+ users",
-            "best_for": "Tech, news, real-time marketing, B2B"
-        },
-        "linkedin": {
-            "name": "LinkedIn",
-            "icon": "💼",
-            "color": "#0A66C2",
-            "formats": [
-                {"name": "Sponsored Content", "ratio": "1.91:1", "width": 1200, "height": 627, "css_ratio": "1.91/1"},
-                {"name": "Square Ad", "ratio": "1:1", "width": 1080, "height": 1080, "css_ratio": "1/1"},
-            ],
-            "copy_limits": {"headline": 70, "body": 150, "cta": 20},
-            "tips": "Professional tone works best. Lead with value, include industry insights.",
-            "audience_reach": "900M+ professionals",
-            "best_for": "B2B, recruiting, professional services, SaaS"
-        },
-        "google": {
-            "name": "Google Display",
-            "icon": "🔍",
-            "color": "#4285F4",
+import os
+import json
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from services.metrics import timed
+
+# Optional JSON (or YAML, with PyYAML installed) file replacing the built-in platform specs
+PLATFORM_SPECS_PATH = os.getenv("PLATFORM_SPECS_PATH", "")
+
+ELLIPSIS = "…"
+
+DEFAULT_PLATFORMS = {
+    "instagram": {
+        "name": "Instagram",
+        "icon": "📸",
+        "color": "#E1306C",
+        "formats": [
+            {"name": "Feed Post", "ratio": "1:1", "width": 1080, "height": 1080, "css_ratio": "1/1"},
+            {"name": "Story", "ratio": "9:16", "width": 1080, "height": 1920, "css_ratio": "9/16"},
+            {"name": "Reel Cover", "ratio": "9:16", "width": 1080, "height": 1920, "css_ratio": "9/16"},
+        ],
+        "copy_limits": {"headline": 40, "body": 125, "cta": 20},
+        "tips": "Use bold visuals, minimal text. Stories perform best with motion.",
+        "audience_reach": "2B+ users",
+        "best_for": "Visual brands, lifestyle, fashion, food"
+    },
+    "facebook": {
+        "name": "Facebook",
+        "icon": "👥",
+        "color": "#1877F2",
+        "formats": [
+            {"name": "Feed Ad", "ratio": "1.91:1", "width": 1200, "height": 628, "css_ratio": "1.91/1"},
+            {"name": "Square Post", "ratio": "1:1", "width": 1080, "height": 1080, "css_ratio": "1/1"},
+            {"name": "Story", "ratio": "9:16", "width": 1080, "height": 1920, "css_ratio": "9/16"},
+        ],
+        "copy_limits": {"headline": 40, "body": 125, "cta": 20},
+        "tips": "Longer copy works well. Include social proof and clear value proposition.",
+        "audience_reach": "3B+ users",
+        "best_for": "All demographics, retargeting, lead generation"
+    },
+    "twitter": {
+        "name": "Twitter / X",
+        "icon": "🐦",
+        "color": "#000000",
+        "formats": [
+            {"name": "Promoted Tweet", "ratio": "16:9", "width": 1200, "height": 675, "css_ratio": "16/9"},
+            {"name": "Card Image", "ratio": "2:1", "width": 800, "height": 400, "css_ratio": "2/1"},
+        ],
+        "copy_limits": {"headline": 70, "body": 280, "cta": 20},
+        "tips": "Be concise and punchy. Use trending hashtags. Engage with replies.",
+        "audience_reach": "550M+ users",
+        "best_for": "Tech, news, real-time marketing, B2B"
+    },
+    "linkedin": {
+        "name": "LinkedIn",
+        "icon": "💼",
+        "color": "#0A66C2",
+        "formats": [
+            {"name": "Sponsored Content", "ratio": "1.91:1", "width": 1200, "height": 627, "css_ratio": "1.91/1"},
+            {"name": "Square Ad", "ratio": "1:1", "width": 1080, "height": 1080, "css_ratio": "1/1"},
+        ],
+        "copy_limits": {"headline": 70, "body": 150, "cta": 20},
+        "tips": "Professional tone works best. Lead with value, include industry insights.",
+        "audience_reach": "900M+ professionals",
+        "best_for": "B2B, recruiting, professional services, SaaS"
+    },
+    "google": {
+        "name": "Google Display",
+        "icon": "🔍",
+        "color": "#4285F4",
+        "formats": [
+            {"name": "Leaderboard", "ratio": "728:90", "width": 728, "height": 90, "css_ratio": "728/90"},
+            {"name": "Medium Rectangle", "ratio": "300:250", "width": 300, "height": 250, "css_ratio": "300/250"},
+            {"name": "Large Rectangle", "ratio": "336:280", "width": 336, "height": 280, "css_ratio": "336/280"},
+        ],
+        "copy_limits": {"headline": 30, "body": 90, "cta": 15},
+        "tips": "Keep it simple. Strong CTA. Test multiple sizes for best reach.",
+        "audience_reach": "90% of internet users",
+        "best_for": "Retargeting, brand awareness, search intent"
+    }
+}
+
+
+@dataclass(frozen=True, slots=True)
+class AdFormat:
+    name: str
+    ratio: str
+    width: int
+    height: int
+    css_ratio: str
+
+
+@dataclass(frozen=True, slots=True)
+class CopyLimits:
+    headline: int
+    body: int
+    cta: int
+
+
+@dataclass(frozen=True, slots=True)
+class PlatformSpec:
+    key: str
+    name: str
+    icon: str
+    color: str
+    formats: tuple
+    copy_limits: CopyLimits
+    tips: str
+    audience_reach: str
+    best_for: str
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "icon": self.icon,
+            "color": self.color,
             "formats": [
-                {"name": "Leaderboard", "ratio": "728:90", "width": 728, "height": 90, "css_ratio": "728/90"},
-                {"name": "Medium Rectangle", "ratio": "300:250", "width": 300, "height": 250, "css_ratio": "300/250"},
-                {"name": "Large Rectangle", "ratio": "336:280", "width": 336, "height": 280, "css_ratio": "336/280"},
+                {"name": f.name, "ratio": f.ratio, "width": f.width, "height": f.height, "css_ratio": f.css_ratio}
+                for f in self.formats
             ],
-            "copy_limits": {"headline": 30, "body": 90, "cta": 15},
-            "tips": "Keep it simple. Strong CTA. Test multiple sizes for best reach.",
-            "audience_reach": "90% of internet users",
-            "best_for": "Retargeting, brand awareness, search intent"
+            "copy_limits": {"headline": self.copy_limits.headline, "body": self.copy_limits.body,
+                            "cta": self.copy_limits.cta},
+            "tips": self.tips,
+            "audience_reach": self.audience_reach,
+            "best_for": self.best_for
         }
-    }
 
-    result = {}
-    selected = platforms if platforms else list(all_platforms.keys())
 
+def load_platform_registry(path: str = None):
+    """
+    Build the immutable platform registry from DEFAULT_PLATFORMS, or from a
+    JSON/YAML file with the same shape. Returns a read-only mapping of key -> PlatformSpec.
+    """
+    specs = DEFAULT_PLATFORMS
+    if path:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml
+                specs = yaml.safe_load(f)
+            else:
+                specs = json.load(f)
+
+    registry = {}
+    for key, spec in specs.items():
+        registry[key] = PlatformSpec(
+            key=key,
+            name=spec["name"],
+            icon=spec.get("icon", ""),
+            color=spec.get("color", ""),
+            formats=tuple(AdFormat(**fmt) for fmt in spec["formats"]),
+            copy_limits=CopyLimits(**spec["copy_limits"]),
+            tips=spec.get("tips", ""),
+            audience_reach=spec.get("audience_reach", ""),
+            best_for=spec.get("best_for", "")
+        )
+    return MappingProxyType(registry)
+
+
+PLATFORMS = load_platform_registry(PLATFORM_SPECS_PATH or None)
+# Response payload for each platform, serialized once
+_PLATFORM_PAYLOADS = MappingProxyType({key: spec.to_dict() for key, spec in PLATFORMS.items()})
+
+
+def select_platforms(platforms: list) -> list:
+    """Known platform keys from a request, or every platform when none are given."""
+    return [key for key in (platforms or PLATFORMS.keys()) if key in PLATFORMS]
+
+
+@timed("agent", agent="platform")
+def adapt_for_platforms(brief: dict, copy: dict, images: list, platforms: list, derivatives: dict = None) -> dict:
+    """
+    Platform Agent: Adapts creatives to platform-specific formats and specs.
+    Returns a dict keyed by platform name with the adapted copy and primary image. The static
+    specs (name, icon, formats, tips...) are served once by the /api/platforms catalogue;
+    expand_platforms() inlines them again.
+    With `derivatives` ("WxH" -> URL), each platform also lists the URL of every format's
+    rendered crop, in format order.
+    """
+    selected = select_platforms(platforms)
+    adapted = fit_copies([copy], selected)[0]
+    # The local copy outlives the DALL-E URL, which expires after about an hour
+    primary_image = (images[0].get("local_url") or images[0]["url"]) if images else None
+
+    result = {}
     for platform_key in selected:
-        if platform_key not in all_platforms:
-            continue
+        entry = {"adapted_copy": adapted[platform_key], "primary_image": primary_image}
+        if derivatives:
+            entry["format_urls"] = [derivatives.get(f"{f.width}x{f.height}") for f in PLATFORMS[platform_key].formats]
+        result[platform_key] = entry
+
+    return result
+
 
-        platform = all_platforms[platform_key]
-        limits = platform["copy_limits"]
-
-        # Truncate copy to platform limits
-        adapted_headline = copy.get("headline", "")[:limits["headline"]]
-        adapted_body = copy.get("body", "")[:limits["body"]]
-        adapted_cta = copy.get("cta", "")[:limits["cta"]]
-
-        result[platform_key] = {
-            **platform,
-            "adapted_copy": {
-                "headline": adapted_headline,
-                "body": adapted_body,
-                "cta": adapted_cta
-            },
-            "primary_image": images[0]["url"] if images else None,
-            "primary_format": platform["formats"][0]
+def expand_platforms(platforms: dict) -> dict:
+    """Compact platform results with the catalogue specs inlined (the pre-catalogue response shape)."""
+    expanded = {}
+    for platform_key, entry in platforms.items():
+        payload = _PLATFORM_PAYLOADS.get(platform_key)
+        if payload is None:
+            expanded[platform_key] = entry
+            continue
+        formats = payload["formats"]
+        if entry.get("format_urls"):
+            formats = [{**f, "url": url} for f, url in zip(formats, entry["format_urls"])]
+        expanded[platform_key] = {
+            **payload,
+            "formats": formats,
+            "adapted_copy": entry["adapted_copy"],
+            "primary_image": entry["primary_image"],
+            "primary_format": formats[0]
         }
+    return expanded
 
-    return result
+
+def platform_catalog() -> dict:
+    """Static spec of every platform, keyed like adapt_for_platforms() results."""
+    return dict(_PLATFORM_PAYLOADS)
+
+
+def fit_copies(copies: list, platforms: list) -> list:
+    """
+    Fit many copies to many platforms in one pass.
+    Returns one dict per copy, keyed by platform, of {headline, body, cta} truncated
+    on word boundaries to the platform's limits. All formats of a platform share
+    its copy limits, so fitting happens once per copy and platform.
+    """
+    limits = [(key, PLATFORMS[key].copy_limits) for key in platforms]
+    fitted = []
+    for copy in copies:
+        headline = copy.get("headline", "")
+        body = copy.get("body", "")
+        cta = copy.get("cta", "")
+        fitted.append({
+            key: {
+                "headline": fit_text(headline, lim.headline),
+                "body": fit_text(body, lim.body),
+                "cta": fit_text(cta, lim.cta)
+            }
+            for key, lim in limits
+        })
+    return fitted
+
+
+@lru_cache(maxsize=8192)
+def fit_text(text: str, limit: int) -> str:
+    """
+    Truncate text to at most `limit` user-perceived characters, cutting at a word
+    boundary and marking the cut with an ellipsis. Emoji and combining sequences count as one.
+    """
+    if text.isascii():
+        if len(text) <= limit:
+            return text
+        units = text
+    else:
+        units = graphemes(text)
+        if len(units) <= limit:
+            return text
+
+    if limit <= 1:
+        return "".join(units[:limit])
+
+    cut = "".join(units[:limit - 1])
+    # Prefer the last word boundary, unless that would throw away most of the text
+    space = cut.rfind(" ")
+    if space >= (limit - 1) // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:-–—") + ELLIPSIS
+
+
+def grapheme_len(text: str) -> int:
+    """Length of text in user-perceived characters (grapheme clusters)."""
+    return len(text) if text.isascii() else len(graphemes(text))
+
+
+def graphemes(text: str) -> list:
+    """
+    Split text into grapheme clusters (a practical subset of UAX #29): combining marks,
+    variation selectors, emoji modifiers, tags, ZWJ sequences and regional-indicator
+    pairs (flags) stay attached to the preceding character.
+    """
+    clusters = []
+    after_zwj = False
+    open_flag = False
+    for ch in text:
+        cp = ord(ch)
+        regional = 0x1F1E6 <= cp <= 0x1F1FF
+        if clusters and (after_zwj or _is_extender(ch, cp) or (regional and open_flag)):
+            clusters[-1] += ch
+            open_flag = False
+        else:
+            clusters.append(ch)
+            open_flag = regional
+        after_zwj = cp == 0x200D
+    return clusters
+
+
+def _is_extender(ch: str, cp: int) -> bool:
+    return (
+        cp == 0x200D
+        or 0xFE00 <= cp <= 0xFE0F
+        or 0x1F3FB <= cp <= 0x1F3FF
+        or 0xE0020 <= cp <= 0xE007F
+        or 0xE0100 <= cp <= 0xE01EF
+        or unicodedata.category(ch) in ("Mn", "Me", "Mc")
+    )
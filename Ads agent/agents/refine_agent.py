@@ -0,0 +1,162 @@
+import re
+from agents.creative_agent import generate_copy, generate_copy_all_tones, DEMO_FORMATTERS
+from agents.variation_agent import build_variations
+from agents.platform_agent import adapt_for_platforms
+from agents.seeding import brief_seed, seeded_random
+from agents.intents import analyze
+from services.cache import make_key
+from services.metrics import timed
+
+# Copy turns kept in a session's history
+SESSION_HISTORY = 20
+
+# Emoji added to the headline per tone when a message asks for emojis
+TONE_EMOJI = {"professional": "💼", "playful": "🎉", "urgent": "⚡", "emotional": "💙"}
+_EMOJI_PATTERN = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]+")
+
+# "target young parents", "aimed at students", "audience: gamers"
+_AUDIENCE_PATTERN = re.compile(
+    r"\b(?:target(?:ing)?|aimed at|audience(?:\s+is|\s+to|\s+should be)?\s*:?)\s+([^.,;!?\n]{3,60})",
+    re.IGNORECASE
+)
+
+
+def detect_changes(message: str, brief: dict) -> dict:
+    """
+    What a refinement message changes relative to the brief: any of
+    {"tone": str, "length": "short" | "long", "cta": True, "emoji": "add" | "remove", "audience": str}.
+    """
+    changes = {}
+
+    match = _AUDIENCE_PATTERN.search(message)
+    if match:
+        audience = match.group(1).strip()
+        if audience.lower() != brief.get("audience", "").lower():
+            changes["audience"] = audience
+
+    # The audience phrase itself ("target young runners") must not read as a tone
+    intents = analyze(_AUDIENCE_PATTERN.sub("", message))
+    if intents["tone"] and intents["tone"] != brief.get("tone", "professional"):
+        changes["tone"] = intents["tone"]
+    if intents["length"]:
+        changes["length"] = intents["length"]
+    if intents["cta"]:
+        changes["cta"] = True
+    if intents["emoji"]:
+        changes["emoji"] = intents["emoji"]
+    return changes
+
+
+def new_session(brief: dict, results: dict) -> dict:
+    """Session state for a finished generation: the brief, copy per tone and the reusable agent outputs."""
+    tone_copies = {v["tone"]: {k: v[k] for k in ("headline", "body", "cta")} for v in results["variations"]}
+    return {
+        "brief": brief,
+        "copy": results["copy"],
+        "tone_copies": tone_copies,
+        "images": results["images"],
+        "derivatives": results.get("derivatives"),
+        "turn": 0,
+        "history": []
+    }
+
+
+@timed("agent", agent="refine")
+def refine_session(state: dict, message: str) -> tuple:
+    """
+    Apply one refinement turn to a session. Only the agents the message affects re-run:
+    an audience change regenerates copy for every tone (one creative call); a tone change
+    picks the session's copy for that tone; length and CTA edits rewrite the current copy
+    in place; anything else regenerates the current tone's copy. Images are always reused
+    and platform copy is re-fitted, not re-adapted.
+    Returns (new_state, delta) where delta holds only what the client needs to update.
+    """
+    brief = dict(state["brief"])
+    changes = detect_changes(message, brief)
+    # Each turn gets its own seed, chained from the previous one
+    brief["_seed"] = make_key(brief_seed(brief), message)[:16]
+
+    tone_copies = state["tone_copies"]
+    copy = state["copy"]
+    rerun = []
+
+    if "audience" in changes:
+        brief["audience"] = changes["audience"]
+        tone_copies = generate_copy_all_tones(brief)
+        rerun.append("creative")
+    if "tone" in changes:
+        brief["tone"] = changes["tone"]
+    tone = brief.get("tone", "professional")
+
+    if "audience" in changes or "tone" in changes:
+        copy = {**(tone_copies.get(tone) or generate_copy(brief)), "tone": tone}
+    elif not changes.keys() & {"length", "cta", "emoji"}:
+        copy = generate_copy(brief)
+        rerun.append("creative")
+    copy = dict(copy, product_name=brief.get("product_name"), audience=brief.get("audience"))
+
+    if "length" in changes:
+        copy["body"] = _reshape_body(copy["body"], changes["length"], brief)
+    if "cta" in changes:
+        copy["cta"] = _alternate_cta(copy, brief)
+    if "emoji" in changes:
+        _apply_emoji(copy, changes["emoji"])
+
+    tone_copies = {**tone_copies, tone: {k: copy[k] for k in ("headline", "body", "cta")}}
+    variations = build_variations(copy, tone_copies)
+    previous = {v["tone"]: v for v in build_variations(state["copy"], state["tone_copies"])}
+    platforms = adapt_for_platforms(brief, copy, state["images"], brief["platforms"], state.get("derivatives"))
+
+    turn = state["turn"] + 1
+    history = state["history"] + [{"turn": turn, "message": message, "changes": changes, "copy": copy}]
+    new_state = {
+        **state,
+        "brief": brief,
+        "copy": copy,
+        "tone_copies": tone_copies,
+        "turn": turn,
+        "history": history[-SESSION_HISTORY:]
+    }
+    delta = {
+        "turn": turn,
+        "changes": changes,
+        "rerun": rerun,
+        "copy": copy,
+        # Variants whose copy or primary flag changed, plus the display order of all of them
+        "variations": [v for v in variations if previous.get(v["tone"]) != v],
+        "variation_order": [v["tone"] for v in variations],
+        # Only the re-fitted copy per platform; specs and images are unchanged
+        "platform_copy": {key: p["adapted_copy"] for key, p in platforms.items()}
+    }
+    return new_state, delta
+
+
+def _reshape_body(body: str, length: str, brief: dict) -> str:
+    """Shorter keeps the first sentence; longer appends the product description."""
+    if length == "short":
+        sentences = re.split(r"(?<=[.!?])\s+", body.strip())
+        return sentences[0] if sentences else body
+    description = brief.get("description", "").strip()
+    if not description or description.lower() in body.lower():
+        return body
+    return f"{body} {description[0].upper()}{description[1:].rstrip('.')}."
+
+
+def _apply_emoji(copy: dict, mode: str):
+    """Strip every emoji from the copy, or add the tone's emoji to the headline if it has none."""
+    if mode == "remove":
+        for field in ("headline", "body", "cta"):
+            copy[field] = " ".join(_EMOJI_PATTERN.sub("", copy[field]).split())
+    elif not _EMOJI_PATTERN.search(copy["headline"]):
+        copy["headline"] = f"{copy['headline']} {TONE_EMOJI.get(copy.get('tone'), '✨')}"
+
+
+def _alternate_cta(copy: dict, brief: dict) -> str:
+    """A different call to action from the curated list for the copy's tone."""
+    tone = copy.get("tone") if copy.get("tone") in DEMO_FORMATTERS else "professional"
+    options = [
+        fmt(product=brief.get("product_name", "Our Product"), audience=brief.get("audience", "customers"))
+        for fmt in DEMO_FORMATTERS[tone]["cta"]
+    ]
+    options = [o for o in options if o != copy.get("cta")] or options
+    return seeded_random(brief, "cta").choice(options)
@@ -0,0 +1,287 @@
+import re
+from services.lazy_import import lazy_module
+from agents.platform_agent import PLATFORMS, select_platforms
+
+# numpy is imported on the first ranking, not at app start
+np = lazy_module("numpy")
+
+FIELDS = ("headline", "body", "cta")
+
+# Weight of each feature in a candidate's score (they sum to 1)
+SCORE_WEIGHTS = {"length": 0.4, "keywords": 0.3, "readability": 0.2, "emoji": 0.1}
+# Weight of each field in the length fit: the headline is what gets read
+LENGTH_WEIGHTS = {"headline": 0.45, "body": 0.4, "cta": 0.15}
+# Emoji per 100 characters a platform's audience tolerates before the score drops
+EMOJI_TOLERANCE = {"instagram": 3.0, "facebook": 2.0, "twitter": 2.0, "linkedin": 0.5, "google": 0.0}
+DEFAULT_EMOJI_TOLERANCE = 1.0
+# Brief keywords a candidate must mention for full keyword credit, and the most tracked per brief
+KEYWORD_SATURATION = 3
+MAX_KEYWORDS = 64
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "the and for with that this from your you our are who was were will into over than then them they "
+    "their has have had not but all any can its it's one out who what when where which while aged".split()
+)
+
+
+class CandidateSet:
+    """
+    Copy candidates, held as indexes into per-field lists of distinct texts.
+    Candidates built from combinations share their texts, so each text's features are
+    computed once however many candidates use it.
+    """
+
+    def __init__(self):
+        self.texts = {field: [] for field in FIELDS}
+        self._ids = {field: {} for field in FIELDS}
+        self.tones = []
+        self._tone_ids = {}
+        self._columns = []  # (tone ids, headline ids, body ids, cta ids) per added block
+
+    def __len__(self) -> int:
+        return sum(len(block[0]) for block in self._columns)
+
+    def add_combinations(self, tone: str, options: dict):
+        """Every headline x body x cta combination of `options` ({field: [text, ...]}) for a tone."""
+        ids = [[self._text_id(field, text) for text in options[field]] for field in FIELDS]
+        if not all(ids):
+            return
+        grid = np.indices([len(i) for i in ids]).reshape(len(FIELDS), -1)
+        columns = [np.asarray(i, np.int32)[g] for i, g in zip(ids, grid)]
+        self._columns.append((np.full(grid.shape[1], self._tone_id(tone), np.int16), *columns))
+
+    def add_rows(self, tone: str, rows: list):
+        """Complete candidates for a tone, as (headline, body, cta) tuples."""
+        if not rows:
+            return
+        columns = [np.array([self._text_id(f, t) for t in texts], np.int32) for f, texts in zip(FIELDS, zip(*rows))]
+        self._columns.append((np.full(len(rows), self._tone_id(tone), np.int16), *columns))
+
+    def columns(self) -> tuple:
+        """(tone ids, headline ids, body ids, cta ids) as arrays over all candidates."""
+        if not self._columns:
+            return tuple(np.empty(0, np.int32) for _ in range(len(FIELDS) + 1))
+        return tuple(np.concatenate(column) for column in zip(*self._columns))
+
+    def candidate(self, index: int, columns: tuple) -> dict:
+        tone, *ids = (int(column[index]) for column in columns)
+        return {"tone": self.tones[tone], **{f: self.texts[f][i] for f, i in zip(FIELDS, ids)}}
+
+    def _text_id(self, field: str, text: str) -> int:
+        ids = self._ids[field]
+        found = ids.get(text)
+        if found is None:
+            found = ids[text] = len(self.texts[field])
+            self.texts[field].append(text)
+        return found
+
+    def _tone_id(self, tone: str) -> int:
+        if tone not in self._tone_ids:
+            self._tone_ids[tone] = len(self.tones)
+            self.tones.append(tone)
+        return self._tone_ids[tone]
+
+
+def brief_keywords(brief: dict) -> list:
+    """
+    Distinct content words of the brief's description and audience, in order. The product name
+    is left out: every candidate names the product, so it would not tell candidates apart.
+    """
+    text = " ".join(str(brief.get(f, "")) for f in ("description", "audience")).lower()
+    words = [w for w in _WORD.findall(text) if len(w) >= 3 and not w.isdigit() and w not in _STOPWORDS]
+    return list(dict.fromkeys(words))[:MAX_KEYWORDS]
+
+
+def text_features(texts: list, keywords: list) -> dict:
+    """
+    Features of many texts at once: {length, emoji, words, sentences, keyword_mask}, one array entry per text.
+    The texts are joined into one UTF-8 buffer and every count is a vectorized mask over its bytes,
+    summed per text with np.add.reduceat, so the cost is a few passes over the buffer rather than
+    a Python loop per text. keyword_mask has bit i set when keywords[i] starts a word of the text.
+    """
+    # Every text ends with a NUL separator, so no segment is empty
+    buf = np.frombuffer(("\x00".join(texts) + "\x00").encode("utf-8"), np.uint8)
+    ends = np.flatnonzero(buf == 0)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    def per_text(mask):
+        return np.add.reduceat(mask, starts, dtype=np.int32)
+
+    following = np.append(buf[1:], np.uint8(0))
+    features = {
+        # Characters are the bytes that do not continue a multi-byte sequence (less the separator)
+        "length": per_text((buf & 0xC0) != 0x80) - 1,
+        # Emoji: 4-byte sequences (U+10000 up) plus U+2300-U+2BFF symbols and dingbats (⏰ ✨ ⭐)
+        "emoji": per_text((buf >= 0xF0) | ((buf == 0xE2) & (following >= 0x8C) & (following <= 0xAF))),
+        "words": per_text(buf == 0x20) + 1,
+        "sentences": np.maximum(per_text((buf == 0x2E) | (buf == 0x21) | (buf == 0x3F)), 1),
+        "keyword_mask": _keyword_masks(buf, starts, keywords),
+    }
+    return features
+
+
+def _keyword_masks(buf, starts, keywords: list):
+    """
+    Bitmask per text of the keywords found at the start of one of its words (so "bottle" also
+    matches "bottles"). A rolling hash is extended one byte at a time from every word start;
+    positions whose hash is no longer a prefix of any keyword are dropped, so after the first
+    few bytes only real keyword occurrences are still being followed.
+    """
+    masks = np.zeros(len(starts), np.uint64)
+    if not keywords:
+        return masks
+    lower = np.where((buf >= 0x41) & (buf <= 0x5A), buf + 0x20, buf)
+    alnum = ((lower >= 0x61) & (lower <= 0x7A)) | ((lower >= 0x30) & (lower <= 0x39))
+    positions = np.flatnonzero(alnum & ~np.concatenate(([False], alnum[:-1])))
+
+    encoded = [k.encode("utf-8") for k in keywords]
+    longest = max(len(word) for word in encoded)
+    padded = np.concatenate((lower, np.zeros(longest, np.uint8)))
+    # First cut: the word's first two bytes must begin some keyword (a 64K-entry lookup table)
+    pairs = np.zeros(1 << 16, bool)
+    pairs[[w[0] << 8 | (w[1] if len(w) > 1 else 0) for w in encoded]] = True
+    short = [w for w in encoded if len(w) == 1]
+    first = padded[positions].astype(np.uint16) << 8
+    alive = pairs[first | padded[positions + 1]]
+    if short:
+        alive |= pairs[first]
+    positions = positions[alive]
+
+    # Hashes of every keyword prefix by length, and of each whole keyword
+    prefixes = [np.unique(np.array([_hash(w[:n]) for w in encoded if len(w) >= n], np.uint64))
+                for n in range(1, longest + 1)]
+    whole = {(len(w), _hash(w)): index for index, w in enumerate(encoded)}
+    hashes = np.zeros(len(positions), np.uint64)
+    for n in range(1, longest + 1):
+        hashes = hashes * np.uint64(_HASH_BASE) + padded[positions + n - 1]
+        if n > 2:
+            alive = _isin_sorted(hashes, prefixes[n - 1])
+            positions, hashes = positions[alive], hashes[alive]
+        for (length, value), index in whole.items():
+            if length == n:
+                found = positions[hashes == value]
+                # Duplicate owners all write the same value, so a plain |= is safe
+                masks[np.searchsorted(starts, found, side="right") - 1] |= np.uint64(1 << index)
+        if not len(positions):
+            break
+    return masks
+
+
+def _isin_sorted(values, table):
+    at = np.searchsorted(table, values).clip(0, len(table) - 1)
+    return table[at] == values
+
+
+_HASH_BASE = 1099511628211  # FNV prime; hashes wrap modulo 2**64
+
+
+def _hash(word: bytes) -> int:
+    h = 0
+    for byte in word:
+        h = (h * _HASH_BASE + byte) % (1 << 64)
+    return h
+
+
+def score_candidates(candidates: CandidateSet, brief: dict, platforms: list) -> tuple:
+    """
+    Score every candidate for every platform. Returns (scores, parts, columns):
+    scores is an (n, len(platforms)) float32 array in [0, 1]; parts holds the per-feature
+    arrays behind it ({length: (n, P), keywords: (n,), readability: (n,), emoji: (n, P)}).
+    """
+    keywords = brief_keywords(brief)
+    columns = candidates.columns()
+    features = {f: text_features(candidates.texts[f], keywords) for f in FIELDS}
+    ids = dict(zip(FIELDS, columns[1:]))
+
+    # Length fit per text and platform, then gathered per candidate
+    length = 0
+    for field in FIELDS:
+        limits = np.array([getattr(PLATFORMS[p].copy_limits, field) for p in platforms], np.float32)
+        fit = _length_fit(features[field]["length"][:, None] / limits[None, :])
+        length = length + LENGTH_WEIGHTS[field] * fit[ids[field]]
+
+    # Share of the brief's keywords mentioned anywhere in the candidate
+    mentioned = (features["headline"]["keyword_mask"][ids["headline"]]
+                 | features["body"]["keyword_mask"][ids["body"]]
+                 | features["cta"]["keyword_mask"][ids["cta"]])
+    saturation = max(1, min(len(keywords), KEYWORD_SATURATION))
+    keyword_score = np.minimum(_popcount(mentioned) / saturation, 1.0).astype(np.float32)
+
+    # Readability of the body: Flesch reading ease, with syllables estimated from word length
+    body = features["body"]
+    words_per_sentence = body["words"] / body["sentences"]
+    syllables_per_word = body["length"] / body["words"] / 3.0
+    ease = 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word
+    readability = (np.clip(ease, 0, 100) / 100).astype(np.float32)[ids["body"]]
+
+    # Emoji density against each platform's tolerance
+    emoji = sum(features[f]["emoji"][ids[f]] for f in FIELDS)
+    chars = sum(features[f]["length"][ids[f]] for f in FIELDS)
+    density = (emoji * 100.0 / np.maximum(chars, 1)).astype(np.float32)
+    tolerance = np.array([EMOJI_TOLERANCE.get(p, DEFAULT_EMOJI_TOLERANCE) for p in platforms], np.float32)
+    emoji_score = 1 - np.clip((density[:, None] - tolerance) / (tolerance + 2), 0, 1)
+
+    scores = (SCORE_WEIGHTS["length"] * length
+              + SCORE_WEIGHTS["keywords"] * keyword_score[:, None]
+              + SCORE_WEIGHTS["readability"] * readability[:, None]
+              + SCORE_WEIGHTS["emoji"] * emoji_score).astype(np.float32)
+    parts = {"length": length, "keywords": keyword_score, "readability": readability, "emoji": emoji_score}
+    return scores, parts, columns
+
+
+def top_k(scores, k: int):
+    """(k, P) indexes of the k best candidates per platform column, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty((0, scores.shape[1]), np.int64)
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1, axis=0)[:k]
+    else:
+        best = np.tile(np.arange(len(scores))[:, None], (1, scores.shape[1]))
+    order = np.argsort(-np.take_along_axis(scores, best, axis=0), axis=0, kind="stable")
+    return np.take_along_axis(best, order, axis=0)
+
+
+def rank_candidates(candidates: CandidateSet, brief: dict, platforms: list, k: int = 3) -> dict:
+    """{platform: [the k best candidates for it, each with its score and feature scores]}."""
+    platforms = select_platforms(platforms)
+    if not len(candidates) or not platforms:
+        return {p: [] for p in platforms}
+    scores, parts, columns = score_candidates(candidates, brief, platforms)
+    best = top_k(scores, k)
+    ranked = {}
+    for p, platform in enumerate(platforms):
+        ranked[platform] = [
+            {
+                **candidates.candidate(i, columns),
+                "score": round(float(scores[i, p]), 4),
+                "features": {
+                    "length": round(float(parts["length"][i, p]), 3),
+                    "keywords": round(float(parts["keywords"][i]), 3),
+                    "readability": round(float(parts["readability"][i]), 3),
+                    "emoji": round(float(parts["emoji"][i, p]), 3),
+                }
+            }
+            for i in best[:, p].tolist()
+        ]
+    return ranked
+
+
+def _length_fit(ratio):
+    """
+    Score of a text's length as a share of its limit: full marks from half the limit up to
+    the limit, a little less when much shorter, and at most 0.5 once over (the platform agent
+    truncates it), falling to 0 at one and a half times the limit.
+    """
+    within = 1 - 0.3 * np.clip(0.5 - ratio, 0, 0.5) / 0.5
+    over = 0.5 * np.clip(1 - (ratio - 1) * 2, 0, 1)
+    return np.where(ratio <= 1, within, over).astype(np.float32)
+
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # numpy < 2: count the set bits of each byte through a lookup table
+    table = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+    return table[values.view(np.uint8).reshape(len(values), 8)].sum(axis=1)
@@ -0,0 +1,18 @@
+import random
+from services.cache import make_key
+
+
+def brief_seed(brief: dict) -> str:
+    """
+    Seed for a brief: the explicit `_seed` if one was given, otherwise a hash of the
+    normalized brief, so the same brief always produces the same creatives.
+    """
+    seed = brief.get("_seed")
+    if seed is not None:
+        return str(seed)
+    return make_key(brief)[:16]
+
+
+def seeded_random(brief: dict, *salt) -> random.Random:
+    """Independent random.Random for one stage of one brief (e.g. salt "copy", tone)."""
+    return random.Random(":".join([brief_seed(brief), *map(str, salt)]))
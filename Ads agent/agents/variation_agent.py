@@ -1,78 +1,112 @@
-import copy as copy_module
-from agents.creative_agent import generate_copy, DEMO_COPY, _fill_template
-import random
+from agents.creative_agent import generate_copy_all_tones, generate_copy_all_tones_async, generate_copy_options
+from agents import creative_agent
+from agents.scoring import CandidateSet, rank_candidates
+from services.metrics import timed
 
 TONES = ["professional", "playful", "urgent", "emotional"]
 
+# Typical performance characteristics per tone. Static, so responses carry only the tone
+# and clients read the hints from the /api/platforms catalogue.
+PERFORMANCE_HINTS = {
+    "professional": {
+        "best_for": "B2B, LinkedIn, decision-makers",
+        "avg_ctr": "2.1%",
+        "conversion": "High",
+        "icon": "💼"
+    },
+    "playful": {
+        "best_for": "Instagram, Gen Z, lifestyle brands",
+        "avg_ctr": "3.4%",
+        "conversion": "Medium",
+        "icon": "🎉"
+    },
+    "urgent": {
+        "best_for": "Retargeting, flash sales, limited offers",
+        "avg_ctr": "4.2%",
+        "conversion": "Very High",
+        "icon": "⚡"
+    },
+    "emotional": {
+        "best_for": "Facebook, storytelling, brand awareness",
+        "avg_ctr": "2.8%",
+        "conversion": "High",
+        "icon": "💙"
+    }
+}
+
 
+@timed("agent", agent="variation")
 def generate_variations(brief: dict, base_copy: dict) -> list:
     """
     Variation Agent: Produces multiple A/B test variations of the base creative.
     Generates one version per tone (professional, playful, urgent, emotional).
+    In OpenAI mode every other tone comes from one multi-tone completion.
+    """
+    base_tone = base_copy.get("tone", "professional")
+    # The base copy already covers the primary tone
+    others = [t for t in TONES if t != base_tone]
+    if not creative_agent.DEMO_MODE and creative_agent.OPENAI_API_KEY:
+        return build_variations(base_copy, generate_copy_all_tones(brief, others))
+
+    # Demo copy is seeded per brief and tone, so variations are reproducible
+    tone_copies = {tone: creative_agent._generate_copy_demo({**brief, "tone": tone}) for tone in others}
+    return build_variations(base_copy, tone_copies)
+
+
+@timed("agent", agent="variation")
+async def generate_variations_async(brief: dict, base_copy: dict) -> list:
+    """Variation Agent on the async OpenAI client."""
+    base_tone = base_copy.get("tone", "professional")
+    others = [t for t in TONES if t != base_tone]
+    if not creative_agent.DEMO_MODE and creative_agent.OPENAI_API_KEY:
+        return build_variations(base_copy, await generate_copy_all_tones_async(brief, others))
+
+    tone_copies = {tone: creative_agent._generate_copy_demo({**brief, "tone": tone}) for tone in others}
+    return build_variations(base_copy, tone_copies)
+
+
+def build_variations(base_copy: dict, tone_copies: dict) -> list:
+    """
+    Assemble the A/B variation list from copy for each tone.
+    The base copy is used for its own tone and is sorted first.
     """
     variations = []
-    product_name = brief.get("product_name", "Our Product")
-    audience = brief.get("audience", "customers")
     base_tone = base_copy.get("tone", "professional")
 
     for tone in TONES:
-        if tone == base_tone:
-            # Use the already-generated base copy for the primary tone
-            variations.append({
-                "tone": tone,
-                "headline": base_copy["headline"],
-                "body": base_copy["body"],
-                "cta": base_copy["cta"],
-                "is_primary": True,
-                "performance_hint": _get_performance_hint(tone)
-            })
-        else:
-            # Generate variation for this tone
-            copy_data = DEMO_COPY[tone]
-            headline = _fill_template(random.choice(copy_data["headline"]), product_name, audience)
-            body = _fill_template(random.choice(copy_data["body"]), product_name, audience)
-            cta = _fill_template(random.choice(copy_data["cta"]), product_name, audience)
-
-            variations.append({
-                "tone": tone,
-                "headline": headline,
-                "body": body,
-                "cta": cta,
-                "is_primary": False,
-                "performance_hint": _get_performance_hint(tone)
-            })
+        primary = tone == base_tone
+        source = base_copy if primary else tone_copies.get(tone)
+        if source is None:
+            continue
+        variations.append({
+            "tone": tone,
+            "headline": source["headline"],
+            "body": source["body"],
+            "cta": source["cta"],
+            "is_primary": primary
+        })
 
     # Sort so primary tone is first
     variations.sort(key=lambda v: (0 if v["is_primary"] else 1, TONES.index(v["tone"])))
     return variations
 
 
-def _get_performance_hint(tone: str) -> dict:
-    """Return typical performance characteristics for each tone."""
-    hints = {
-        "professional": {
-            "best_for": "B2B, LinkedIn, decision-makers",
-            "avg_ctr": "2.1%",
-            "conversion": "High",
-            "icon": "💼"
-        },
-        "playful": {
-            "best_for": "Instagram, Gen Z, lifestyle brands",
-            "avg_ctr": "3.4%",
-            "conversion": "Medium",
-            "icon": "🎉"
-        },
-        "urgent": {
-            "best_for": "Retargeting, flash sales, limited offers",
-            "avg_ctr": "4.2%",
-            "conversion": "Very High",
-            "icon": "⚡"
-        },
-        "emotional": {
-            "best_for": "Facebook, storytelling, brand awareness",
-            "avg_ctr": "2.8%",
-            "conversion": "High",
-            "icon": "💙"
-        }
-    }
-    return hints.get(tone, hints["professional"])
+@timed("agent", agent="variation_rank")
+def rank_variations(brief: dict, platforms: list = None, k: int = 3, per_field: int = 3) -> tuple:
+    """
+    Over-generate and rank: every headline x body x cta combination of the copy options for each
+    tone is scored for each platform (agents.scoring), and the k best per platform are returned.
+    Returns ({platform: [candidate, ...]}, number of candidates scored).
+    """
+    candidates = CandidateSet()
+    for tone, options in generate_copy_options(brief, TONES, per_field).items():
+        candidates.add_combinations(tone, options)
+    return rank_candidates(candidates, brief, platforms, k), len(candidates)
+
+
+def expand_variations(variations: list) -> list:
+    """Variations with each tone's performance hint inlined (the pre-catalogue response shape)."""
+    return [
+        {**v, "performance_hint": PERFORMANCE_HINTS.get(v["tone"], PERFORMANCE_HINTS["professional"])}
+        for v in variations
+    ]
@@ -1,73 +1,50 @@
-import os
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask
 from flask_cors import CORS
-from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import config
 from routes.api import api_bp
+from routes.auth import auth_bp
+from routes.pages import pages_bp
+from services.serialization import FastJSONProvider
+from services.compression import compress_response
+from services.static_assets import AssetStore
 
-load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv("FLASK_SECRET_KEY", "agentic-ads-secret-key-2024")
+def create_app() -> Flask:
+    """
+    Build the Flask app. Importing this module does the expensive work once (agents, stores,
+    blueprints), so `gunicorn --preload` pays it in the master and forks warm workers.
+    """
+    app = Flask(__name__)
+    app.secret_key = config.secret_key
 
-# Enable CORS for all routes
-CORS(app)
+    # Client address and scheme from X-Forwarded-For/-Proto, trusting only the last PROXY_HOPS entries
+    if config.proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=config.proxy_hops, x_proto=config.proxy_hops)
 
-# Register blueprints
-app.register_blueprint(api_bp)
+    # Compact JSON (orjson when installed), gzip/brotli-compressed when the client accepts it
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
 
-# Simple in-memory user store (use a database in production)
-users_db = {}
+    # Enable CORS for all routes
+    CORS(app)
 
+    # Fingerprinted, precompressed static files for the templates: {{ asset_url("js/app.js") }}
+    assets = app.extensions["assets"] = AssetStore(app.static_folder)
+    app.context_processor(lambda: {"asset_url": assets.url})
 
-@app.route("/")
-def index():
-    return render_template("index.html")
+    # Register blueprints
+    app.register_blueprint(pages_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(api_bp)
+    return app
 
 
-@app.route("/login")
-def login():
-    return render_template("login.html")
-
-
-@app.route("/api/auth/google", methods=["POST"])
-def google_auth():
-    """Receive Google OAuth user data and store it."""
-    data = request.get_json()
-    if not data or not data.get("user"):
-        return jsonify({"error": "No user data provided"}), 400
-
-    user = data["user"]
-    email = user.get("email", "")
-
-    # Store/update user in our simple DB
-    users_db[email] = {
-        "name": user.get("name", ""),
-        "email": email,
-        "picture": user.get("picture", ""),
-        "provider": user.get("provider", "google"),
-        "sub": user.get("sub", ""),
-        "last_login": __import__("time").strftime("%Y-%m-%dT%H:%M:%SZ", __import__("time").gmtime())
-    }
-
-    print(f"[Auth] User signed in: {user.get('name')} <{email}>")
-
-    return jsonify({
-        "status": "ok",
-        "user": users_db[email],
-        "message": f"Welcome, {user.get('name')}!"
-    }), 200
-
-
-@app.route("/api/auth/users", methods=["GET"])
-def list_users():
-    """List all signed-in users (admin endpoint)."""
-    return jsonify({"users": list(users_db.values()), "count": len(users_db)}), 200
+app = create_app()
 
 
 if __name__ == "__main__":
-    debug = os.getenv("FLASK_DEBUG", "true").lower() == "true"
-    port = int(os.getenv("PORT", 5000))
-    print(f"\n[AdGenius AI] Starting on http://localhost:{port}")
-    print(f"[Config] Demo mode: {os.getenv('DEMO_MODE', 'true')}")
-    print(f"[Config] OpenAI key: {'SET' if os.getenv('OPENAI_API_KEY') else 'NOT SET (using demo mode)'}\n")
-    app.run(debug=debug, port=port)
+    print(f"\n[AdGenius AI] Starting on http://localhost:{config.port}")
+    print(f"[Config] Demo mode: {config.demo_mode}")
+    print(f"[Config] OpenAI key: {'SET' if config.openai_api_key else 'NOT SET (using demo mode)'}\n")
+    app.run(debug=config.debug, port=config.port)
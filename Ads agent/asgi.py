@@ -0,0 +1,258 @@
+"""
+ASGI entry point. Generation (POST /api/generate and GET /api/generate/stream) runs
+natively on the event loop with the async agents, so one worker keeps hundreds of
+generations in flight while they wait on OpenAI. Every other route is served by the
+Flask app through asgiref's WSGI adapter, on a pool of WSGI_THREADS threads.
+
+Run:  uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import json
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.http import parse_etags, parse_cookie
+from config import config
+from app import app as flask_app
+from agents.pipeline import run_generate_pipeline_async, aiter_generate_pipeline, AgentTimeoutError
+from routes.api import (_parse_brief, _stream_query, _generate_result, _finish_stream, _content_hash, _sse,
+                        _present_stage, GENERATE_DEADLINE, CATALOG_VERSION, ADMISSION_CLASSES)
+from services.metrics import span, server_timing
+from services.resilience import deadline
+from services.serialization import dumps_bytes
+from services.compression import encode_body
+from services.admission import admit_async, AdmissionRejected
+
+# Threads running Flask routes. asgiref's default runs every WSGI request on one shared thread.
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "16"))
+
+_wsgi_executor = None
+_wsgi_executor_lock = threading.Lock()
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi serving requests in parallel on the WSGI thread pool, like gunicorn's gthread workers."""
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=_get_wsgi_executor())(body)
+
+    def _run_wsgi_app(self, body):
+        """asgiref's run_wsgi_app, which also closes the response so call_on_close callbacks run."""
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:
+            # Too many duplicate headers
+            self.sync_send({"type": "http.response.start", "status": 400,
+                            "headers": [(b"content-type", b"text/plain")]})
+            self.sync_send({"type": "http.response.body", "body": b"Bad Request"})
+            return
+        iterable = self.wsgi_application(environ, self.start_response)
+        try:
+            bytes_sent = 0
+            for output in iterable:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                if self.response_content_length is not None:
+                    output = output[:self.response_content_length - bytes_sent]
+                self.sync_send({"type": "http.response.body", "body": output, "more_body": True})
+                bytes_sent += len(output)
+                if bytes_sent == self.response_content_length:
+                    break
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({"type": "http.response.body"})
+
+
+def _get_wsgi_executor() -> ThreadPoolExecutor:
+    global _wsgi_executor
+    with _wsgi_executor_lock:
+        if _wsgi_executor is None:
+            _wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+        return _wsgi_executor
+
+
+wsgi_app = ThreadedWsgiToAsgi(flask_app)
+
+# Flask-CORS allows every origin on the Flask routes; the native routes match it
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http":
+        route = _NATIVE_ROUTES.get((scope["method"], scope["path"].rstrip("/")))
+        if route is not None:
+            handler, endpoint = route
+            with span("http_request", route=scope["path"].rstrip("/"), method=scope["method"]):
+                try:
+                    slot = await admit_async(_session_user(scope), _client_ip(scope), ADMISSION_CLASSES[endpoint])
+                except AdmissionRejected as e:
+                    await _send_json(send, 429, {"error": str(e), "reason": e.reason, "retry_after": e.retry_after},
+                                     [(b"retry-after", str(e.retry_after).encode())], scope)
+                    return
+                try:
+                    await handler(scope, receive, send)
+                finally:
+                    slot.release()
+            return
+    elif scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    await wsgi_app(scope, receive, send)
+
+
+async def generate(scope, receive, send):
+    """POST /api/generate on the async agents; same responses as the Flask route."""
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    brief, error = _parse_brief(data)
+    if error:
+        await _send_json(send, 400, {"error": error}, scope=scope)
+        return
+
+    try:
+        with deadline(GENERATE_DEADLINE):
+            results, timings = await run_generate_pipeline_async(brief)
+    except AgentTimeoutError as e:
+        await _send_json(send, 504, {"error": str(e), "stage": e.stage}, scope=scope)
+        return
+    except Exception as e:
+        await _send_json(send, 500, {"error": str(e)}, scope=scope)
+        return
+
+    digest = _content_hash(brief, results)
+    headers = [(b"server-timing", server_timing(timings).encode()), (b"etag", f'"{digest}"'.encode())]
+    if parse_etags(_header(scope, b"if-none-match")).contains_weak(digest):
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await _send_json(send, 200, _generate_result(brief, results, timings, digest), headers, scope)
+
+
+async def generate_stream(scope, receive, send):
+    """GET /api/generate/stream: server-sent events from the async pipeline."""
+    query = dict(parse_qsl(scope.get("query_string", b"").decode("utf-8")))
+    brief, error = _parse_brief(_stream_query(query))
+    if error:
+        await _send_json(send, 400, {"error": error}, scope=scope)
+        return
+
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+        *CORS_HEADERS,
+    ]})
+
+    async def event(name: str, value: dict):
+        await send({"type": "http.response.body", "body": _sse(name, value).encode("utf-8"), "more_body": True})
+
+    job_id = str(uuid.uuid4())
+    await event("start", {"job_id": job_id, "brief": brief, "catalog_version": CATALOG_VERSION})
+    try:
+        results = {}
+        with deadline(GENERATE_DEADLINE):
+            async for name, value in aiter_generate_pipeline(brief):
+                if name == "done":
+                    _finish_stream(job_id, brief, results, value)
+                elif name != "image":
+                    results[name] = value
+                await event(name, _present_stage(brief, name, value))
+    except AgentTimeoutError as e:
+        await event("error", {"error": str(e), "stage": e.stage})
+    except Exception as e:
+        await event("error", {"error": str(e)})
+    await send({"type": "http.response.body", "body": b""})
+
+
+# (handler, Flask endpoint name): the endpoint picks the admission priority class
+_NATIVE_ROUTES = {
+    ("POST", "/api/generate"): (generate, "api.generate"),
+    ("GET", "/api/generate/stream"): (generate_stream, "api.generate_stream"),
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _session_user(scope) -> str:
+    """Signed-in user id from the Flask session cookie, as set by /api/auth/google."""
+    cookie = parse_cookie(_header(scope, b"cookie") or "").get(flask_app.config["SESSION_COOKIE_NAME"])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not cookie or serializer is None:
+        return None
+    try:
+        data = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return None
+    return data.get("user_id")
+
+
+def _client_ip(scope) -> str:
+    """
+    Client address for the rate limits. Behind PROXY_HOPS proxies it is the entry they added to
+    X-Forwarded-For, the same one ProxyFix gives the Flask routes; anything before it is client-supplied.
+    """
+    peer = (scope.get("client") or (None,))[0]
+    if not config.proxy_hops:
+        return peer
+    forwarded = [host.strip() for key, value in scope["headers"] if key.lower() == b"x-forwarded-for"
+                 for host in value.decode("latin-1").split(",") if host.strip()]
+    return forwarded[-config.proxy_hops] if len(forwarded) >= config.proxy_hops else peer
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope["headers"]:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _send_json(send, status: int, body: dict, headers: list = (), scope: dict = None):
+    """JSON response, compressed like the Flask routes when the client accepts it."""
+    accept_encoding = _header(scope, b"accept-encoding") if scope else None
+    payload, coding = encode_body(dumps_bytes(body), "application/json", accept_encoding or "")
+    headers = list(headers)
+    if coding is not None:
+        # The compressed bytes are another representation: the ETag becomes weak
+        headers = [(k, b"W/" + v if k == b"etag" and not v.startswith(b"W/") else v) for k, v in headers]
+        headers += [(b"content-encoding", coding.encode())]
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(payload)).encode()),
+        (b"vary", b"Accept-Encoding"),
+        *CORS_HEADERS,
+        *headers,
+    ]})
+    await send({"type": "http.response.body", "body": payload})
@@ -0,0 +1,8 @@
+# Benchmarks package
+import os
+
+# Benchmarks measure the app itself: admission control is off unless configured explicitly
+for _name in ("RATE_LIMIT_USER_PER_MIN", "RATE_LIMIT_IP_PER_MIN", "ADMISSION_MAX_ACTIVE"):
+    os.environ.setdefault(_name, "0")
+# Fake DALL-E URLs do not resolve: generated images are not downloaded
+os.environ.setdefault("IMAGE_DOWNLOAD", "false")
@@ -0,0 +1,179 @@
+"""
+Load test: POST /api/generate under concurrency, gunicorn gthread (WSGI) vs uvicorn (ASGI).
+
+Both servers run as subprocesses in OpenAI mode against a fake OpenAI server
+(benchmarks.fake_openai, in its own process) with injected latency, so every
+request spends most of its time waiting on the provider. Reports throughput,
+p50/p99 latency, and the server's peak RSS and thread count at each concurrency level.
+
+Run from the app directory:
+    python -m benchmarks.bench_asgi_load
+    python -m benchmarks.bench_asgi_load --concurrency 16 64 256 --latency-ms 300
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import httpx
+
+SERVERS = {
+    "gunicorn-gthread": ["gunicorn", "app:app", "--worker-class", "gthread", "--threads", "16", "-w", "1",
+                         "--timeout", "120", "--log-level", "warning"],
+    "uvicorn-asgi": ["uvicorn", "asgi:app", "--log-level", "warning", "--no-access-log"],
+}
+
+BRIEF = {
+    "description": "Insulated steel water bottle that keeps drinks cold for 24 hours",
+    "audience": "Outdoor enthusiasts aged 25-40",
+    "tone": "professional",
+    "platforms": ["instagram", "facebook", "twitter", "linkedin"],
+    "no_cache": True,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start(name: str, port: int, base_url: str) -> subprocess.Popen:
+    command = list(SERVERS[name])
+    command += ["--bind", f"127.0.0.1:{port}"] if name.startswith("gunicorn") else ["--port", str(port)]
+    return _wait_ready(name, subprocess.Popen(command, env=_server_env(base_url)), f"http://127.0.0.1:{port}/api/health")
+
+
+def _start_fake_openai(port: int, latency_ms: float) -> subprocess.Popen:
+    # Its own process, so the load generator and the fake API don't share a GIL
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(port),
+                                "--latency-ms", str(latency_ms)], stdout=subprocess.DEVNULL)
+    return _wait_ready("fake OpenAI", process, f"http://127.0.0.1:{port}/v1/models")
+
+
+def _server_env(base_url: str) -> dict:
+    return {
+        **os.environ,
+        "DEMO_MODE": "false",
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_MAX_CONNECTIONS": "1000",
+        "OPENAI_MAX_KEEPALIVE": "1000",
+    }
+
+
+def _wait_ready(name: str, process: subprocess.Popen, url: str) -> subprocess.Popen:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{name} did not start ({url})")
+
+
+def _proc_status(pid: int) -> dict:
+    """RSS (KB) and thread count of a process and its children, from /proc."""
+    totals = {"rss_kb": 0, "threads": 0}
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key == "VmRSS":
+                        totals["rss_kb"] += int(value.split()[0])
+                    elif key == "Threads":
+                        totals["threads"] += int(value)
+        except OSError:
+            pass
+    return totals
+
+
+async def _load(url: str, concurrency: int, requests: int, pid: int) -> dict:
+    latencies, errors, peak = [], 0, {"rss_kb": 0, "threads": 0}
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json={**BRIEF, "product_name": f"EcoBottle {i}"})
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async def sample(done):
+        while not done.is_set():
+            current = _proc_status(pid)
+            for key in peak:
+                peak[key] = max(peak[key], current[key])
+            await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=300) as client:
+        done = asyncio.Event()
+        sampler = asyncio.create_task(sample(done))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+
+    latencies.sort()
+    return {
+        "throughput": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "errors": errors,
+        **peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/generate on WSGI vs ASGI")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[16, 64, 256])
+    parser.add_argument("--requests", type=int, default=0, help="Requests per level (default 2x concurrency)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Injected fake OpenAI latency")
+    parser.add_argument("--servers", nargs="*", choices=list(SERVERS), default=list(SERVERS))
+    args = parser.parse_args()
+
+    print(f"{'server':<18} {'conc':>5} {'req/s':>8} {'p50':>9} {'p99':>9} {'errors':>7} {'RSS MB':>7} {'threads':>8}")
+    fake_port = _free_port()
+    fake = _start_fake_openai(fake_port, args.latency_ms)
+    try:
+        for name in args.servers:
+            port = _free_port()
+            process = _start(name, port, f"http://127.0.0.1:{fake_port}/v1")
+            try:
+                for concurrency in args.concurrency:
+                    requests = args.requests or concurrency * 2
+                    r = asyncio.run(_load(f"http://127.0.0.1:{port}/api/generate", concurrency, requests, process.pid))
+                    print(f"{name:<18} {concurrency:>5} {r['throughput']:>8.1f} {r['p50_ms']:>7.0f}ms "
+                          f"{r['p99_ms']:>7.0f}ms {r['errors']:>7} {r['rss_kb'] / 1024:>7.1f} {r['threads']:>8}")
+                    sys.stdout.flush()
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+    finally:
+        fake.terminate()
+        fake.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Near-duplicate brief lookups in the MinHash/LSH index at growing sizes.
+
+Fills an in-memory BriefIndex with synthetic briefs (random product names, descriptions
+and audiences from a small vocabulary), then times lookups of reworded copies of stored
+briefs (which should match) and of fresh briefs (which should not), and reports
+recall and false matches at the configured similarity threshold.
+
+Run from the app directory:
+    python -m benchmarks.bench_brief_index
+    python -m benchmarks.bench_brief_index --sizes 10000 100000 1000000 --threshold 0.7
+"""
+import time
+import random
+import argparse
+import numpy as np
+from services import brief_index
+from services.brief_index import BriefIndex, brief_signature, NUM_PERM
+from benchmarks.run import _percentile
+
+WORDS = ("insulated steel water bottle keeps drinks cold hot hours leak proof lightweight durable "
+         "eco friendly reusable wireless earbuds noise cancelling battery charging case premium "
+         "sound running shoes cushioned breathable trail grip organic coffee beans roasted fair "
+         "trade smooth rich flavor yoga mat non slip thick comfortable travel backpack laptop "
+         "water resistant compartments smart watch fitness tracker heart rate sleep").split()
+AUDIENCES = ("outdoor enthusiasts", "busy professionals", "college students", "new parents",
+             "runners and hikers", "remote workers", "coffee lovers", "fitness fans")
+
+
+def _brief(rng: random.Random) -> dict:
+    return {
+        "product_name": f"{rng.choice(WORDS).title()} {rng.randrange(100000)}",
+        "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 24))),
+        "audience": f"{rng.choice(AUDIENCES)} aged {rng.randint(18, 40)}-{rng.randint(41, 65)}",
+        "tone": rng.choice(("professional", "playful", "urgent")),
+    }
+
+
+def _reword(brief: dict, rng: random.Random) -> dict:
+    """A light rewording: one word of the description swapped for another."""
+    words = brief["description"].split()
+    words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return {**brief, "description": " ".join(words)}
+
+
+def _fill(index: BriefIndex, briefs: list):
+    """Bulk-load signatures straight into the arrays (add() one by one works too, just slower)."""
+    signed = [brief_signature(b) for b in briefs]
+    now = time.time()
+    with index._lock:
+        start = index._last_rowid
+        rowids = np.arange(start + 1, start + len(briefs) + 1)
+        for rowid in rowids.tolist():
+            index._payloads[rowid] = ('{"headline": ""}', "[]")
+        index._last_rowid = int(rowids[-1])
+        index._append(np.array([s for s, _ in signed], np.uint64),
+                      np.stack([sig for _, sig in signed]).reshape(len(briefs), NUM_PERM),
+                      np.full(len(briefs), now), rowids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH near-duplicate lookup latency")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=brief_index.BRIEF_SIMILARITY)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    index = BriefIndex(path="", threshold=args.threshold)
+    stored = []
+    print(f"threshold {args.threshold:g}")
+    print(f"{'briefs':>9} {'p50 µs':>8} {'p99 µs':>8} {'recall':>7} {'false':>6} {'MB':>7}")
+    for size in sorted(args.sizes):
+        while len(stored) < size:
+            batch = [_brief(rng) for _ in range(min(100_000, size - len(stored)))]
+            _fill(index, batch)
+            stored += batch
+
+        probes = [(_reword(rng.choice(stored), rng), True) for _ in range(args.lookups // 2)]
+        probes += [(_brief(rng), False) for _ in range(args.lookups // 2)]
+        rng.shuffle(probes)
+        samples, hits, false = [], 0, 0
+        for brief, expected in probes:
+            start = time.perf_counter()
+            match = index.lookup(brief)
+            samples.append((time.perf_counter() - start) * 1e6)
+            hits += bool(match) and expected
+            false += bool(match) and not expected
+        megabytes = sum(a.nbytes for a in (index._signatures, index._created, index._rowids,
+                                           index._keys, index._positions)) / 1e6
+        print(f"{size:>9} {_percentile(samples, 0.5):>8.0f} {_percentile(samples, 0.99):>8.0f} "
+              f"{hits / (len(probes) // 2):>7.2%} {false:>6} {megabytes:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
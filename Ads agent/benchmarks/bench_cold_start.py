@@ -0,0 +1,116 @@
+"""
+Cold start: how long a fresh worker takes to import the app and serve its first requests.
+
+Each run is a new interpreter that imports the ASGI entry point (which imports the Flask app),
+then sends GET / and POST /api/generate (demo mode) through the test client. Also lists
+the slowest imports from `python -X importtime` and which heavy modules were loaded at
+startup (numpy, Pillow and httpx should only be imported by the first request that needs them).
+
+Run from the app directory:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --runs 10 --check   # non-zero exit when over budget
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from benchmarks.run import _percentile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median milliseconds a fresh process may take before --check fails
+BUDGETS = {"interpreter_ms": 2000, "import_ms": 400, "first_index_ms": 150, "first_generate_ms": 500}
+# Imported on first use only; finding one of these at startup fails --check
+DEFERRED_MODULES = ("numpy", "PIL", "httpx")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import asgi
+from app import app
+imported = time.perf_counter()
+client = app.test_client()
+statuses = [client.get("/", headers={"Accept-Encoding": "gzip"}).status_code]
+index = time.perf_counter()
+statuses.append(client.post("/api/generate", json={
+    "product_name": "EcoBottle Pro", "description": "Insulated steel water bottle",
+    "audience": "Outdoor enthusiasts", "tone": "professional", "platforms": ["instagram"],
+}).status_code)
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_index_ms": (index - imported) * 1000,
+    "first_generate_ms": (done - index) * 1000,
+    "statuses": statuses,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def _env() -> dict:
+    return {**os.environ, "DEMO_MODE": "true", "OPENAI_API_KEY": "",
+            "RATE_LIMIT_USER_PER_MIN": "0", "RATE_LIMIT_IP_PER_MIN": "0", "ADMISSION_MAX_ACTIVE": "0"}
+
+
+def _run_once() -> dict:
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, env=_env(),
+                         cwd=APP_DIR, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    if result["statuses"] != [200, 200]:
+        raise RuntimeError(f"cold-start requests failed: {result['statuses']}")
+    result["interpreter_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def _slowest_imports(count: int, depth: int) -> list:
+    """(cumulative_ms, self_ms, name) of the slowest imports nested at most `depth` levels deep."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import asgi"],
+                         capture_output=True, text=True, env=_env(), cwd=APP_DIR, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        if level <= depth:
+            rows.append((int(cumulative) / 1000, int(own) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and first-request latency of a fresh worker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--imports", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--depth", type=int, default=2, help="import nesting depth to list")
+    parser.add_argument("--check", action="store_true", help="exit 1 when a median exceeds its budget")
+    args = parser.parse_args()
+
+    runs = [_run_once() for _ in range(args.runs)]
+    failures = []
+    print(f"{'phase':<18} {'p50 ms':>8} {'max ms':>8} {'budget':>8}")
+    for phase, budget in BUDGETS.items():
+        samples = [r[phase] for r in runs]
+        median = _percentile(samples, 0.5)
+        print(f"{phase:<18} {median:>8.1f} {max(samples):>8.1f} {budget:>8}")
+        if median > budget:
+            failures.append(f"{phase} {median:.1f}ms > {budget}ms")
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    print(f"deferred modules loaded at startup: {', '.join(loaded) or 'none'}")
+    if loaded:
+        failures.append(f"imported at startup: {', '.join(loaded)}")
+
+    print(f"\nslowest imports (import asgi, depth <= {args.depth}):")
+    print(f"{'cumul ms':>9} {'self ms':>8}  module")
+    for cumulative, own, name in _slowest_imports(args.imports, args.depth):
+        print(f"{cumulative:>9.1f} {own:>8.1f}  {name}")
+
+    if args.check:
+        print("\n" + ("FAIL: " + "; ".join(failures) if failures else "OK: within budget"))
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Streaming ZIP export of a campaign (POST /api/export.zip).
+
+A local HTTP stub serves the campaign's images with injected latency. The archive is read
+chunk by chunk from the Flask test client and written to a temporary file, then checked with
+zipfile. Reports time to the first chunk, total time, archive size and the peak Python heap
+(tracemalloc) while streaming, for one image fetched at a time vs EXPORT_CONCURRENCY at a time,
+and for growing image counts: the peak should stay flat however large the archive gets.
+
+Run from the app directory:
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --images 10 50 200 --image-kb 512 --latency-ms 100 --derivatives
+"""
+import io
+import os
+import time
+import random
+import zipfile
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Fresh image store and derivatives directory, so every run fetches and renders from scratch
+_TMP = tempfile.mkdtemp(prefix="bench-export-")
+os.environ["BLOB_STORE_DIR"] = os.path.join(_TMP, "blobs")
+os.environ["DERIVATIVES_DIR"] = os.path.join(_TMP, "derivatives")
+
+from PIL import Image  # noqa: E402
+from agents import campaign_export  # noqa: E402
+from agents.image_derivatives import ALLOWED_IMAGE_DOMAINS  # noqa: E402
+from services import blob_store  # noqa: E402
+from app import app  # noqa: E402
+
+
+class ImageStub:
+    """Threaded HTTP server answering GET /<n>.jpg with a distinct JPEG of about `image_kb` KB."""
+
+    def __init__(self, image_kb: int, latency_ms: float):
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._image = _noise_jpeg(image_kb)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def netloc(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                time.sleep(stub.latency_ms / 1000)
+                # Bytes after the JPEG end marker are ignored by decoders but give every URL its own blob
+                data = stub._image + self.path.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _noise_jpeg(image_kb: int) -> bytes:
+    """A noisy JPEG (noise does not compress) of roughly image_kb KB."""
+    side = max(64, int((image_kb * 1024 / 0.9) ** 0.5))
+    rng = random.Random(0)
+    image = Image.frombytes("RGB", (side, side), bytes(rng.getrandbits(8) for _ in range(side * side * 3)))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def _campaign(stub: ImageStub, images: int, run: str) -> dict:
+    copy = {"headline": "Cold for 24 hours ❄️", "body": "Insulated steel, built for every trail.",
+            "cta": "Shop Now", "tone": "professional"}
+    return {
+        "brief": {"product_name": "EcoBottle Pro", "description": "Insulated steel water bottle",
+                  "audience": "Hikers", "platforms": ["instagram", "facebook", "twitter", "linkedin"]},
+        "copy": copy,
+        "variations": [{**copy, "is_primary": True}, {**copy, "tone": "playful", "is_primary": False}],
+        "images": [{"url": f"http://{stub.netloc}/{run}/{i}.jpg", "index": i} for i in range(1, images + 1)],
+        "platforms": {key: {"adapted_copy": {k: copy[k] for k in ("headline", "body", "cta")}}
+                      for key in ("instagram", "facebook", "twitter", "linkedin")},
+    }
+
+
+def _export(campaign: dict, concurrency: int, derivatives: bool) -> dict:
+    campaign_export.EXPORT_CONCURRENCY = concurrency
+    campaign_export._executor = None
+    client = app.test_client()
+    query = "" if derivatives else "?derivatives=false"
+
+    with tempfile.TemporaryFile() as out:
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.post(f"/api/export.zip{query}", json=campaign, buffered=False)
+        first = None
+        size = 0
+        for chunk in response.response:
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(chunk)
+            out.write(chunk)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        response.close()
+
+        out.seek(0)
+        with zipfile.ZipFile(out) as archive:
+            bad = archive.testzip()
+            entries = len(archive.namelist())
+    assert bad is None, f"Corrupt member {bad}"
+    return {"first": first, "elapsed": elapsed, "size": size, "peak": peak, "entries": entries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming campaign export benchmark")
+    parser.add_argument("--images", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--image-kb", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=campaign_export.EXPORT_CONCURRENCY)
+    parser.add_argument("--derivatives", action="store_true", help="Also render every platform format crop")
+    args = parser.parse_args()
+
+    print(f"{'images':>7} {'fetch':>12} {'entries':>8} {'archive MB':>11} {'first ms':>9} "
+          f"{'total s':>8} {'peak heap MB':>13}")
+    with ImageStub(args.image_kb, args.latency_ms) as stub:
+        ALLOWED_IMAGE_DOMAINS.append(stub.netloc)
+        # Warm-up: first-use imports and pools would otherwise count towards the first run
+        _export(_campaign(stub, 2, "warmup"), args.concurrency, args.derivatives)
+        for images in args.images:
+            for concurrency in (1, args.concurrency):
+                # Each run gets its own URLs, so nothing is served from the image store
+                blob_store._image_store = None
+                run = f"{images}-{concurrency}-{time.monotonic_ns()}"
+                result = _export(_campaign(stub, images, run), concurrency, args.derivatives)
+                label = "sequential" if concurrency == 1 else f"{concurrency} at once"
+                print(f"{images:>7} {label:>12} {result['entries']:>8} {result['size'] / 1e6:>11.1f} "
+                      f"{result['first'] * 1000:>9.1f} {result['elapsed']:>8.2f} {result['peak'] / 1e6:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
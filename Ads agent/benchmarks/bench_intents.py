@@ -0,0 +1,87 @@
+"""
+Intent classification over a synthetic corpus of refinement messages: the legacy
+per-tone substring scans versus the compiled keyword engine in agents.intents,
+which also scores categories and length / CTA / emoji directives in the same pass.
+
+Run from the app directory:  python -m benchmarks.bench_intents [messages]
+"""
+import sys
+import time
+import random
+from agents.intents import analyze, TONE_KEYWORDS, CATEGORY_KEYWORDS
+
+SEED = 42
+
+OPENERS = ["", "Can you ", "Please ", "I'd like you to ", "Hmm, ", "Okay, now "]
+ASKS = ["make it more {tone}", "go for a {tone} vibe", "try a {tone} angle", "rewrite this to sound {tone}",
+        "keep it {tone}"]
+EXTRAS = ["", " and shorter", ", with a better call to action", " — no emojis", " and add emojis",
+          ", more detail on the {category}", " for our {category} launch", " because I know the profit matters",
+          ", it's for a knowledgeable crowd", " for the snowboard season"]
+TONE_WORDS = {tone: [k.rstrip("*") for k in kws] for tone, kws in TONE_KEYWORDS.items()}
+CATEGORY_WORDS = [k.rstrip("*") for kws in CATEGORY_KEYWORDS.values() for k in kws]
+
+LEGACY_TONE_KEYWORDS = {
+    "professional": ["professional", "formal", "business", "corporate", "serious", "b2b"],
+    "playful": ["playful", "fun", "funny", "casual", "light", "humorous", "witty", "young"],
+    "urgent": ["urgent", "urgency", "scarcity", "limited", "hurry", "fast", "quick", "now", "sale"],
+    "emotional": ["emotional", "heartfelt", "touching", "warm", "inspiring", "story", "feel"]
+}
+
+
+def legacy_detect_tone(message: str) -> str:
+    """The original first-match substring scan from routes/api.py."""
+    message = message.lower()
+    for tone, keywords in LEGACY_TONE_KEYWORDS.items():
+        if any(kw in message for kw in keywords):
+            return tone
+    return None
+
+
+def corpus(size: int) -> list:
+    """(message, intended tone) pairs."""
+    rng = random.Random(SEED)
+    messages = []
+    for _ in range(size):
+        tone = rng.choice(list(TONE_WORDS))
+        ask = rng.choice(ASKS).format(tone=rng.choice(TONE_WORDS[tone]))
+        extra = rng.choice(EXTRAS).format(category=rng.choice(CATEGORY_WORDS))
+        messages.append((rng.choice(OPENERS) + ask + extra, tone))
+    return messages
+
+
+def _run(fn, messages: list) -> tuple:
+    start = time.perf_counter()
+    results = [fn(message) for message, _ in messages]
+    return results, time.perf_counter() - start
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    messages = corpus(size)
+
+    legacy, legacy_time = _run(legacy_detect_tone, messages)
+    compiled, compiled_time = _run(analyze, messages)
+
+    legacy_correct = sum(result == tone for result, (_, tone) in zip(legacy, messages))
+    compiled_correct = sum(result["tone"] == tone for result, (_, tone) in zip(compiled, messages))
+
+    print(f"{size} messages")
+    print(f"{'engine':<22} {'msgs/s':>10} {'us/msg':>8} {'tone accuracy':>14}")
+    print(f"{'legacy substring':<22} {size / legacy_time:>10.0f} {legacy_time / size * 1e6:>8.2f} "
+          f"{legacy_correct / size:>13.1%}")
+    print(f"{'compiled (all intents)':<22} {size / compiled_time:>10.0f} {compiled_time / size * 1e6:>8.2f} "
+          f"{compiled_correct / size:>13.1%}")
+
+    shown = 0
+    print("\nLegacy misreads:")
+    for result, new, (message, tone) in zip(legacy, compiled, messages):
+        if result != tone and new["tone"] == tone:
+            print(f"  {message!r}: legacy={result} compiled={new['tone']}")
+            shown += 1
+            if shown == 5:
+                break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Overhead of the metrics layer: cost per span when recording, when sampled out and
+when disabled, compared with an uninstrumented call.
+
+Run from the app directory:  python -m benchmarks.bench_metrics
+"""
+import time
+from services import metrics
+
+RUNS = 200_000
+
+
+def _ns_per_call(fn) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(RUNS):
+        fn()
+    return (time.perf_counter_ns() - start) / RUNS
+
+
+def _bare():
+    pass
+
+
+def _spanned():
+    with metrics.span("bench", stage="copy"):
+        pass
+
+
+def main():
+    baseline = _ns_per_call(_bare)
+    print(f"{'mode':<12} {'ns/span':>10}")
+    for label, enabled, rate in (("enabled", True, 1.0), ("sampled 1%", True, 0.01), ("disabled", False, 1.0)):
+        metrics.METRICS_ENABLED, metrics.METRICS_SAMPLE_RATE = enabled, rate
+        print(f"{label:<12} {_ns_per_call(_spanned) - baseline:>10.0f}")
+
+    histogram = metrics.registry.histograms[("bench_duration_seconds", (("stage", "copy"),))]
+    print(f"\nrecorded {histogram.count} spans, p50={histogram.quantile(0.5) * 1e6:.1f}us "
+          f"p99={histogram.quantile(0.99) * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Size and encoding cost of a /api/generate response body.
+
+Compares the pre-catalogue shape (every platform spec and tone hint inlined, `expand=1`)
+with the compact shape that refers to /api/platforms by key, and the stdlib json encoder
+with Flask's old defaults (sorted keys, ASCII escapes, indented in debug) against the
+compact encoder (orjson when installed). Sizes are raw and compressed as sent.
+
+Run from the app directory:  python -m benchmarks.bench_payload
+"""
+import json
+import gzip
+import timeit
+import argparse
+from app import app
+from services.serialization import dumps_bytes, orjson
+from services.compression import GZIP_LEVEL, BROTLI_QUALITY, brotli
+
+BRIEF = {
+    "product_name": "EcoBottle Pro",
+    "description": "Insulated steel water bottle that keeps drinks cold for 24 hours",
+    "audience": "Outdoor enthusiasts aged 25-40",
+    "tone": "professional",
+    "platforms": ["instagram", "facebook", "twitter", "linkedin", "google"],
+    "seed": "bench",
+}
+
+ENCODERS = {
+    "json sorted+ascii": lambda v: json.dumps(v, sort_keys=True, ensure_ascii=True).encode("utf-8"),
+    "json sorted+indent": lambda v: json.dumps(v, sort_keys=True, ensure_ascii=True, indent=2).encode("utf-8"),
+    "json compact": lambda v: json.dumps(v, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    "dumps_bytes": dumps_bytes,
+}
+
+
+def _sizes(data: bytes) -> str:
+    sizes = f"{len(data):>8} {len(gzip.compress(data, compresslevel=GZIP_LEVEL)):>8}"
+    if brotli is not None:
+        sizes += f" {len(brotli.compress(data, quality=BROTLI_QUALITY)):>8}"
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate response payload size and serialization time")
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    bodies = {
+        "expanded": client.post("/api/generate", json={**BRIEF, "expand": True}).get_json(),
+        "compact": client.post("/api/generate", json=BRIEF).get_json(),
+    }
+    catalog = client.get("/api/platforms").get_json()
+
+    print(f"orjson: {'yes' if orjson else 'no'}, brotli: {'yes' if brotli else 'no'}\n")
+    print(f"{'body':<10} {'encoder':<20} {'raw':>8} {'gzip':>8}" + (f" {'br':>8}" if brotli else "") + f" {'µs/encode':>10}")
+    for shape, body in bodies.items():
+        for name, encode in ENCODERS.items():
+            seconds = timeit.timeit(lambda: encode(body), number=args.number) / args.number
+            print(f"{shape:<10} {name:<20} {_sizes(encode(body))} {seconds * 1e6:>10.1f}")
+    print(f"\n/api/platforms catalogue (cached by the client, once per version): {_sizes(dumps_bytes(catalog))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark for the Platform Agent.
+Compares the original implementation (spec dict literal rebuilt on every call,
+raw character slicing) with the precompiled registry and cached copy fitting.
+
+Run from the app directory:  python -m benchmarks.bench_platform_agent
+"""
+import timeit
+from agents.platform_agent import adapt_for_platforms, fit_copies, DEFAULT_PLATFORMS, PLATFORMS
+
+# The old function evaluated the full spec literal on every call; compiling the
+# literal's source reproduces exactly that work.
+_LEGACY_SPECS = compile(repr(DEFAULT_PLATFORMS), "<legacy platform specs>", "eval")
+
+BRIEF = {"product_name": "FitPro Watch", "audience": "runners"}
+COPY = {
+    "headline": "Say Hello to Your New Favorite Thing: FitPro Watch ✨",
+    "body": "Why settle for ordinary when FitPro Watch makes everything extraordinary? "
+            "Your runners friends are already obsessed — don't miss out on the upgrade!",
+    "cta": "Grab Yours Now! 🛒"
+}
+IMAGES = [{"url": "https://images.unsplash.com/photo-1517836357463-d25dfeac3438?w=800&q=80"}]
+SELECTED = ["instagram", "facebook", "twitter", "linkedin"]
+
+
+def legacy_adapt_for_platforms(brief, copy, images, platforms):
+    all_platforms = eval(_LEGACY_SPECS)
+    result = {}
+    for platform_key in platforms or list(all_platforms.keys()):
+        if platform_key not in all_platforms:
+            continue
+        platform = all_platforms[platform_key]
+        limits = platform["copy_limits"]
+        result[platform_key] = {
+            **platform,
+            "adapted_copy": {
+                "headline": copy.get("headline", "")[:limits["headline"]],
+                "body": copy.get("body", "")[:limits["body"]],
+                "cta": copy.get("cta", "")[:limits["cta"]]
+            },
+            "primary_image": images[0]["url"] if images else None,
+            "primary_format": platform["formats"][0]
+        }
+    return result
+
+
+def _per_call_us(fn, number):
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    number = 20000
+    before = _per_call_us(lambda: legacy_adapt_for_platforms(BRIEF, COPY, IMAGES, SELECTED), number)
+    after = _per_call_us(lambda: adapt_for_platforms(BRIEF, COPY, IMAGES, SELECTED), number)
+    print(f"adapt_for_platforms (4 platforms): before {before:.2f} us/call, after {after:.2f} us/call "
+          f"({before / after:.1f}x)")
+
+    copies = [
+        {**COPY, "headline": f"{COPY['headline']} #{i}", "body": f"{COPY['body']} Variant {i}."}
+        for i in range(1000)
+    ]
+    platforms = list(PLATFORMS.keys())
+    fitted = min(timeit.repeat(lambda: fit_copies(copies, platforms), number=1, repeat=5))
+    print(f"fit_copies: {len(copies)} copies x {len(platforms)} platforms in {fitted * 1000:.2f} ms "
+          f"({fitted / (len(copies) * len(platforms)) * 1e6:.2f} us per copy/platform)")
+
+
+if __name__ == "__main__":
+    main()
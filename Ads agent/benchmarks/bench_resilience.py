@@ -0,0 +1,96 @@
+"""
+How /api/generate behaves when OpenAI misbehaves, against the local fake OpenAI server:
+
+  outage    every request fails with 503: latency per request as the circuit breakers trip
+  slow      the API takes longer than GENERATE_DEADLINE: requests return demo output at the deadline
+  tail      5% of calls stall for 2s: copy latency with and without hedged requests
+
+Run from the app directory:  python -m benchmarks.bench_resilience
+"""
+import time
+import argparse
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.run import BRIEF, _set_mode, _percentile
+from agents import openai_client, creative_agent
+from agents.creative_agent import generate_copy
+from services.resilience import CircuitBreaker
+from routes import api
+from app import app
+
+
+def _reset_breakers():
+    for provider, breaker in openai_client.breakers.items():
+        openai_client.breakers[provider] = CircuitBreaker(breaker.name, breaker.error_rate, breaker.min_calls,
+                                                          breaker.window, breaker.cooldown, breaker.probe_timeout)
+
+
+def _generate(client, i: int) -> tuple:
+    start = time.perf_counter()
+    response = client.post("/api/generate", json={**BRIEF, "no_cache": True, "product_name": f"EcoBottle {i}"})
+    return response.status_code, (time.perf_counter() - start) * 1000
+
+
+def outage(client, requests: int):
+    print(f"\n== outage: every OpenAI call returns 503 ==\n{'request':>7} {'status':>6} {'ms':>9}  breakers")
+    with FakeOpenAIServer(latency_ms=50, error_rate=1.0) as server:
+        _set_mode("openai", server.base_url)
+        _reset_breakers()
+        for i in range(requests):
+            status, ms = _generate(client, i)
+            states = ", ".join(f"{b.name}={b.state}" for b in openai_client.breakers.values())
+            print(f"{i:>7} {status:>6} {ms:>9.1f}  {states}")
+        print(f"upstream calls: {server.requests}")
+
+
+def slow(client, requests: int, deadline: float):
+    print(f"\n== slow: OpenAI answers after 5s, GENERATE_DEADLINE={deadline:g}s ==")
+    api.GENERATE_DEADLINE = deadline
+    with FakeOpenAIServer(latency_ms=5000) as server:
+        _set_mode("openai", server.base_url)
+        _reset_breakers()
+        samples = [_generate(client, i) for i in range(requests)]
+    print(f"statuses {sorted({s for s, _ in samples})}, "
+          f"p50 {_percentile([ms for _, ms in samples], 0.5):.0f}ms, max {max(ms for _, ms in samples):.0f}ms")
+
+
+def tail(iterations: int, hedge_after_ms: float):
+    print(f"\n== tail: copy latency 300ms ± 50ms, 5% stall 2s more, hedge after {hedge_after_ms:g}ms ==")
+    print(f"{'mode':<8} {'p50':>8} {'p95':>8} {'p99':>8} {'upstream calls':>15}")
+    with FakeOpenAIServer(latency_ms=300, jitter_ms=50, tail_rate=0.05, tail_ms=2000) as server:
+        _set_mode("openai", server.base_url)
+        for label, hedge in (("plain", 0), ("hedged", hedge_after_ms)):
+            _reset_breakers()
+            creative_agent.COPY_HEDGE_AFTER_MS = hedge
+            calls = server.requests
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                generate_copy({**BRIEF, "_no_cache": True})
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f"{label:<8} {_percentile(samples, 0.5):>6.0f}ms {_percentile(samples, 0.95):>6.0f}ms "
+                  f"{_percentile(samples, 0.99):>6.0f}ms {server.requests - calls:>15}")
+    creative_agent.COPY_HEDGE_AFTER_MS = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generation under upstream outages, slowness and tail latency")
+    parser.add_argument("--requests", type=int, default=15)
+    parser.add_argument("--deadline", type=float, default=1.0)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--hedge-after-ms", type=float, default=450)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    deadline = api.GENERATE_DEADLINE
+    try:
+        outage(client, args.requests)
+        slow(client, 5, args.deadline)
+        tail(args.iterations, args.hedge_after_ms)
+    finally:
+        api.GENERATE_DEADLINE = deadline
+        _reset_breakers()
+        _set_mode("demo")
+
+
+if __name__ == "__main__":
+    main()
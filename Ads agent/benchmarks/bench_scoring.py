@@ -0,0 +1,137 @@
+"""
+Batch scoring of copy candidates with agents.scoring.
+
+Builds 100k candidates two ways and times scoring them for every platform plus top-k:
+  combinations  headline x body x cta combinations per tone, as over-generation produces them
+                (a few hundred distinct texts, so features are computed once per text)
+  unique        every candidate with its own headline, body and cta (the worst case: features
+                for 300k texts)
+A pure-Python scorer computing the same features one candidate at a time gives the baseline.
+
+Run from the app directory:
+    python -m benchmarks.bench_scoring
+    python -m benchmarks.bench_scoring --candidates 100000 --k 5 --baseline 5000
+"""
+import re
+import time
+import random
+import argparse
+from agents.scoring import (CandidateSet, score_candidates, top_k, brief_keywords, SCORE_WEIGHTS,
+                            LENGTH_WEIGHTS, EMOJI_TOLERANCE, KEYWORD_SATURATION)
+from agents.platform_agent import PLATFORMS
+from agents.variation_agent import TONES
+
+BRIEF = {
+    "product_name": "EcoBottle Pro",
+    "description": "Insulated steel water bottle that keeps drinks cold for 24 hours on every trail",
+    "audience": "Outdoor enthusiasts and hikers aged 25-40",
+    "tone": "professional",
+}
+# Copy vocabulary: about a third of the words are brief keywords, the rest common ad copy
+WORDS = ("bottle water cold hours trail hikers outdoor steel insulated adventure summit fresh "
+         "light durable everyday plastic free refill mountain camp road trip gym office weekend "
+         "your new best made feel great more built designed perfect simple ready stay keep go "
+         "now today love life better every moment smart choice quality premium style").split()
+EMOJI = ("", "", "", " 🎉", " ✨", " ⏰", " 💙")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + rng.choice((".", "!", "?")) + rng.choice(EMOJI)
+
+
+def _headline(rng):
+    return f"EcoBottle Pro: {_sentence(rng, rng.randint(3, 9))}"
+
+
+def _body(rng):
+    return " ".join(_sentence(rng, rng.randint(5, 14)) for _ in range(rng.randint(1, 4)))
+
+
+def _cta(rng):
+    return _sentence(rng, rng.randint(1, 3))
+
+
+def combinations(n: int, rng: random.Random) -> CandidateSet:
+    """n candidates (rounded) as per-tone combinations of 50 headlines x 50 bodies x n/10000 CTAs."""
+    candidates = CandidateSet()
+    ctas = max(1, n // (len(TONES) * 2500))
+    for tone in TONES:
+        candidates.add_combinations(tone, {"headline": [_headline(rng) for _ in range(50)],
+                                           "body": [_body(rng) for _ in range(50)],
+                                           "cta": [_cta(rng) for _ in range(ctas)]})
+    return candidates
+
+
+def unique(n: int, rng: random.Random) -> CandidateSet:
+    candidates = CandidateSet()
+    for tone in TONES:
+        candidates.add_rows(tone, [(_headline(rng), _body(rng), _cta(rng)) for _ in range(n // len(TONES))])
+    return candidates
+
+
+def score_python(candidate: dict, keywords: list, platform: str) -> float:
+    """The same score for one candidate and platform, in plain Python (baseline)."""
+    limits = PLATFORMS[platform].copy_limits
+    length = 0.0
+    for field in ("headline", "body", "cta"):
+        ratio = len(candidate[field]) / getattr(limits, field)
+        fit = 1 - 0.3 * min(max(0.5 - ratio, 0), 0.5) / 0.5 if ratio <= 1 else 0.5 * min(max(1 - (ratio - 1) * 2, 0), 1)
+        length += LENGTH_WEIGHTS[field] * fit
+    text = " ".join(candidate[f] for f in ("headline", "body", "cta")).lower()
+    mentioned = sum(1 for k in keywords if re.search(r"\b" + re.escape(k), text))
+    keyword = min(mentioned / max(1, min(len(keywords), KEYWORD_SATURATION)), 1.0)
+    body = candidate["body"]
+    words = body.count(" ") + 1
+    sentences = max(sum(body.count(c) for c in ".!?"), 1)
+    ease = 206.835 - 1.015 * words / sentences - 84.6 * len(body) / words / 3.0
+    readability = min(max(ease, 0), 100) / 100
+    emoji = sum(1 for ch in text if ord(ch) >= 0x10000 or 0x2300 <= ord(ch) <= 0x2BFF)
+    density = emoji * 100 / max(len(text) - 2, 1)
+    tolerance = EMOJI_TOLERANCE.get(platform, 1.0)
+    emoji_score = 1 - min(max((density - tolerance) / (tolerance + 2), 0), 1)
+    return (SCORE_WEIGHTS["length"] * length + SCORE_WEIGHTS["keywords"] * keyword
+            + SCORE_WEIGHTS["readability"] * readability + SCORE_WEIGHTS["emoji"] * emoji_score)
+
+
+def _time(fn, repeat: int) -> tuple:
+    best, value = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized candidate scoring throughput")
+    parser.add_argument("--candidates", type=int, default=100_000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=int, default=5000, help="candidates scored by the Python baseline")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    platforms = list(PLATFORMS)
+    print(f"{len(platforms)} platforms, top {args.k} per platform, best of {args.repeat}")
+    print(f"{'set':<13} {'candidates':>10} {'texts':>8} {'score ms':>9} {'top-k ms':>9} {'cand/s':>12}")
+    for name, build in (("combinations", combinations), ("unique", unique)):
+        candidates = build(args.candidates, rng)
+        score_ms, (scores, _, _) = _time(lambda: score_candidates(candidates, BRIEF, platforms), args.repeat)
+        topk_ms, _ = _time(lambda: top_k(scores, args.k), args.repeat)
+        texts = sum(len(t) for t in candidates.texts.values())
+        rate = len(candidates) / ((score_ms + topk_ms) / 1000)
+        print(f"{name:<13} {len(candidates):>10} {texts:>8} {score_ms:>9.1f} {topk_ms:>9.1f} {rate:>12,.0f}")
+
+    # Baseline on a sample of the last set, extrapolated to the full count
+    columns = candidates.columns()
+    sample = [candidates.candidate(i, columns) for i in range(min(args.baseline, len(candidates)))]
+    keywords = brief_keywords(BRIEF)
+    python_ms, _ = _time(lambda: [score_python(c, keywords, p) for c in sample for p in platforms], 1)
+    per_candidate = python_ms / len(sample)
+    print(f"python baseline: {per_candidate * 1000:.1f} µs/candidate, "
+          f"{per_candidate * len(candidates):,.0f} ms for {len(candidates)} candidates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Load test for the user store: admin listing latency as the table grows to 100k users.
+Listing a page should stay flat, while serializing every user (the old users_db
+behaviour) grows linearly.
+
+Run from the app directory:  python -m benchmarks.bench_user_store
+"""
+import os
+import json
+import time
+import tempfile
+import statistics
+from services.user_store import UserStore
+
+SIZES = [1000, 10000, 100000]
+BATCH = 1000
+PAGE = 50
+
+
+def _users(start: int, count: int) -> list:
+    return [
+        {
+            "email": f"user{i}@example.com",
+            "name": f"User {i}",
+            "picture": f"https://example.com/avatars/{i}.png",
+            "provider": "google",
+            "sub": str(10 ** 12 + i),
+            "last_login": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1_700_000_000 + i))
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def _p50_ms(fn, runs: int = 50) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UserStore(os.path.join(tmp, "users.sqlite3"))
+        legacy = {}
+        loaded = 0
+        print(f"{'users':>8} {'upsert/s':>10} {'first page':>11} {'deep page':>10} {'full dump':>10}")
+        for size in SIZES:
+            start = time.perf_counter()
+            inserted = size - loaded
+            while loaded < size:
+                batch = _users(loaded, BATCH)
+                store.upsert_users(batch)
+                legacy.update((u["email"], u) for u in batch)
+                loaded += BATCH
+            rate = inserted / max(time.perf_counter() - start, 1e-9)
+
+            # A cursor pointing half-way down the listing
+            _, cursor = store.list_users(limit=size // 2)
+            first = _p50_ms(lambda: json.dumps(store.list_users(limit=PAGE)[0]))
+            deep = _p50_ms(lambda: json.dumps(store.list_users(limit=PAGE, cursor=cursor)[0]))
+            dump = _p50_ms(lambda: json.dumps(list(legacy.values())), runs=5)
+            print(f"{size:>8} {rate:>10.0f} {first:>9.3f}ms {deep:>8.3f}ms {dump:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Local stand-in for the OpenAI HTTP API, for benchmarks and offline runs.
+Responses come from agents.openai_client.fake_openai_response; every request
+is delayed by `latency_ms` (plus optional uniform jitter) to mimic the network;
+a fraction `tail_rate` of them stall for another `tail_ms`, and a fraction
+`error_rate` fail with 503 to mimic an outage.
+
+Standalone:  python -m benchmarks.fake_openai --port 8765 --latency-ms 200
+then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from agents.openai_client import fake_openai_response
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under load-test concurrency
+    request_queue_size = 1024
+
+
+class FakeOpenAIServer:
+    """Threaded fake OpenAI server running in a background thread."""
+
+    def __init__(self, port: int = 0, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 tail_rate: float = 0, tail_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _delay(self) -> float:
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms))
+        if random.random() < self.tail_rate:
+            delay += self.tail_ms
+        return delay / 1000
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without this, Nagle adds ~40ms per response
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server._delay())
+                if random.random() < server.error_rate:
+                    status, body = 503, {"error": {"message": "Service unavailable (fake outage)",
+                                                   "type": "server_error"}}
+                else:
+                    status, body = fake_openai_response(self.path, payload)
+                data = json.dumps(body).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client timed out or took a hedged response instead
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI API server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with 503")
+    parser.add_argument("--tail-rate", type=float, default=0, help="Fraction of requests that stall")
+    parser.add_argument("--tail-ms", type=float, default=0, help="Extra latency of a stalled request")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                              args.tail_rate, args.tail_ms)
+    print(f"Fake OpenAI API on {server.base_url} (latency {args.latency_ms}ms ±{args.jitter_ms}ms)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Offline benchmark suite for the agents and the generate / refine routes.
+
+Every case runs in demo mode and in OpenAI mode, where the agents talk to a local
+fake OpenAI server (benchmarks.fake_openai) with injected latency. Reports
+throughput, p50/p95/p99 latency and allocations per call, and can save the results
+as a baseline JSON file to compare later commits against.
+
+Run from the app directory:
+    python -m benchmarks.run
+    python -m benchmarks.run --mode openai --latency-ms 150 --save baseline.json
+    python -m benchmarks.run --compare baseline.json
+"""
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from benchmarks.fake_openai import FakeOpenAIServer
+from agents import creative_agent, design_agent, openai_client
+from agents.creative_agent import generate_copy
+from agents.design_agent import generate_images
+from agents.variation_agent import generate_variations
+from agents.platform_agent import adapt_for_platforms
+from app import app
+
+MODES = ("demo", "openai")
+
+BRIEF = {
+    "product_name": "EcoBottle Pro",
+    "description": "Insulated steel water bottle that keeps drinks cold for 24 hours",
+    "audience": "Outdoor enthusiasts aged 25-40",
+    "tone": "professional",
+    "platforms": ["instagram", "facebook", "twitter", "linkedin"],
+}
+
+
+def _brief() -> dict:
+    # Skip the response cache so every call does the full amount of work
+    return {**BRIEF, "_no_cache": True}
+
+
+def _cases(client) -> dict:
+    copy = generate_copy(BRIEF)
+    images = generate_images(BRIEF, copy)
+    session_id = _check(client.post("/api/generate", json=BRIEF)).get_json()["session_id"]
+    return {
+        "generate_copy": lambda: generate_copy(_brief()),
+        "generate_images": lambda: generate_images(_brief(), copy),
+        "generate_variations": lambda: generate_variations(_brief(), copy),
+        "adapt_for_platforms": lambda: adapt_for_platforms(_brief(), copy, images, BRIEF["platforms"]),
+        "route_generate": lambda: _check(client.post("/api/generate", json={**BRIEF, "no_cache": True})),
+        "route_refine": lambda: _check(client.post("/api/refine", json={
+            "message": "make it more playful",
+            "current_copy": copy,
+            "brief": _brief(),
+        })),
+        # Incremental refinement: only the message is sent and only the affected agents re-run
+        "route_refine_session": lambda: _check(client.post("/api/refine", json={
+            "session_id": session_id,
+            "message": "make it more playful",
+        })),
+    }
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def _set_mode(mode: str, base_url: str = None):
+    """Point the agents at the fake server (openai) or switch them back to canned copy (demo)."""
+    demo = mode == "demo"
+    for module in (creative_agent, design_agent):
+        module.DEMO_MODE = demo
+        module.OPENAI_API_KEY = "" if demo else "sk-benchmark"
+    openai_client.OPENAI_BASE_URL = base_url
+    openai_client.reset_clients()
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(fn, iterations: int, warmup: int, alloc_runs: int) -> dict:
+    """Latency percentiles (ms), throughput (calls/s) and allocations per call for one case."""
+    for _ in range(warmup):
+        fn()
+
+    gc.collect()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - started
+
+    # Allocations are measured in a separate pass; tracing slows every allocation down
+    tracemalloc.start()
+    peak = allocated = blocks = 0
+    for _ in range(alloc_runs):
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        current, run_peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        peak = max(peak, run_peak - base)
+        grown = [d for d in after.compare_to(before, "filename") if d.size_diff > 0]
+        allocated += sum(d.size_diff for d in grown)
+        blocks += sum(d.count_diff for d in grown if d.count_diff > 0)
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "throughput": round(iterations / elapsed, 2),
+        "p50_ms": round(_percentile(samples, 0.50), 3),
+        "p95_ms": round(_percentile(samples, 0.95), 3),
+        "p99_ms": round(_percentile(samples, 0.99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "peak_kb": round(peak / 1024, 1),
+        "retained_kb": round(allocated / max(1, alloc_runs) / 1024, 1),
+        "retained_blocks": blocks // max(1, alloc_runs),
+    }
+
+
+def run(modes: list, iterations: int, warmup: int, alloc_runs: int, latency_ms: float,
+        jitter_ms: float, only: list = None) -> dict:
+    results = {}
+    client = app.test_client()
+    with FakeOpenAIServer(latency_ms=latency_ms, jitter_ms=jitter_ms) as server:
+        for mode in modes:
+            _set_mode(mode, server.base_url)
+            for name, fn in _cases(client).items():
+                if only and not any(o in name for o in only):
+                    continue
+                key = f"{mode}/{name}"
+                results[key] = measure(fn, iterations, warmup, alloc_runs)
+                _print_row(key, results[key])
+        _set_mode("demo")
+    return results
+
+
+def _print_header():
+    print(f"{'case':<30} {'ops/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'peak KB':>9} {'kept KB':>9}")
+
+
+def _print_row(key: str, r: dict):
+    print(f"{key:<30} {r['throughput']:>9.1f} {r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms "
+          f"{r['p99_ms']:>7.2f}ms {r['peak_kb']:>9.1f} {r['retained_kb']:>9.1f}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print per-case deltas against a baseline. Returns the cases whose p95 regressed by more than threshold %."""
+    regressions = []
+    print(f"\nvs baseline {baseline.get('meta', {}).get('commit', '?')} (threshold {threshold:g}%)")
+    print(f"{'case':<30} {'p50 Δ':>9} {'p95 Δ':>9} {'ops/s Δ':>9} {'peak Δ':>9}")
+    for key, current in results.items():
+        old = baseline.get("results", {}).get(key)
+        if not old:
+            print(f"{key:<30} {'(new)':>9}")
+            continue
+        deltas = [
+            _delta(current["p50_ms"], old["p50_ms"]),
+            _delta(current["p95_ms"], old["p95_ms"]),
+            _delta(current["throughput"], old["throughput"]),
+            _delta(current["peak_kb"], old["peak_kb"]),
+        ]
+        flag = ""
+        if deltas[1] > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<30} " + " ".join(f"{d:>+8.1f}%" for d in deltas) + flag)
+    return regressions
+
+
+def _delta(current: float, old: float) -> float:
+    return (current - old) / old * 100 if old else 0.0
+
+
+def _meta(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agents and the generate/refine routes")
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--alloc-runs", type=int, default=3, help="Calls traced for allocation stats")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Injected fake OpenAI latency")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--only", nargs="*", help="Run only cases whose name contains one of these")
+    parser.add_argument("--save", help="Write results to this baseline JSON file")
+    parser.add_argument("--compare", help="Compare against a saved baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=10, help="p95 regression threshold, percent")
+    args = parser.parse_args()
+
+    modes = list(MODES) if args.mode == "all" else [args.mode]
+    _print_header()
+    results = run(modes, args.iterations, args.warmup, args.alloc_runs, args.latency_ms, args.jitter_ms, args.only)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"meta": _meta(args), "results": results}, f, indent=2)
+        print(f"\nSaved {len(results)} results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Process configuration, loaded once.
+`.env` is read here, and the agents, services and routes packages import this module
+first, so every setting read at import time sees it whatever the import order.
+"""
+import os
+from dataclasses import dataclass
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+@dataclass(frozen=True)
+class Config:
+    """Settings shared across the app. Module-specific tuning stays next to the module that uses it."""
+
+    demo_mode: bool
+    openai_api_key: str
+    secret_key: str
+    debug: bool
+    port: int
+    # Reverse proxies in front of the app that append to X-Forwarded-For (1 behind the Heroku router)
+    proxy_hops: int
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        return cls(
+            demo_mode=env_flag("DEMO_MODE", "true"),
+            openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+            secret_key=os.getenv("FLASK_SECRET_KEY", "agentic-ads-secret-key-2024"),
+            debug=env_flag("FLASK_DEBUG", "true"),
+            port=int(os.getenv("PORT", "5000")),
+            proxy_hops=int(os.getenv("PROXY_HOPS", "0")),
+        )
+
+
+config = Config.from_env()
@@ -1 +1,3 @@
 # Routes package
+# Load .env before any module in the package reads its settings
+import config  # noqa: F401
@@ -1,99 +1,408 @@
+import io
+import os
+import csv
 import uuid
 import time
-import requests as http_requests
-from flask import Blueprint, request, jsonify, Response
-from agents.creative_agent import generate_copy
-from agents.design_agent import generate_images
-from agents.variation_agent import generate_variations
-from agents.platform_agent import adapt_for_platforms
+import random
+from urllib.parse import urlparse
+from flask import Blueprint, request, jsonify, Response, send_file, send_from_directory, g, session
+from agents.creative_agent import generate_copy, generate_copy_all_tones
+from agents.variation_agent import build_variations, expand_variations, rank_variations, PERFORMANCE_HINTS
+from agents.platform_agent import expand_platforms, platform_catalog
+from agents.seeding import brief_seed, seeded_random
+from agents.refine_agent import new_session, refine_session
+from agents.intents import detect_tone
+from agents.design_agent import MAX_IMAGES_PER_BRIEF
+from agents.pipeline import run_generate_pipeline, iter_generate_pipeline, iter_batch_pipeline, AgentTimeoutError
+from services.job_store import create_job_store
+from services.job_runner import JobRunner, JobQueueFullError
+from services.cache import cache_stats, make_key, content_hash
+from agents.image_derivatives import DERIVATIVES_DIR, ALLOWED_IMAGE_DOMAINS
+from agents.campaign_export import export_entries
+from services.blob_store import get_image_store
+from services.metrics import span, render_prometheus, server_timing
+from services.resilience import deadline
+from services.admission import admit, AdmissionRejected, INTERACTIVE, GENERATE, BATCH
+from services.serialization import dumps
+from services.zip_stream import stream_zip
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
-# In-memory job store (use Redis/DB in production)
-jobs = {}
+# Job store: in-process by default, JOB_STORE=sqlite to share across workers
+jobs = create_job_store()
+job_runner = JobRunner()
+# Refinement sessions share the job store backend; each expires SESSION_TTL seconds after its last turn
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+sessions = create_job_store(table="sessions", ttl=SESSION_TTL)
+
+@api_bp.before_request
+def _start_route_span():
+    # Times the handler up to the response object; streamed bodies finish later
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    g.route_span = span("http_request", route=rule, method=request.method)
+    g.route_span.__enter__()
+
+
+@api_bp.teardown_request
+def _end_route_span(exc):
+    route_span = g.pop("route_span", None)
+    if route_span is not None:
+        route_span.__exit__(type(exc) if exc else None, exc, None)
+
+
+# Admission control for the expensive endpoints, by priority class: chat refinement is
+# served ahead of single generations, which go ahead of batches and background jobs
+ADMISSION_CLASSES = {
+    "api.refine": INTERACTIVE,
+    "api.generate": GENERATE,
+    "api.generate_stream": GENERATE,
+    "api.rank": GENERATE,
+    "api.export_job": GENERATE,
+    "api.export_result": GENERATE,
+    "api.generate_batch": BATCH,
+    "api.create_job": BATCH,
+}
+
+
+@api_bp.before_request
+def _admit_request():
+    priority = ADMISSION_CLASSES.get(request.endpoint)
+    if priority is None:
+        return None
+    try:
+        g.admission_slot = admit(session.get("user_id"), request.remote_addr, priority)
+    except AdmissionRejected as e:
+        return admission_rejected(e)
+
+
+@api_bp.after_request
+def _hold_admission_slot(response):
+    # Streamed bodies do their work after the view returns: keep the slot until the response closes
+    if response.is_streamed and "admission_slot" in g:
+        response.call_on_close(g.pop("admission_slot").release)
+    return response
+
+
+@api_bp.teardown_request
+def _release_admission_slot(exc):
+    slot = g.pop("admission_slot", None)
+    if slot is not None:
+        slot.release()
+
+
+def admission_rejected(e: AdmissionRejected):
+    """429 response for a request turned away by admission control."""
+    return jsonify({"error": str(e), "reason": e.reason, "retry_after": e.retry_after}), 429, {
+        "Retry-After": str(e.retry_after)
+    }
+
+
+# Seconds a generation may take end to end. Agents cut their OpenAI calls and retries short
+# to fit, and fall back to demo output when the time is up.
+GENERATE_DEADLINE = float(os.getenv("GENERATE_DEADLINE", "45"))
+
+# Static data generate responses refer to by key: platform specs and per-tone performance hints.
+# Its version is a content hash, so clients can cache /api/platforms?v=<version> forever.
+CATALOG = {"platforms": platform_catalog(), "tones": PERFORMANCE_HINTS}
+CATALOG_VERSION = content_hash(CATALOG)[:16]
+
+BATCH_MAX_BRIEFS = int(os.getenv("BATCH_MAX_BRIEFS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Limits of /api/variations/rank: candidates returned per platform, LLM options per field and tone
+RANK_MAX_K = int(os.getenv("RANK_MAX_K", "20"))
+RANK_MAX_OPTIONS = int(os.getenv("RANK_MAX_OPTIONS", "8"))
 
 
 @api_bp.route("/generate", methods=["POST"])
 def generate():
     """
-    Main generation endpoint. Triggers all 4 agents sequentially.
-    Body: { product_name, description, audience, tone, platforms[] }
+    Main generation endpoint. Runs the 4 agents as a graph: copy first,
+    then images and variations in parallel, then platforms once images resolve.
+    Body: { product_name, description, audience, tone, platforms[], seed, num_images, expand }
+    The same brief (and seed) gives the same creatives; the response's ETag is
+    their content hash, so If-None-Match gets a 304 when nothing changed.
+    A near-identical earlier brief lends its copy and images (see `near_duplicate`).
+    Platforms and variations refer to /api/platforms by key; `expand` inlines the specs.
     """
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Request body required"}), 400
+    brief, error = _parse_brief(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
 
-    required = ["product_name", "description", "audience"]
-    missing = [f for f in required if not data.get(f)]
-    if missing:
-        return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
+    try:
+        with deadline(GENERATE_DEADLINE):
+            results, timings = run_generate_pipeline(brief)
+        digest = _content_hash(brief, results)
+        headers = {"Server-Timing": server_timing(timings), "ETag": f'"{digest}"'}
+        # Weak comparison: compressed responses carry the ETag as W/"..."
+        if request.if_none_match.contains_weak(digest):
+            return Response(status=304, headers=headers)
+        return jsonify(_generate_result(brief, results, timings, digest)), 200, headers
 
-    brief = {
-        "product_name": data.get("product_name", "").strip(),
-        "description": data.get("description", "").strip(),
-        "audience": data.get("audience", "").strip(),
-        "tone": data.get("tone", "professional"),
-        "platforms": data.get("platforms", ["instagram", "facebook", "twitter", "linkedin"])
-    }
+    except AgentTimeoutError as e:
+        return jsonify({"error": str(e), "stage": e.stage}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+
+@api_bp.route("/generate/stream", methods=["GET"])
+def generate_stream():
+    """
+    Server-sent events version of /api/generate. Emits one event per agent
+    (copy, images, variations, platforms) as soon as it completes, then `done`.
+    Each generated image is also sent as an `image` event the moment it is ready.
+    Query: product_name, description, audience, tone, platforms (comma-separated), num_images,
+    no_cache, render_derivatives, expand
+    """
+    brief, error = _parse_brief(_stream_query(request.args))
+    if error:
+        return jsonify({"error": error}), 400
+
+    def events():
+        job_id = str(uuid.uuid4())
+        yield _sse("start", {"job_id": job_id, "brief": brief, "catalog_version": CATALOG_VERSION})
+        try:
+            results = {}
+            with deadline(GENERATE_DEADLINE):
+                stages = iter_generate_pipeline(brief)
+            for name, value in stages:
+                if name == "done":
+                    _finish_stream(job_id, brief, results, value)
+                elif name != "image":
+                    results[name] = value
+                yield _sse(name, _present_stage(brief, name, value))
+        except AgentTimeoutError as e:
+            yield _sse("error", {"error": str(e), "stage": e.stage})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+@api_bp.route("/generate/batch", methods=["POST"])
+def generate_batch():
+    """
+    Generate creatives for many briefs in one call. Streams NDJSON, one line per
+    brief as it finishes, then a summary line. Identical briefs (options and seed included) are generated once.
+    Body: { briefs: [...], concurrency } as JSON, or a CSV upload (`file` field or text/csv body)
+    with columns product_name, description, audience, tone, platforms (separated by ';')
+    """
+    rows, concurrency, error = _read_batch_request()
+    if error:
+        return jsonify({"error": error}), 400
+    if len(rows) > BATCH_MAX_BRIEFS:
+        return jsonify({"error": f"Too many briefs (max {BATCH_MAX_BRIEFS})"}), 413
+
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+    # Validate and deduplicate: each unique brief runs once, duplicates share its result
+    errors = {}
+    unique = []
+    owners = {}  # brief key -> index into `unique`
+    members = []  # per unique brief: list of request indexes
+    for index, row in enumerate(rows):
+        brief, error = _parse_brief(row)
+        if error:
+            errors[index] = error
+            continue
+        # make_key() ignores the private options, which change the output too
+        key = make_key(brief, sorted((k, v) for k, v in brief.items() if k.startswith("_")))
+        if key not in owners:
+            owners[key] = len(unique)
+            unique.append(brief)
+            members.append([])
+        members[owners[key]].append(index)
+
+    def lines():
+        for index, error in errors.items():
+            yield dumps({"index": index, "status": "error", "error": error}) + "\n"
+
+        failed = len(errors)
+        for slot, results, timings, error in iter_batch_pipeline(unique, concurrency):
+            for index in members[slot]:
+                if error:
+                    line = {"index": index, "status": "error", "error": str(error)}
+                else:
+                    line = {
+                        "index": index,
+                        "status": "ok",
+                        "brief": unique[slot],
+                        "copy": results["copy"],
+                        "images": results["images"],
+                        "variations": _present_stage(unique[slot], "variations", results["variations"]),
+                        "platforms": _present_stage(unique[slot], "platforms", results["platforms"]),
+                        "timings": timings
+                    }
+                    if index != members[slot][0]:
+                        line["duplicate_of"] = members[slot][0]
+                yield dumps(line) + "\n"
+            if error:
+                failed += len(members[slot])
+
+        yield dumps({"done": True, "total": len(rows), "unique": len(unique), "failed": failed,
+                     "catalog_version": CATALOG_VERSION}) + "\n"
+
+    return Response(lines(), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+@api_bp.route("/jobs", methods=["POST"])
+def create_job():
+    """
+    Asynchronous generation. Returns a job_id immediately and runs the
+    agent pipeline on the background executor.
+    Body: same as /api/generate
+    """
+    brief, error = _parse_brief(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    job_id = str(uuid.uuid4())
+    jobs.create(job_id, result={"brief": brief})
     try:
-        # Agent 1: Creative Agent — generate copy
-        copy = generate_copy(brief)
+        job_runner.submit(_run_generate_job, job_id, brief)
+    except JobQueueFullError as e:
+        jobs.delete(job_id)
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
 
-        # Agent 2: Design Agent — generate images
-        images = generate_images(brief, copy)
+    return jsonify({"job_id": job_id, "status": "queued"}), 202, {"Location": f"/api/jobs/{job_id}"}
 
-        # Agent 3: Variation Agent — generate A/B variations
-        variations = generate_variations(brief, copy)
 
-        # Agent 4: Platform Agent — adapt for platforms
-        platforms = adapt_for_platforms(brief, copy, images, brief["platforms"])
+@api_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Job status with whatever agent results are available so far."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    result = job["result"]
+    brief = result.get("brief") or {}
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "error": job["error"],
+        **{name: _present_stage(brief, name, value) for name, value in result.items()}
+    }), 200
+
+
+@api_bp.route("/jobs/<job_id>/export.zip", methods=["GET"])
+def export_job(job_id):
+    """
+    A finished job's whole campaign as one ZIP archive, streamed while it is built: campaign.json,
+    copy.csv (primary copy and tone variations), platforms.csv (adapted copy), every image and
+    its crop in every platform format.
+    Query: derivatives=false leaves the format crops out
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}", "status": job["status"]}), 409
+    return _export_response(job["result"], f"campaign-{job_id[:8]}.zip")
+
+
+@api_bp.route("/export.zip", methods=["POST"])
+def export_result():
+    """
+    The /api/jobs/<id>/export.zip archive for a generation held by the client.
+    Body: a /api/generate response (brief, copy, images, variations, platforms)
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not (data.get("copy") or data.get("images")):
+        return jsonify({"error": "A generate result with copy or images is required"}), 400
+    # Checked before streaming: past the headers, a bad value could only truncate the archive
+    error = _export_shape_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+    name = "".join(c for c in str(data.get("job_id") or "") if c.isalnum())[:8] or "export"
+    return _export_response(data, f"campaign-{name}.zip")
+
+
+@api_bp.route("/platforms", methods=["GET"])
+def get_platforms():
+    """
+    Platform catalogue: the static spec of every platform (name, icon, formats, tips...)
+    and each tone's performance hint, which generate responses refer to by key.
+    ?v=<catalog_version> URLs never change, so they are cached for a year.
+    """
+    response = jsonify({"version": CATALOG_VERSION, **CATALOG})
+    response.set_etag(CATALOG_VERSION)
+    if request.args.get("v") == CATALOG_VERSION:
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "public, max-age=3600"
+    return response.make_conditional(request)
 
-        result = {
-            "job_id": str(uuid.uuid4()),
-            "brief": brief,
-            "copy": copy,
-            "images": images,
-            "variations": variations,
-            "platforms": platforms,
-            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-        }
 
-        return jsonify(result), 200
+@api_bp.route("/variations/rank", methods=["POST"])
+def rank():
+    """
+    Over-generate copy in every tone and rank it for each platform: each headline x body x cta
+    combination is scored on length fit, keyword overlap with the brief, readability and emoji density.
+    Body: the /api/generate brief plus k (best candidates per platform, default 3) and
+    per_field (alternatives of each field per tone asked from GPT-4, default 3)
+    """
+    data = request.get_json(silent=True)
+    brief, error = _parse_brief(data)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        k = max(1, min(int(data.get("k", 3)), RANK_MAX_K))
+        per_field = max(1, min(int(data.get("per_field", 3)), RANK_MAX_OPTIONS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "k and per_field must be integers"}), 400
 
+    try:
+        with deadline(GENERATE_DEADLINE):
+            rankings, count = rank_variations(brief, brief["platforms"], k, per_field)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    return jsonify({"brief": brief, "candidates": count, "k": k, "rankings": rankings}), 200
 
 
 @api_bp.route("/refine", methods=["POST"])
 def refine():
     """
     Conversational refinement endpoint.
-    Body: { message, current_copy, brief }
+    Body: { session_id, message } for a session opened by /api/generate: only the
+    agents the message affects re-run, and the response carries just what changed.
+    Without a session: { message, current_copy, brief, seed }, regenerating all copy.
+    The seed is derived from the brief's seed and the message, so replaying a
+    refinement gives the same copy while a different message gives new copy.
     """
     data = request.get_json()
     if not data:
         return jsonify({"error": "Request body required"}), 400
 
+    if data.get("session_id"):
+        return _refine_in_session(data["session_id"], data.get("message", ""))
+
     message = data.get("message", "").lower()
     brief = data.get("brief", {})
     current_copy = data.get("current_copy", {})
+    brief["_seed"] = make_key(str(data.get("seed") or brief_seed(brief)), message)[:16]
 
     # Parse refinement intent from message
-    new_tone = _detect_tone_from_message(message)
+    new_tone = detect_tone(message)
     if new_tone:
         brief["tone"] = new_tone
 
-    # Regenerate copy with updated brief
-    new_copy = generate_copy(brief)
-    new_variations = generate_variations(brief, new_copy)
+    # Regenerate copy for every tone in one creative call; variations are assembled from it
+    tone_copies = generate_copy_all_tones(brief)
+    new_copy = tone_copies.get(brief.get("tone", "professional")) or generate_copy(brief)
+    new_variations = build_variations(new_copy, tone_copies)
 
-    return jsonify({
+    result = {
         "copy": new_copy,
         "variations": new_variations,
+        "seed": brief["_seed"],
         "refinement_applied": f"Tone adjusted to '{new_tone}'" if new_tone else "Copy refreshed",
-        "message": _generate_agent_response(message, new_copy)
-    }), 200
+        "message": _generate_agent_response(message, new_copy, seeded_random(brief, "reply"))
+    }
+    result["content_hash"] = content_hash(result)
+    return jsonify(result), 200, {"ETag": f'"{result["content_hash"]}"'}
 
 
 @api_bp.route("/health", methods=["GET"])
@@ -101,10 +410,30 @@ def health():
     return jsonify({"status": "ok", "agents": ["creative", "design", "variation", "platform"]}), 200
 
 
+@api_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of latency histograms, error, in-flight and cache metrics."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@api_bp.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Hit/miss counters for each agent response cache."""
+    return jsonify({"caches": cache_stats()}), 200
+
+
+@api_bp.route("/derivatives/<path:filename>", methods=["GET"])
+def get_derivative(filename):
+    """Serve a rendered platform-format crop. Names are content-addressed, so they never change."""
+    response = send_from_directory(DERIVATIVES_DIR, filename, max_age=31536000)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
 @api_bp.route("/download-image", methods=["GET"])
 def download_image():
     """
-    Proxy endpoint to download cross-origin images.
+    Proxy endpoint to download cross-origin images, cached in the local image store.
     Query params: url (image URL), filename (desired filename)
     """
     image_url = request.args.get("url", "")
@@ -114,44 +443,294 @@ def download_image():
         return jsonify({"error": "url parameter required"}), 400
 
     # Only allow known image domains for security
-    allowed_domains = ["images.unsplash.com", "oaidalleapiprodscus.blob.core.windows.net"]
-    from urllib.parse import urlparse
     parsed = urlparse(image_url)
-    if not any(parsed.netloc.endswith(d) for d in allowed_domains):
+    if not any(parsed.netloc.endswith(d) for d in ALLOWED_IMAGE_DOMAINS):
         return jsonify({"error": "Image domain not allowed"}), 403
 
     try:
-        resp = http_requests.get(image_url, timeout=15, stream=True)
-        resp.raise_for_status()
-        content_type = resp.headers.get("Content-Type", "image/jpeg")
-
-        return Response(
-            resp.content,
-            headers={
-                "Content-Type": content_type,
-                "Content-Disposition": f'attachment; filename="{filename}"',
-                "Cache-Control": "no-cache"
-            }
-        )
+        # Fetched once into the local image store, then served from disk
+        blob = get_image_store().fetch(image_url)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch image: {str(e)}"}), 500
 
+    # Streams the file in chunks and honours If-None-Match / Range
+    response = send_file(
+        blob["path"],
+        mimetype=blob["content_type"],
+        as_attachment=True,
+        download_name=filename,
+        etag=blob["etag"],
+        conditional=True,
+        max_age=31536000
+    )
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
 
-def _detect_tone_from_message(message: str) -> str:
-    """Detect desired tone from user's refinement message."""
-    tone_keywords = {
-        "professional": ["professional", "formal", "business", "corporate", "serious", "b2b"],
-        "playful": ["playful", "fun", "funny", "casual", "light", "humorous", "witty", "young"],
-        "urgent": ["urgent", "urgency", "scarcity", "limited", "hurry", "fast", "quick", "now", "sale"],
-        "emotional": ["emotional", "heartfelt", "touching", "warm", "inspiring", "story", "feel"]
-    }
-    for tone, keywords in tone_keywords.items():
-        if any(kw in message for kw in keywords):
-            return tone
+
+def _export_response(campaign: dict, filename: str) -> Response:
+    """Chunked ZIP download of a campaign; images are fetched while earlier entries are sent."""
+    derivatives = request.args.get("derivatives", "true").lower() not in ("0", "false")
+    return Response(stream_zip(export_entries(campaign, derivatives)), mimetype="application/zip", headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no"
+    })
+
+
+def _export_shape_error(data: dict) -> str:
+    """Why a client-held generate result cannot be exported, or None if its shape is usable."""
+    def is_dict(value):
+        return value is None or isinstance(value, dict)
+
+    def is_list_of(value, kind):
+        return value is None or (isinstance(value, list) and all(isinstance(item, kind) for item in value))
+
+    if not is_dict(data.get("brief")) or not is_list_of((data.get("brief") or {}).get("platforms"), str):
+        return "brief must be an object, with platforms a list of strings"
+    if not is_dict(data.get("copy")):
+        return "copy must be an object"
+    if not is_list_of(data.get("variations"), dict):
+        return "variations must be a list of objects"
+    images = data.get("images")
+    if not is_list_of(images, dict) or not all(isinstance(image.get("url"), str) and
+                                               isinstance(image.get("tone") or "", str) for image in images or []):
+        return "images must be a list of objects with a url"
+    platforms = data.get("platforms")
+    if not is_dict(platforms) or not all(isinstance(entry, dict) and is_dict(entry.get("adapted_copy"))
+                                         for entry in (platforms or {}).values()):
+        return "platforms must be an object of platform objects"
     return None
 
 
-def _generate_agent_response(message: str, new_copy: dict) -> str:
+def _parse_brief(data: dict) -> tuple:
+    """Validate a generate request body. Returns (brief, error)."""
+    if not data:
+        return None, "Request body required"
+    if not isinstance(data, dict):
+        return None, "Request body must be a JSON object"
+
+    required = ["product_name", "description", "audience"]
+    missing = [f for f in required if not data.get(f)]
+    if missing:
+        return None, f"Missing fields: {', '.join(missing)}"
+    not_text = [f for f in required if not isinstance(data[f], str)]
+    if not_text:
+        return None, f"Fields must be strings: {', '.join(not_text)}"
+
+    brief = {
+        "product_name": data.get("product_name", "").strip(),
+        "description": data.get("description", "").strip(),
+        "audience": data.get("audience", "").strip(),
+        "tone": data.get("tone", "professional"),
+        "platforms": data.get("platforms", ["instagram", "facebook", "twitter", "linkedin"])
+    }
+    # Per-request cache bypass: agents skip cached responses and regenerate
+    if str(data.get("no_cache", "")).lower() in ("1", "true"):
+        brief["_no_cache"] = True
+    # Per-request opt-in to server-side crops for every platform format
+    if str(data.get("render_derivatives", "")).lower() in ("1", "true"):
+        brief["_render_derivatives"] = True
+    # Per-request opt-in to the pre-catalogue response shape, with platform specs inlined
+    if str(data.get("expand", "")).lower() in ("1", "true"):
+        brief["_expand"] = True
+    # Explicit seed; by default the seed is derived from the brief itself
+    if data.get("seed") not in (None, ""):
+        brief["_seed"] = str(data["seed"])
+    # Images to generate; by default IMAGES_PER_BRIEF
+    if data.get("num_images") not in (None, ""):
+        try:
+            num_images = int(data["num_images"])
+        except (TypeError, ValueError):
+            num_images = 0
+        if not 1 <= num_images <= MAX_IMAGES_PER_BRIEF:
+            return None, f"num_images must be between 1 and {MAX_IMAGES_PER_BRIEF}"
+        brief["_num_images"] = num_images
+    return brief, None
+
+
+def _stream_query(args) -> dict:
+    """Generate request fields from /generate/stream query params (platforms comma-separated)."""
+    data = {k: args[k] for k in ("product_name", "description", "audience", "tone", "seed", "num_images",
+                                 "no_cache", "render_derivatives", "expand")
+            if k in args}
+    if args.get("platforms"):
+        data["platforms"] = [p for p in args["platforms"].split(",") if p]
+    return data
+
+
+def _generate_result(brief: dict, results: dict, timings: dict, digest: str) -> dict:
+    """Response body for a finished generation; also opens its refinement session."""
+    job_id = str(uuid.uuid4())
+    _open_session(job_id, brief, results)
+    return {
+        "job_id": job_id,
+        "session_id": job_id,
+        "brief": brief,
+        "seed": brief_seed(brief),
+        "content_hash": digest,
+        "catalog_version": CATALOG_VERSION,
+        "copy": results["copy"],
+        "images": results["images"],
+        "variations": _present_stage(brief, "variations", results["variations"]),
+        "platforms": _present_stage(brief, "platforms", results["platforms"]),
+        "timings": timings,
+        "near_duplicate": results.get("near_duplicate"),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+
+
+def _finish_stream(job_id: str, brief: dict, results: dict, done: dict):
+    """Complete a stream's `done` event and open the refinement session."""
+    _open_session(job_id, brief, results)
+    done["session_id"] = job_id
+    done["content_hash"] = _content_hash(brief, results)
+    done["catalog_version"] = CATALOG_VERSION
+    done["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _read_batch_request() -> tuple:
+    """Read briefs from a JSON body or CSV upload. Returns (rows, concurrency, error)."""
+    if "file" in request.files:
+        rows = _read_batch_csv(io.TextIOWrapper(request.files["file"].stream, encoding="utf-8-sig"))
+        concurrency = request.args.get("concurrency", BATCH_MAX_CONCURRENCY)
+    elif request.mimetype == "text/csv":
+        rows = _read_batch_csv(io.StringIO(request.get_data(as_text=True)))
+        concurrency = request.args.get("concurrency", BATCH_MAX_CONCURRENCY)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get("briefs"), list):
+            return None, None, "Provide a JSON body with 'briefs' or a CSV upload"
+        rows = data["briefs"]
+        invalid = next((i for i, row in enumerate(rows) if not isinstance(row, dict)), None)
+        if invalid is not None:
+            return None, None, f"briefs[{invalid}] must be a JSON object"
+        concurrency = data.get("concurrency", request.args.get("concurrency", BATCH_MAX_CONCURRENCY))
+
+    # bool is an int subclass, but true/false is not a concurrency
+    if isinstance(concurrency, bool) or not isinstance(concurrency, (int, str)):
+        return None, None, "concurrency must be an integer"
+    try:
+        return rows, int(concurrency), None
+    except ValueError:
+        return None, None, "concurrency must be an integer"
+
+
+def _read_batch_csv(text) -> list:
+    """Brief rows of a CSV upload; platforms are separated by ';'."""
+    rows = []
+    for row in csv.DictReader(text):
+        row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+        if row.get("platforms"):
+            row["platforms"] = [p.strip() for p in row["platforms"].split(";") if p.strip()]
+        else:
+            row.pop("platforms", None)
+        if not row.get("tone"):
+            row.pop("tone", None)
+        rows.append(row)
+    return rows
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+def _present_stage(brief: dict, name: str, value):
+    """An agent's result as sent to the client: compact, or with catalogue specs inlined for `expand`."""
+    if not brief.get("_expand") or value is None:
+        return value
+    if name == "variations":
+        return expand_variations(value)
+    if name == "platforms":
+        return expand_platforms(value)
+    return value
+
+
+def _run_generate_job(job_id: str, brief: dict):
+    """
+    Background job body: run the pipeline, storing each agent's output as it lands.
+    Images are stored one by one as they are generated, so polls show them early.
+    """
+    jobs.update(job_id, status="running")
+    images = []
+
+    def on_image(image):
+        images.append(image)
+        jobs.update(job_id, result={"images": sorted(images, key=lambda i: i["index"])})
+
+    try:
+        with deadline(GENERATE_DEADLINE):
+            results, timings = run_generate_pipeline(
+                brief,
+                on_complete=lambda name, value: jobs.update(job_id, result={name: value}),
+                on_image=on_image
+            )
+        _open_session(job_id, brief, results)
+        jobs.update(job_id, status="done", result={
+            "session_id": job_id,
+            "content_hash": _content_hash(brief, results),
+            "catalog_version": CATALOG_VERSION,
+            "timings": timings,
+            "near_duplicate": results.get("near_duplicate"),
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        })
+    except Exception as e:
+        jobs.update(job_id, status="failed", error=str(e))
+
+
+def _content_hash(brief: dict, results: dict) -> str:
+    """Stable hash of a generation's creatives (excludes job ids, timings and timestamps)."""
+    return content_hash({
+        "brief": {k: v for k, v in brief.items() if not k.startswith("_")},
+        "seed": brief_seed(brief),
+        # Expanded responses are a different representation of the same creatives
+        **({"expand": True} if brief.get("_expand") else {}),
+        **{name: results.get(name) for name in ("copy", "images", "variations", "platforms")}
+    })
+
+
+def _open_session(session_id: str, brief: dict, results: dict):
+    """Store a finished generation as a refinement session."""
+    sessions.create(session_id, status="done", result=new_session(brief, results))
+
+
+def _refine_in_session(session_id: str, message: str):
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found or expired"}), 404
+    if not message.strip():
+        return jsonify({"error": "message required"}), 400
+
+    started = time.perf_counter()
+    state, delta = refine_session(session["result"], message)
+    sessions.update(session_id, result=state)
+
+    result = {
+        "session_id": session_id,
+        **delta,
+        "refinement_applied": _describe_changes(delta["changes"]),
+        "message": _generate_agent_response(message, delta["copy"], seeded_random(state["brief"], "reply")),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+    result["content_hash"] = content_hash({k: v for k, v in result.items() if k != "duration_ms"})
+    return jsonify(result), 200, {"ETag": f'"{result["content_hash"]}"'}
+
+
+def _describe_changes(changes: dict) -> str:
+    parts = []
+    if "tone" in changes:
+        parts.append(f"tone adjusted to '{changes['tone']}'")
+    if "audience" in changes:
+        parts.append(f"audience set to '{changes['audience']}'")
+    if "length" in changes:
+        parts.append("copy shortened" if changes["length"] == "short" else "copy expanded")
+    if "cta" in changes:
+        parts.append("new call to action")
+    if "emoji" in changes:
+        parts.append("emojis added" if changes["emoji"] == "add" else "emojis removed")
+    return "; ".join(parts).capitalize() if parts else "Copy refreshed"
+
+
+def _generate_agent_response(message: str, new_copy: dict, rng: random.Random = random) -> str:
     """Generate a friendly agent response to the refinement request."""
     responses = [
         f"✅ Got it! I've updated the copy to match your request. The new headline is: \"{new_copy['headline']}\"",
@@ -159,5 +738,4 @@ def _generate_agent_response(message: str, new_copy: dict) -> str:
         f"✨ Updated! Here's the refreshed copy with your adjustments applied.",
         f"🚀 Refined! The new headline reads: \"{new_copy['headline']}\" — let me know if you'd like more changes!"
     ]
-    import random
-    return random.choice(responses)
+    return rng.choice(responses)
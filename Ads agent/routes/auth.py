@@ -0,0 +1,54 @@
+import time
+from flask import Blueprint, request, jsonify, session
+from services.user_store import get_user_store, InvalidCursorError
+
+auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
+
+USERS_PAGE_MAX = 500
+
+
+@auth_bp.route("/google", methods=["POST"])
+def google_auth():
+    """Receive Google OAuth user data and store it."""
+    data = request.get_json()
+    if not data or not data.get("user"):
+        return jsonify({"error": "No user data provided"}), 400
+
+    user = data["user"]
+    email = user.get("email", "")
+
+    # Store/update user in the shared user store
+    record = {
+        "name": user.get("name", ""),
+        "email": email,
+        "picture": user.get("picture", ""),
+        "provider": user.get("provider", "google"),
+        "sub": user.get("sub", ""),
+        "last_login": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+    # Batched with the logins arriving at the same time, and committed before we answer
+    get_user_store().save(record)
+    # Identity for per-user rate limits on the generation endpoints
+    session["user_id"] = email or record["sub"]
+
+    print(f"[Auth] User signed in: {user.get('name')} <{email}>")
+
+    return jsonify({
+        "status": "ok",
+        "user": record,
+        "message": f"Welcome, {user.get('name')}!"
+    }), 200
+
+
+@auth_bp.route("/users", methods=["GET"])
+def list_users():
+    """
+    List signed-in users, most recent login first (admin endpoint).
+    Query params: limit (default 50), cursor (next_cursor from the previous page)
+    """
+    limit = max(1, min(request.args.get("limit", 50, type=int), USERS_PAGE_MAX))
+    try:
+        users, next_cursor = get_user_store().list_users(limit=limit, cursor=request.args.get("cursor"))
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"users": users, "count": len(users), "next_cursor": next_cursor}), 200
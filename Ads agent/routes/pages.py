@@ -0,0 +1,50 @@
+from flask import Blueprint, Response, abort, current_app, render_template, request
+from services.static_assets import Asset, IMMUTABLE
+
+pages_bp = Blueprint("pages", __name__)
+
+# The HTML pages have no per-request content: each is rendered and compressed once per process
+_pages = {}
+
+
+def _send(asset: Asset, cache_control: str) -> Response:
+    body, coding, etag = asset.select(request.headers.get("Accept-Encoding", ""))
+    response = Response(body, mimetype=asset.mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.vary.add("Accept-Encoding")
+    if coding:
+        response.headers["Content-Encoding"] = coding
+    return response.make_conditional(request)
+
+
+def _page(template: str) -> Response:
+    asset = _pages.get(template)
+    if asset is None:
+        html = render_template(template).encode("utf-8")
+        asset = _pages[template] = Asset(template, html, "text/html")
+    # Revalidated on every load (304 while unchanged), so a deploy is picked up straight away
+    return _send(asset, "no-cache")
+
+
+@pages_bp.route("/")
+def index():
+    return _page("index.html")
+
+
+@pages_bp.route("/login")
+def login():
+    return _page("login.html")
+
+
+@pages_bp.route("/assets/<path:name>")
+def asset(name):
+    """
+    Fingerprinted static file (`css/style.<hash>.css`), precompressed, cacheable forever.
+    A stale fingerprint still gets the current file, but not cached, so a page rendered
+    before a deploy keeps working.
+    """
+    found, current = current_app.extensions["assets"].resolve(name)
+    if found is None:
+        abort(404)
+    return _send(found, IMMUTABLE if current else "no-cache")
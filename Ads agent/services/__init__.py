@@ -0,0 +1,3 @@
+# Services package
+# Load .env before any module in the package reads its settings
+import config  # noqa: F401
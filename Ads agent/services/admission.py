@@ -0,0 +1,383 @@
+import os
+import math
+import time
+import heapq
+import sqlite3
+import asyncio
+import itertools
+import threading
+from services.rate_limit import TokenBucket
+from services.metrics import inc, register_collector
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Token buckets live in this process ("memory") or in SQLite ("sqlite"), shared by every worker on the host
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory").lower()
+ADMISSION_DB_PATH = os.getenv("ADMISSION_DB_PATH", os.path.join(APP_DIR, "admission.sqlite3"))
+
+# Generation requests per minute and burst size, per signed-in user and per client IP (0 disables)
+RATE_LIMIT_USER_PER_MIN = float(os.getenv("RATE_LIMIT_USER_PER_MIN", "30"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "10"))
+RATE_LIMIT_IP_PER_MIN = float(os.getenv("RATE_LIMIT_IP_PER_MIN", "60"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+
+# Admitted requests running at once in this process, how many more may wait, and for how long (0 disables)
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# How often (seconds) refilled buckets are swept
+EVICT_INTERVAL = 30.0
+
+# Priority classes, most urgent first: chat refinement, single generations, batch and background jobs
+INTERACTIVE, GENERATE, BATCH = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", GENERATE: "generate", BATCH: "batch"}
+
+
+class AdmissionRejected(Exception):
+    """A request turned away before any work: rate-limited, or no room to wait for a slot."""
+
+    def __init__(self, reason: str, retry_after: float):
+        messages = {
+            "rate_limited": "Too many requests",
+            "queue_full": "Server busy",
+            "queue_timeout": "Server busy",
+            "preempted": "Server busy",
+        }
+        # Whole seconds, as sent in Retry-After
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+        super().__init__(f"{messages.get(reason, 'Server busy')}, retry in {self.retry_after}s")
+
+
+class MemoryBuckets:
+    """Process-local token buckets keyed by identity."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+
+    def try_acquire(self, key: str, rate: float, capacity: float, tokens: float = 1.0) -> float:
+        """Take tokens from `key`'s bucket. Returns 0 on success, else seconds until they would be available."""
+        # Sweep first: a bucket created below is full, and must not be dropped before it is charged
+        self._maybe_evict()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket.try_acquire(tokens)
+
+    def refund(self, key: str, rate: float, capacity: float, tokens: float = 1.0):
+        """Give back tokens taken from `key`'s bucket."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.refund(tokens)
+
+    def evict_full(self) -> int:
+        """Drop buckets that have refilled; a missing bucket starts full anyway."""
+        with self._lock:
+            full = [key for key, bucket in self._buckets.items() if bucket.is_full()]
+            for key in full:
+                del self._buckets[key]
+        return len(full)
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict >= EVICT_INTERVAL:
+            self._last_evict = now
+            self.evict_full()
+
+
+class SQLiteBuckets:
+    """
+    Token buckets in a local SQLite file (WAL mode), so the limits hold across every
+    gunicorn/uvicorn worker on the host. Each acquire is one short IMMEDIATE transaction.
+    One connection per thread.
+    """
+
+    def __init__(self, path: str = ADMISSION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._last_evict = 0.0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_full_at ON buckets(full_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection opened before a fork (gunicorn --preload) must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def try_acquire(self, key: str, rate: float, capacity: float, tokens: float = 1.0) -> float:
+        """Take tokens from `key`'s bucket. Returns 0 on success, else seconds until they would be available."""
+        if not rate:
+            return 0.0
+        conn = self._conn()
+        # Wall-clock time: it is shared between processes, unlike time.monotonic()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            available = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0.0 if available >= tokens else (tokens - available) / rate
+            if not wait:
+                available -= tokens
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                (key, available, now, now + (capacity - available) / rate)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_evict()
+        return wait
+
+    def refund(self, key: str, rate: float, capacity: float, tokens: float = 1.0):
+        """Give back tokens taken from `key`'s bucket."""
+        if not rate:
+            return
+        self._conn().execute(
+            "UPDATE buckets SET tokens = MIN(?1, tokens + ?2), full_at = updated_at + (?1 - MIN(?1, tokens + ?2)) / ?3 "
+            "WHERE key = ?4",
+            (capacity, tokens, rate, key)
+        )
+
+    def evict_full(self) -> int:
+        cur = self._conn().execute("DELETE FROM buckets WHERE full_at <= ?", (time.time(),))
+        return cur.rowcount
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict >= EVICT_INTERVAL:
+            self._last_evict = now
+            self.evict_full()
+
+
+def create_buckets(kind: str = ADMISSION_BACKEND, **kwargs):
+    """Return a token bucket backend for `kind` ("memory" or "sqlite")."""
+    if kind == "sqlite":
+        return SQLiteBuckets(**kwargs)
+    if kind == "memory":
+        return MemoryBuckets()
+    raise ValueError(f"Unknown admission backend '{kind}'")
+
+
+class RateLimiter:
+    """
+    Per-user and per-IP request limits. A signed-in user draws from their own bucket, and
+    every request also draws from its client IP's bucket, so minting new identities from
+    one address does not get around the limit. Limits are (requests per minute, burst).
+    """
+
+    def __init__(self, buckets, user_limit: tuple = (RATE_LIMIT_USER_PER_MIN, RATE_LIMIT_USER_BURST),
+                 ip_limit: tuple = (RATE_LIMIT_IP_PER_MIN, RATE_LIMIT_IP_BURST)):
+        self.buckets = buckets
+        self.user_limit = user_limit
+        self.ip_limit = ip_limit
+
+    def check(self, user: str, ip: str, cost: float = 1.0):
+        """
+        Charge one request. Raises AdmissionRejected with the wait when a bucket is empty; a
+        rejected request is not charged to the other bucket either.
+        """
+        charged = []
+        for key, (per_minute, burst) in ((user and f"user:{user}", self.user_limit),
+                                         (ip and f"ip:{ip}", self.ip_limit)):
+            if not key or not per_minute:
+                continue
+            rate, capacity = per_minute / 60, max(burst, cost)
+            wait = self.buckets.try_acquire(key, rate, capacity, cost)
+            if wait:
+                for charged_key, charged_rate, charged_capacity in charged:
+                    self.buckets.refund(charged_key, charged_rate, charged_capacity, cost)
+                raise AdmissionRejected("rate_limited", wait)
+            charged.append((key, rate, capacity))
+
+
+class _Waiter:
+    __slots__ = ("priority", "state", "wake")
+
+    def __init__(self, priority: int, wake):
+        self.priority = priority
+        self.state = "waiting"
+        self.wake = wake
+
+
+class Slot:
+    """An admitted request's place among the active ones. release() is idempotent."""
+
+    def __init__(self, queue: "AdmissionQueue" = None):
+        self._queue = queue
+        self._started = time.monotonic()
+
+    def release(self):
+        queue, self._queue = self._queue, None
+        if queue is not None:
+            queue._release(time.monotonic() - self._started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AdmissionQueue:
+    """
+    Bounds the requests running at once in this process. Past `max_active`, up to `max_waiting`
+    requests wait for a slot in priority order (then arrival order) for at most `timeout` seconds.
+    When the queue is full, a request of a more urgent class displaces the least urgent waiter.
+    Threads and asyncio tasks share one queue: acquire() blocks, acquire_async() awaits.
+    """
+
+    def __init__(self, max_active: int = ADMISSION_MAX_ACTIVE, max_waiting: int = ADMISSION_MAX_QUEUE,
+                 timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._heap = []  # (priority, seq, waiter); left-behind entries are skipped when popped
+        self._seq = itertools.count()
+        self._hold = 1.0  # moving average of seconds a slot is held, for Retry-After
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: int = GENERATE) -> Slot:
+        """Wait for a slot. Raises AdmissionRejected when the queue is full or the wait times out."""
+        if not self.max_active:
+            return Slot()
+        admitted = threading.Event()
+        waiter = self._enter(priority, admitted.set)
+        if waiter is not None:
+            admitted.wait(self.timeout)
+            self._settle(waiter)
+        return Slot(self)
+
+    async def acquire_async(self, priority: int = GENERATE) -> Slot:
+        """acquire() for coroutines: waits without blocking the event loop."""
+        if not self.max_active:
+            return Slot()
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+        waiter = self._enter(priority, lambda: loop.call_soon_threadsafe(_resolve, admitted))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(admitted), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                if self._cancel(waiter):
+                    self._release(0.0)
+                raise
+            self._settle(waiter)
+        return Slot(self)
+
+    def _enter(self, priority: int, wake) -> _Waiter:
+        """Take a free slot (returns None) or queue a waiter. Raises AdmissionRejected when full."""
+        with self._lock:
+            if self.active < self.max_active and not self.waiting:
+                self.active += 1
+                return None
+            if self.waiting >= self.max_waiting:
+                worst = max((entry for entry in self._heap if entry[2].state == "waiting"), default=None)
+                if worst is None or worst[0] <= priority:
+                    self._reject("queue_full", priority)
+                worst[2].state = "preempted"
+                self.waiting -= 1
+                worst[2].wake()
+            if len(self._heap) > 2 * self.max_waiting:
+                self._heap = [entry for entry in self._heap if entry[2].state == "waiting"]
+                heapq.heapify(self._heap)
+            waiter = _Waiter(priority, wake)
+            heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+            self.waiting += 1
+            return waiter
+
+    def _settle(self, waiter: _Waiter):
+        """After waking or timing out: return if the waiter was handed a slot, else raise."""
+        with self._lock:
+            if waiter.state == "admitted":
+                return
+            if waiter.state == "waiting":
+                waiter.state = "timed_out"
+                self.waiting -= 1
+            self._reject("queue_timeout" if waiter.state == "timed_out" else waiter.state, waiter.priority)
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """Withdraw a waiter. Returns True if it already held a slot, which the caller must release."""
+        with self._lock:
+            if waiter.state == "waiting":
+                waiter.state = "cancelled"
+                self.waiting -= 1
+            return waiter.state == "admitted"
+
+    def _release(self, held: float):
+        with self._lock:
+            self._hold = 0.8 * self._hold + 0.2 * held
+            while self._heap:
+                waiter = heapq.heappop(self._heap)[2]
+                if waiter.state == "waiting":
+                    # Hand the slot straight to the most urgent waiter
+                    waiter.state = "admitted"
+                    self.waiting -= 1
+                    waiter.wake()
+                    return
+            self.active -= 1
+
+    def _reject(self, reason: str, priority: int):
+        """Raise AdmissionRejected, with a wait estimated from the queue length. Called with the lock held."""
+        inc("admission_rejected_total", reason=reason, priority=PRIORITY_NAMES.get(priority, str(priority)))
+        raise AdmissionRejected(reason, self._hold * (self.waiting + 1) / self.max_active)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+limiter = RateLimiter(create_buckets())
+admission_queue = AdmissionQueue()
+
+
+def admit(user: str, ip: str, priority: int = GENERATE) -> Slot:
+    """Rate-limit then queue a request. Returns its Slot; raises AdmissionRejected."""
+    _check_rate(user, ip, priority)
+    return admission_queue.acquire(priority)
+
+
+async def admit_async(user: str, ip: str, priority: int = GENERATE) -> Slot:
+    """admit() for coroutines. The SQLite backend is queried off the event loop."""
+    if isinstance(limiter.buckets, SQLiteBuckets):
+        await asyncio.to_thread(_check_rate, user, ip, priority)
+    else:
+        _check_rate(user, ip, priority)
+    return await admission_queue.acquire_async(priority)
+
+
+def _check_rate(user: str, ip: str, priority: int):
+    try:
+        limiter.check(user, ip)
+    except AdmissionRejected:
+        inc("admission_rejected_total", reason="rate_limited", priority=PRIORITY_NAMES.get(priority, str(priority)))
+        raise
+
+
+def _collect_admission_metrics() -> list:
+    return [
+        ("gauge", "admission_active", (), admission_queue.active),
+        ("gauge", "admission_waiting", (), admission_queue.waiting),
+    ]
+
+
+register_collector(_collect_admission_metrics)
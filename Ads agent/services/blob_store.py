@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import threading
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(APP_DIR, "blobs"))
+BLOB_STORE_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+BLOB_MAX_OBJECT_BYTES = int(os.getenv("BLOB_MAX_OBJECT_BYTES", str(20 * 1024 * 1024)))
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobTooLargeError(Exception):
+    """Raised when an upstream object is bigger than the per-object limit."""
+
+
+class BlobStore:
+    """
+    On-disk, content-addressed store for remote images.
+    A URL index (url/<sha256(url)>.json) points at content blobs (content/<ab>/<sha256(body)>),
+    so identical images fetched from different URLs are stored once. Blobs are evicted
+    least-recently-used (by mtime, touched on every hit) once the store exceeds `max_bytes`,
+    together with the URL entries pointing at them.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR, max_bytes: int = BLOB_STORE_MAX_BYTES,
+                 max_object_bytes: int = BLOB_MAX_OBJECT_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        os.makedirs(os.path.join(root, "url"), exist_ok=True)
+        os.makedirs(os.path.join(root, "content"), exist_ok=True)
+        self._total = sum(size for _, size, _ in self._scan())
+
+    def get(self, url: str) -> dict:
+        """Metadata for a stored URL ({path, etag, content_type, size}), or None."""
+        index_path = self._index_path(url)
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = self._content_path(meta["etag"])
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            # Content was evicted: drop the dangling entry too
+            _remove(index_path)
+            return None
+        return {**meta, "path": path}
+
+    def fetch(self, url: str, timeout: float = 15) -> dict:
+        """Return the stored blob for `url`, downloading it (streamed to disk) on a miss."""
+        meta = self.get(url)
+        if meta is not None:
+            return meta
+
+        with self._url_lock(url):
+            meta = self.get(url)  # another thread may have fetched it meanwhile
+            if meta is not None:
+                return meta
+            return self._download(url, timeout)
+
+    def _download(self, url: str, timeout: float) -> dict:
+        import requests
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.root, f"tmp-{os.getpid()}-{threading.get_ident()}")
+        try:
+            with requests.get(url, timeout=timeout, stream=True) as resp:
+                resp.raise_for_status()
+                content_type = resp.headers.get("Content-Type", "image/jpeg")
+                with open(tmp_path, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_object_bytes:
+                            raise BlobTooLargeError(f"Object larger than {self.max_object_bytes} bytes")
+                        digest.update(chunk)
+                        f.write(chunk)
+
+            etag = digest.hexdigest()
+            path = self._content_path(etag)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self._total += size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        meta = {"url": url, "etag": etag, "content_type": content_type, "size": size}
+        index_path = self._index_path(url)
+        with open(f"{index_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(f"{index_path}.tmp", index_path)
+
+        if self._total > self.max_bytes:
+            self.evict()
+        return {**meta, "path": path}
+
+    def evict(self, target_ratio: float = 0.9) -> int:
+        """
+        Remove least-recently-used blobs until the store is under target_ratio * max_bytes,
+        then the URL entries that pointed at them. Returns the number of blobs removed.
+        """
+        with self._lock:
+            entries = sorted(self._scan(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            removed = set()
+            for path, size, _ in entries:
+                if total <= self.max_bytes * target_ratio:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed.add(os.path.basename(path))
+            self._total = total
+        if removed:
+            self._remove_index_entries(removed)
+        return len(removed)
+
+    def _remove_index_entries(self, etags: set):
+        """Delete the URL entries whose content is one of `etags` (a scan of the URL index)."""
+        for entry in os.scandir(os.path.join(self.root, "url")):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as f:
+                    etag = json.load(f)["etag"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if etag in etags:
+                _remove(entry.path)
+
+    def _scan(self):
+        """Yield (path, size, mtime) for every content blob."""
+        content_root = os.path.join(self.root, "content")
+        for shard in os.scandir(content_root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def _index_path(self, url: str) -> str:
+        return os.path.join(self.root, "url", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _content_path(self, etag: str) -> str:
+        return os.path.join(self.root, "content", etag[:2], etag)
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            lock = self._url_locks.get(url)
+            if lock is None:
+                if len(self._url_locks) > 1024:
+                    self._url_locks.clear()
+                lock = self._url_locks[url] = threading.Lock()
+            return lock
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store() -> BlobStore:
+    """Process-wide image store, created on first use."""
+    global _image_store
+    with _image_store_lock:
+        if _image_store is None:
+            _image_store = BlobStore()
+        return _image_store
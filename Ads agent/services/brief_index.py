@@ -0,0 +1,339 @@
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache
+from services.lazy_import import lazy_module
+from services.metrics import register_collector
+
+# numpy is imported on the first lookup, not at app start
+np = lazy_module("numpy")
+
+# Estimated Jaccard similarity (over description and audience word shingles) at which an earlier
+# brief's copy and images are reused; 0 disables near-duplicate reuse
+BRIEF_SIMILARITY = float(os.getenv("BRIEF_SIMILARITY", "0.7"))
+# SQLite file the index is persisted to (and shared through by workers); empty keeps it in memory only
+BRIEF_INDEX_PATH = os.getenv("BRIEF_INDEX_PATH", "")
+# Seconds a stored generation may be reused
+BRIEF_INDEX_TTL = float(os.getenv("BRIEF_INDEX_TTL", "86400"))
+
+# MinHash signature of NUM_PERM values, split into BANDS bands of ROWS rows for LSH: two briefs
+# become candidates when any band matches, which is likely above (1 / BANDS) ** (1 / ROWS) = 0.5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Band entries added since the last merge into the sorted arrays, and the candidates taken per band
+MERGE_AT = 16 * 4096
+MAX_PER_BAND = 32
+# How often (seconds) rows written by other workers are pulled in, and expired rows deleted
+SYNC_INTERVAL = 5.0
+EVICT_INTERVAL = 300.0
+
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=None)
+def _hash_params() -> tuple:
+    """
+    (A, B, PRIME, BAND_SEEDS, MIX) for the MinHash permutations and band keys.
+    Fixed seeds: signatures are persisted, so they must agree across processes and restarts.
+    """
+    rng = np.random.default_rng(20240229)
+    a = rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+    band_seeds = rng.integers(0, 1 << 63, BANDS, dtype=np.uint64)
+    prime = np.uint64(4294967311)  # smallest prime above 2**32
+    return a, b, prime, band_seeds, np.uint64(0x100000001B3)
+
+
+def brief_signature(brief: dict) -> tuple:
+    """
+    (salt, signature) of a brief, or None when it has no words to compare.
+    Product name and tone must match exactly: they form the salt every LSH band key is
+    hashed with. Description and audience are compared as sets of word 1- and 2-grams,
+    summarized by a MinHash signature of NUM_PERM uint32 values.
+    """
+    shingles = set()
+    for field in ("description", "audience"):
+        words = _WORD.findall(str(brief.get(field, "")).casefold())
+        shingles.update(f"{field[0]}:{w}" for w in words)
+        shingles.update(f"{field[0]}:{a} {b}" for a, b in zip(words, words[1:]))
+    if not shingles:
+        return None
+    a, b, prime, _, _ = _hash_params()
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), np.uint64, len(shingles))
+    signature = ((a[:, None] * hashes[None, :] + b[:, None]) % prime).min(axis=1).astype(np.uint32)
+    product = " ".join(str(brief.get("product_name", "")).split()).casefold()
+    salt = hashlib.blake2b(f"{product}\x1f{brief.get('tone', 'professional')}".encode("utf-8"), digest_size=8)
+    return np.uint64(int.from_bytes(salt.digest(), "little")), signature
+
+
+def _band_keys(salts: "np.ndarray", signatures: "np.ndarray") -> "np.ndarray":
+    """(n, BANDS) uint64 keys: each band's rows hashed together with the brief's salt."""
+    _, _, _, band_seeds, mix = _hash_params()
+    rows = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    keys = salts[:, None] ^ band_seeds[None, :]
+    for r in range(ROWS):
+        keys = (keys ^ rows[:, :, r]) * mix
+    return keys
+
+
+class BriefIndex:
+    """
+    MinHash + LSH index of generated briefs, for reusing the copy and images of a near-identical
+    earlier brief. Signatures (as uint16, 128 bytes per brief) and band keys live in numpy arrays:
+    band keys are kept sorted, so a lookup is BANDS binary searches plus a vectorized similarity
+    check of the candidates, well under a millisecond at a million briefs. Recent additions sit
+    in a dict until MERGE_AT of them are merged in.
+    With a `path`, briefs and their creatives are stored in SQLite, reloaded on first use and
+    shared with other workers, which pull in each other's rows every SYNC_INTERVAL seconds.
+    """
+
+    def __init__(self, path: str = BRIEF_INDEX_PATH, threshold: float = BRIEF_SIMILARITY,
+                 ttl: float = BRIEF_INDEX_TTL):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Per-entry arrays, grown by doubling; the first _size rows are in use
+        self._size = 0
+        self._signatures = np.empty((0, NUM_PERM), np.uint16)
+        self._created = np.empty(0, np.float64)
+        self._rowids = np.empty(0, np.int64)
+        self._keys = np.empty(0, np.uint64)  # sorted band keys
+        self._positions = np.empty(0, np.int32)  # entry of each band key
+        self._tail = {}  # band key -> [entry], not merged yet
+        self._tail_count = 0
+        self._payloads = {}  # rowid -> (copy JSON, images JSON) without a path
+        self._last_rowid = 0
+        self._last_sync = None
+        self._last_evict = 0.0
+        self._counts = {"lookups": 0, "matches": 0, "added": 0}
+        if path:
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS briefs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, salt INTEGER NOT NULL, signature BLOB NOT NULL, "
+                "brief TEXT NOT NULL, copy TEXT NOT NULL, images TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_briefs_created_at ON briefs(created_at)")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, brief: dict) -> dict:
+        """
+        The most similar stored brief at or above the threshold, as
+        {id, similarity, copy, images, created_at}, or None.
+        """
+        signed = brief_signature(brief)
+        if signed is None:
+            return None
+        salt, signature = signed
+        self._maybe_sync()
+        keys = _band_keys(np.array([salt]), signature[None, :])[0]
+        with self._lock:
+            self._counts["lookups"] += 1
+            candidates = self._candidates(keys)
+            if not len(candidates):
+                return None
+            candidates = candidates[self._created[candidates] > time.time() - self.ttl]
+            if not len(candidates):
+                return None
+            # Signatures are stored as their low 16 bits: an accidental equality costs 1 / 65536
+            similarity = (self._signatures[candidates] == signature.astype(np.uint16)).mean(axis=1)
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.threshold:
+                return None
+            entry = int(candidates[best])
+            rowid, created_at = int(self._rowids[entry]), float(self._created[entry])
+            payload = self._payloads.get(rowid)
+        if payload is None:
+            row = self._conn().execute("SELECT copy, images FROM briefs WHERE id = ?", (rowid,)).fetchone()
+            if row is None:
+                return None
+            payload = row
+        with self._lock:
+            self._counts["matches"] += 1
+        return {
+            "id": rowid,
+            "similarity": round(float(similarity[best]), 3),
+            "copy": json.loads(payload[0]),
+            "images": json.loads(payload[1]),
+            "created_at": created_at,
+        }
+
+    def add(self, brief: dict, copy: dict, images: list) -> int:
+        """Store a brief with its generated copy and images. Returns its id (None if it has no words)."""
+        signed = brief_signature(brief)
+        if signed is None:
+            return None
+        salt, signature = signed
+        now = time.time()
+        payload = (json.dumps(copy), json.dumps(images))
+        if self.path:
+            record = {k: v for k, v in brief.items() if not k.startswith("_")}
+            rowid = self._conn().execute(
+                "INSERT INTO briefs (salt, signature, brief, copy, images, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (int(salt.astype(np.int64)), signature.tobytes(), json.dumps(record), *payload, now)
+            ).lastrowid
+            # The new row arrives with any other worker's rows since the last sync
+            self._sync()
+        else:
+            with self._lock:
+                rowid = self._last_rowid = self._last_rowid + 1
+                self._payloads[rowid] = payload
+                self._append(np.array([salt]), signature[None, :], np.array([now]), np.array([rowid]))
+        with self._lock:
+            self._counts["added"] += 1
+        return rowid
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, "size": self._size, "unmerged": self._tail_count}
+
+    def _candidates(self, keys: "np.ndarray") -> "np.ndarray":
+        """Entries sharing at least one band key (the most recent MAX_PER_BAND per band). Lock held."""
+        found = []
+        if len(self._keys):
+            lo = np.searchsorted(self._keys, keys, side="left")
+            hi = np.searchsorted(self._keys, keys, side="right")
+            for start, end in zip(lo[hi > lo], hi[hi > lo]):
+                found.append(self._positions[max(start, end - MAX_PER_BAND):end])
+        for key in keys.tolist():
+            entries = self._tail.get(key)
+            if entries:
+                found.append(np.array(entries[-MAX_PER_BAND:], np.int32))
+        if not found:
+            return np.empty(0, np.int32)
+        return np.unique(np.concatenate(found))
+
+    def _append(self, salts, signatures, created, rowids):
+        """Add entries to the arrays and index their band keys. Lock held."""
+        start = self._size
+        self._size += len(salts)
+        if self._size > len(self._created):
+            capacity = max(1024, self._size, 2 * len(self._created))
+            self._signatures = _grow(self._signatures, capacity)
+            self._created = _grow(self._created, capacity)
+            self._rowids = _grow(self._rowids, capacity)
+        self._signatures[start:self._size] = signatures
+        self._created[start:self._size] = created
+        self._rowids[start:self._size] = rowids
+        keys = _band_keys(salts, signatures)
+        if len(salts) * BANDS >= MERGE_AT:
+            self._merge(keys.ravel(), np.repeat(np.arange(start, self._size, dtype=np.int32), BANDS))
+            return
+        for entry, row in enumerate(keys.tolist(), start):
+            for key in row:
+                self._tail.setdefault(key, []).append(entry)
+        self._tail_count += len(salts) * BANDS
+        if self._tail_count >= MERGE_AT:
+            self._merge(np.empty(0, np.uint64), np.empty(0, np.int32))
+
+    def _merge(self, keys: "np.ndarray", positions: "np.ndarray"):
+        """Merge `keys` and the unmerged additions into the sorted arrays, dropping expired entries. Lock held."""
+        if self._tail:
+            tail_keys = np.fromiter((k for k, entries in self._tail.items() for _ in entries), np.uint64,
+                                    self._tail_count)
+            tail_positions = np.fromiter((e for entries in self._tail.values() for e in entries), np.int32,
+                                         self._tail_count)
+            keys = np.concatenate([keys, tail_keys])
+            positions = np.concatenate([positions, tail_positions])
+            self._tail = {}
+            self._tail_count = 0
+        # Stable order keeps entries with equal keys in insertion order: the newest are last
+        order = np.argsort(keys, kind="stable")
+        keys, positions = keys[order], positions[order]
+        at = np.searchsorted(self._keys, keys, side="right")
+        self._keys = np.insert(self._keys, at, keys)
+        self._positions = np.insert(self._positions, at, positions)
+        live = self._created[:self._size] > time.time() - self.ttl
+        if live.sum() * 2 < self._size:
+            self._compact(live)
+
+    def _compact(self, live: "np.ndarray"):
+        """Drop expired entries, keeping the band keys sorted. Lock held (and nothing unmerged)."""
+        for rowid in self._rowids[:self._size][~live].tolist():
+            self._payloads.pop(rowid, None)
+        size = int(live.sum())
+        for name in ("_signatures", "_created", "_rowids"):
+            values = getattr(self, name)[:self._size][live]
+            setattr(self, name, _grow(values, max(1024, 2 * size)))
+        renumbered = np.cumsum(live, dtype=np.int64) - 1
+        kept = live[self._positions]
+        self._keys = self._keys[kept]
+        self._positions = renumbered[self._positions[kept]].astype(np.int32)
+        self._size = size
+
+    def _maybe_sync(self):
+        if self.path and (self._last_sync is None or time.monotonic() - self._last_sync >= SYNC_INTERVAL):
+            self._sync()
+
+    def _sync(self):
+        """Pull in rows added since the last sync (on first use: every live row)."""
+        rows = self._conn().execute(
+            "SELECT id, salt, signature, created_at FROM briefs WHERE id > ? AND created_at > ? ORDER BY id",
+            (self._last_rowid, time.time() - self.ttl)
+        ).fetchall()
+        self._last_sync = time.monotonic()
+        if rows:
+            with self._lock:
+                rows = [row for row in rows if row[0] > self._last_rowid]
+                if rows:
+                    self._last_rowid = rows[-1][0]
+                    signatures = np.frombuffer(b"".join(row[2] for row in rows), np.uint32)
+                    self._append(np.array([row[1] for row in rows], np.int64).astype(np.uint64),
+                                 signatures.reshape(len(rows), NUM_PERM),
+                                 np.array([row[3] for row in rows]), np.array([row[0] for row in rows]))
+        now = time.monotonic()
+        if now - self._last_evict >= EVICT_INTERVAL:
+            self._last_evict = now
+            self._conn().execute("DELETE FROM briefs WHERE created_at <= ?", (time.time() - self.ttl,))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection opened before a fork (gunicorn --preload) must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+
+def _grow(values: "np.ndarray", capacity: int) -> "np.ndarray":
+    grown = np.empty((capacity,) + values.shape[1:], values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_brief_index() -> BriefIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = BriefIndex()
+        return _index
+
+
+def _collect_index_metrics() -> list:
+    if _index is None:
+        return []
+    stats = _index.stats()
+    return [
+        ("gauge", "brief_index_entries", (), stats["size"]),
+        ("counter", "brief_index_lookups_total", (), stats["lookups"]),
+        ("counter", "brief_index_matches_total", (), stats["matches"]),
+    ]
+
+
+register_collector(_collect_index_metrics)
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from services.metrics import register_collector
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+# Path to a SQLite file for the on-disk tier; empty keeps the cache in memory only
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+
+# How often (seconds) expired rows are swept from the SQLite tier
+EVICT_INTERVAL = 60.0
+
+# Brief fields whose values are matched case-insensitively; any other text keeps its case
+CASE_INSENSITIVE_FIELDS = frozenset({"tone", "platform", "platforms"})
+
+
+def make_key(*parts) -> str:
+    """
+    Content-addressed cache key. Strings are whitespace-collapsed, CASE_INSENSITIVE_FIELDS
+    case-folded and dicts key-sorted, so cosmetic differences in a brief hash the same.
+    """
+    return hashlib.sha256(json.dumps(_normalize(parts), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def content_hash(value) -> str:
+    """Exact hash of a JSON-serializable value (no normalization), e.g. for ETags."""
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+def _normalize(value, fold: bool = False):
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.casefold() if fold else value
+    if isinstance(value, dict):
+        return {str(k): _normalize(v, str(k) in CASE_INSENSITIVE_FIELDS)
+                for k, v in value.items() if not str(k).startswith("_")}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v, fold) for v in value]
+    return value
+
+
+class ResponseCache:
+    """
+    Two-tier cache for agent responses: an in-memory LRU with TTL and an
+    optional SQLite tier that survives restarts. Values must be JSON-serializable;
+    every get() returns a fresh copy, so callers may mutate what they receive.
+    """
+
+    def __init__(self, name: str, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL,
+                 disk_path: str = CACHE_DB_PATH):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self._entries = OrderedDict()  # key -> (expires_at, json)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counts = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "bypassed": 0}
+        self._last_evict = 0.0
+        if disk_path:
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (name, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache(expires_at)")
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counts["hits"] += 1
+                    self._counts["memory_hits"] += 1
+                    return json.loads(entry[1])
+                del self._entries[key]
+
+        if self.disk_path:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM cache WHERE name = ? AND key = ?", (self.name, key)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self._counts["hits"] += 1
+                    self._counts["disk_hits"] += 1
+                return json.loads(row[0])
+
+        with self._lock:
+            self._counts["misses"] += 1
+        return None
+
+    def set(self, key: str, value, ttl: float = None):
+        payload = json.dumps(value)
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._remember(key, payload, expires_at)
+        if self.disk_path:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache (name, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.name, key, payload, expires_at)
+            )
+            self._maybe_evict()
+
+    def get_or_compute(self, key: str, compute, bypass: bool = False):
+        """Return the cached value or compute, store and return it. bypass skips the lookup."""
+        if bypass:
+            with self._lock:
+                self._counts["bypassed"] += 1
+        else:
+            value = self.get(key)
+            if value is not None:
+                return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    async def get_or_compute_async(self, key: str, compute, bypass: bool = False):
+        """get_or_compute for an async `compute` (a coroutine function)."""
+        if bypass:
+            with self._lock:
+                self._counts["bypassed"] += 1
+        else:
+            value = self.get(key)
+            if value is not None:
+                return value
+        value = await compute()
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            counts["size"] = len(self._entries)
+        lookups = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = round(counts["hits"] / lookups, 4) if lookups else 0.0
+        return counts
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            self._conn().execute("DELETE FROM cache WHERE name = ?", (self.name,))
+
+    def evict_expired(self) -> int:
+        """Delete expired rows from the SQLite tier (every cache sharing the file), which reads only skip."""
+        if not self.disk_path:
+            return 0
+        return self._conn().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict >= EVICT_INTERVAL:
+            self._last_evict = now
+            self.evict_expired()
+
+    def _remember(self, key: str, payload: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection opened before a fork (gunicorn --preload) must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.disk_path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+
+# One named cache per agent, so hit/miss counters are reported separately
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, **kwargs) -> ResponseCache:
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = ResponseCache(name, **kwargs)
+        return _caches[name]
+
+
+def _collect_cache_metrics() -> list:
+    samples = []
+    for name, stats in cache_stats().items():
+        labels = (("cache", name),)
+        samples.append(("counter", "cache_hits_total", labels, stats["hits"]))
+        samples.append(("counter", "cache_misses_total", labels, stats["misses"]))
+        samples.append(("gauge", "cache_hit_ratio", labels, stats["hit_rate"]))
+        samples.append(("gauge", "cache_entries", labels, stats["size"]))
+    return samples
+
+
+def cache_stats() -> dict:
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+register_collector(_collect_cache_metrics)
@@ -0,0 +1,73 @@
+import os
+import gzip
+from flask import request
+
+# brotli is optional; without it responses are gzip-compressed only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Levels tuned for dynamic responses: most of the size win for a fraction of the CPU of the maximum
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "text/", "image/svg+xml")
+
+
+def negotiate(accept_encoding: str) -> str:
+    """Best content coding the client accepts: "br", "gzip", or None."""
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip()] = quality
+    for coding in ("br", "gzip") if brotli is not None else ("gzip",):
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def compress(data: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encode_body(data: bytes, mimetype: str, accept_encoding: str) -> tuple:
+    """(body, coding) for a response body: compressed when worthwhile and accepted, else (data, None)."""
+    if len(data) < COMPRESS_MIN_BYTES or not (mimetype or "").startswith(COMPRESSIBLE_TYPES):
+        return data, None
+    coding = negotiate(accept_encoding)
+    if coding is None:
+        return data, None
+    return compress(data, coding), coding
+
+
+def compress_response(response):
+    """
+    after_request hook: gzip/brotli-compress buffered responses the client accepts.
+    Streamed and file responses are left alone, as are responses already encoded.
+    A strong ETag becomes weak, since the compressed bytes are a different representation.
+    """
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    body, coding = encode_body(response.get_data(), response.mimetype,
+                               request.headers.get("Accept-Encoding", ""))
+    if coding is None:
+        return response
+    response.set_data(body)
+    response.headers["Content-Encoding"] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOB_STORE = os.getenv("JOB_STORE", "memory").lower()
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(APP_DIR, "jobs.sqlite3"))
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+
+# How often (seconds) expired records are swept
+EVICT_INTERVAL = 30.0
+
+
+class InMemoryJobStore:
+    """
+    Process-local job store. Records are plain dicts:
+    { id, status, result, error, created_at, updated_at, expires_at }
+    Finished records expire `ttl` seconds after their last update.
+    """
+
+    def __init__(self, ttl: float = JOB_TTL):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+
+    def create(self, job_id: str, status: str = "queued", result: dict = None) -> dict:
+        now = time.time()
+        record = {
+            "id": job_id,
+            "status": status,
+            "result": result or {},
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + self.ttl if status in FINISHED_STATUSES else None
+        }
+        with self._lock:
+            self._jobs[job_id] = record
+        self._maybe_evict()
+        return _copy_record(record)
+
+    def get(self, job_id: str) -> dict:
+        self._maybe_evict()
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None or _is_expired(record):
+                return None
+            return _copy_record(record)
+
+    def update(self, job_id: str, status: str = None, result: dict = None, error: str = None) -> dict:
+        """Update status/error and merge `result` keys into the stored result."""
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None:
+                return None
+            _apply_update(record, status, result, error, self.ttl)
+            return _copy_record(record)
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            expired = [k for k, r in self._jobs.items() if _is_expired(r)]
+            for k in expired:
+                del self._jobs[k]
+        return len(expired)
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict >= EVICT_INTERVAL:
+            self._last_evict = now
+            self.evict_expired()
+
+
+class SQLiteJobStore:
+    """
+    Job store backed by a local SQLite file, so several gunicorn workers
+    on the same host can share job state. One connection per thread.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH, ttl: float = JOB_TTL, table: str = "jobs"):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self._local = threading.local()
+        self._last_evict = 0.0
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT NOT NULL, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_expires_at ON {table}(expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection opened before a fork (gunicorn --preload) must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def create(self, job_id: str, status: str = "queued", result: dict = None) -> dict:
+        now = time.time()
+        record = {
+            "id": job_id,
+            "status": status,
+            "result": result or {},
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + self.ttl if status in FINISHED_STATUSES else None
+        }
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, status, json.dumps(record["result"]), None, now, now, record["expires_at"])
+        )
+        self._maybe_evict()
+        return record
+
+    def get(self, job_id: str) -> dict:
+        self._maybe_evict()
+        row = self._conn().execute(
+            f"SELECT id, status, result, error, created_at, updated_at, expires_at "
+            f"FROM {self.table} WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = _row_to_record(row)
+        return None if _is_expired(record) else record
+
+    def update(self, job_id: str, status: str = None, result: dict = None, error: str = None) -> dict:
+        """Update status/error and merge `result` keys into the stored result."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT id, status, result, error, created_at, updated_at, expires_at "
+                f"FROM {self.table} WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            record = _row_to_record(row)
+            _apply_update(record, status, result, error, self.ttl)
+            conn.execute(
+                f"UPDATE {self.table} SET status = ?, result = ?, error = ?, updated_at = ?, expires_at = ? "
+                "WHERE id = ?",
+                (record["status"], json.dumps(record["result"]), record["error"],
+                 record["updated_at"], record["expires_at"], job_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return record
+
+    def delete(self, job_id: str):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE id = ?", (job_id,))
+
+    def evict_expired(self) -> int:
+        cur = self._conn().execute(
+            f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cur.rowcount
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict >= EVICT_INTERVAL:
+            self._last_evict = now
+            self.evict_expired()
+
+
+FINISHED_STATUSES = ("done", "failed")
+
+
+def _apply_update(record: dict, status, result, error, ttl: float):
+    now = time.time()
+    if status:
+        record["status"] = status
+    if result:
+        record["result"].update(result)
+    if error is not None:
+        record["error"] = error
+    record["updated_at"] = now
+    if record["status"] in FINISHED_STATUSES:
+        record["expires_at"] = now + ttl
+
+
+def _is_expired(record: dict) -> bool:
+    return record["expires_at"] is not None and record["expires_at"] <= time.time()
+
+
+def _copy_record(record: dict) -> dict:
+    return {**record, "result": dict(record["result"])}
+
+
+def _row_to_record(row) -> dict:
+    return {
+        "id": row[0],
+        "status": row[1],
+        "result": json.loads(row[2]),
+        "error": row[3],
+        "created_at": row[4],
+        "updated_at": row[5],
+        "expires_at": row[6]
+    }
+
+
+def create_job_store(kind: str = JOB_STORE, table: str = "jobs", **kwargs):
+    """Return a job store for `kind` ("memory" or "sqlite"). `table` separates record types in SQLite."""
+    if kind == "sqlite":
+        return SQLiteJobStore(table=table, **kwargs)
+    if kind == "memory":
+        return InMemoryJobStore(**kwargs)
+    raise ValueError(f"Unknown job store '{kind}'")
@@ -0,0 +1,30 @@
+import importlib
+from functools import lru_cache
+
+
+class LazyModule:
+    """
+    Stand-in for a heavy module (numpy, Pillow, httpx...) that imports it on first
+    attribute access, so importing the app does not pay for dependencies a request
+    may never need. Use it like the module: `np = lazy_module("numpy")`.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(load_module(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self._name}'>"
+
+
+@lru_cache(maxsize=None)
+def load_module(name: str):
+    """Import `name` once; later calls return the cached module."""
+    return importlib.import_module(name)
+
+
+@lru_cache(maxsize=None)
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
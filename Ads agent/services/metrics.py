@@ -0,0 +1,257 @@
+import os
+import time
+import random
+import inspect
+import threading
+import functools
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Fraction of spans recorded when enabled (1.0 = every span)
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+
+PREFIX = "adgenius_"
+
+# Histogram resolution: values are bucketed by power of two with 2**SUB_BUCKET_BITS
+# linear sub-buckets each (HDR-style, ~12% relative error), in microseconds
+SUB_BUCKET_BITS = 3
+
+# Bucket bounds (seconds) published in the Prometheus exposition
+EXPORT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+EXPORT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Log-linear latency histogram with bounded memory and quantile estimates."""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        micros = max(0, int(seconds * 1_000_000))
+        index = _bucket_index(micros)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return _bucket_upper(index) / 1_000_000
+        return _bucket_upper(max(self.counts)) / 1_000_000
+
+    def cumulative(self, bounds: tuple) -> list:
+        """Counts of observations at or below each bound (seconds)."""
+        ordered = sorted((_bucket_upper(i) / 1_000_000, c) for i, c in self.counts.items())
+        result = []
+        seen = 0
+        position = 0
+        for bound in bounds:
+            while position < len(ordered) and ordered[position][0] <= bound:
+                seen += ordered[position][1]
+                position += 1
+            result.append(seen)
+        return result
+
+
+def _bucket_index(micros: int) -> int:
+    if micros < (1 << SUB_BUCKET_BITS):
+        return micros
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + ((micros >> shift) - (1 << SUB_BUCKET_BITS))
+
+
+def _bucket_upper(index: int) -> int:
+    if index < (1 << SUB_BUCKET_BITS):
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    sub = index & ((1 << SUB_BUCKET_BITS) - 1)
+    return (((1 << SUB_BUCKET_BITS) + sub + 1) << shift) - 1
+
+
+class Registry:
+    """Counters, gauges and histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name: str, amount: float = 1, labels: tuple = ()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def add(self, name: str, delta: float, labels: tuple = ()):
+        key = (name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name: str, seconds: float, labels: tuple = ()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {k: (h.cumulative(EXPORT_BUCKETS), h.count, h.sum,
+                              [h.quantile(q) for q in EXPORT_QUANTILES])
+                          for k, h in self.histograms.items()}
+        for collect in self.collectors:
+            for kind, name, labels, value in collect():
+                (counters if kind == "counter" else gauges)[(name, labels)] = value
+
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({n for n, _ in series}):
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                for (n, labels), value in sorted(series.items()):
+                    if n == name:
+                        lines.append(f"{PREFIX}{name}{_labels(labels)} {value:g}")
+
+        for name in sorted({n for n, _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (n, labels), (buckets, count, total, _) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound, seen in zip(EXPORT_BUCKETS, buckets):
+                    lines.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {seen}")
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+            # Quantile estimates from the full-resolution histogram
+            lines.append(f"# TYPE {PREFIX}{name}_quantile gauge")
+            for (n, labels), (_, _, _, quantiles) in sorted(histograms.items()):
+                if n == name:
+                    for q, value in zip(EXPORT_QUANTILES, quantiles):
+                        lines.append(f"{PREFIX}{name}_quantile{_labels(labels + (('quantile', f'{q:g}'),))} {value:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+registry = Registry()
+
+
+class Span:
+    """
+    Times a block: records `<name>_duration_seconds`, tracks `<name>_in_flight`
+    and counts `<name>_errors_total` when the block raises.
+    """
+
+    __slots__ = ("names", "labels", "start")
+
+    def __init__(self, name: str, labels: tuple):
+        self.names = _span_names(name)
+        self.labels = labels
+
+    def __enter__(self):
+        registry.add(self.names[1], 1, self.labels)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        duration, in_flight, errors = self.names
+        key = (in_flight, self.labels)
+        with registry._lock:
+            histogram = registry.histograms.get((duration, self.labels))
+            if histogram is None:
+                histogram = registry.histograms[(duration, self.labels)] = Histogram()
+            histogram.observe(elapsed)
+            registry.gauges[key] = registry.gauges.get(key, 0) - 1
+            if exc_type is not None:
+                registry.counters[(errors, self.labels)] = registry.counters.get((errors, self.labels), 0) + 1
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _span_names(name: str) -> tuple:
+    return f"{name}_duration_seconds", f"{name}_in_flight", f"{name}_errors_total"
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **labels):
+    """Context manager timing a block. Returns a shared no-op when metrics are off or unsampled."""
+    if not METRICS_ENABLED or (METRICS_SAMPLE_RATE < 1.0 and random.random() >= METRICS_SAMPLE_RATE):
+        return _NOOP
+    return Span(name, tuple(sorted(labels.items())))
+
+
+def timed(name: str, **labels):
+    """Decorator form of span(). Works on plain and async functions."""
+    label_tuple = tuple(sorted(labels.items()))
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not METRICS_ENABLED or (METRICS_SAMPLE_RATE < 1.0 and random.random() >= METRICS_SAMPLE_RATE):
+                    return await fn(*args, **kwargs)
+                with Span(name, label_tuple):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED or (METRICS_SAMPLE_RATE < 1.0 and random.random() >= METRICS_SAMPLE_RATE):
+                return fn(*args, **kwargs)
+            with Span(name, label_tuple):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inc(name: str, amount: float = 1, **labels):
+    if METRICS_ENABLED:
+        registry.inc(name, amount, tuple(sorted(labels.items())))
+
+
+def register_collector(collect):
+    """Add a callable returning [(kind, name, labels, value)] evaluated at scrape time."""
+    registry.collectors.append(collect)
+
+
+def render_prometheus() -> str:
+    return registry.render()
+
+
+def server_timing(timings: dict) -> str:
+    """Server-Timing header value from pipeline timings ({stage: {duration_ms}}, total_ms)."""
+    parts = [f"{stage};dur={t['duration_ms']}" for stage, t in timings.items() if isinstance(t, dict)]
+    if "total_ms" in timings:
+        parts.append(f"total;dur={timings['total_ms']}")
+    return ", ".join(parts)
@@ -0,0 +1,169 @@
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request deadline has passed before a call could start."""
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over a sliding time window.
+    Closed: calls pass and outcomes are recorded. Once at least `min_calls` outcomes in the last
+    `window` seconds have an error rate of `error_rate` or more, the breaker opens and rejects
+    calls for `cooldown` seconds. Then it lets one probe call through (half-open): success
+    closes it, failure opens it again. A probe that ends without a verdict must release() its
+    slot; one never heard from again is written off after `probe_timeout` seconds.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, error_rate: float = 0.5, min_calls: int = 10,
+                 window: float = 30, cooldown: float = 15, probe_timeout: float = 90):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state = self.CLOSED
+        self.trips = 0
+        self._outcomes = deque()  # (monotonic time, failed)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and (not self._probing or now - self._probe_started >= self.probe_timeout):
+                self._probing = True
+                self._probe_started = now
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a probe call through."""
+        if self.state == self.CLOSED:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._close()
+            self._record(False)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            self._record(True)
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and self._failures >= self.error_rate * len(self._outcomes)):
+                self._open()
+
+    def release(self):
+        """An allowed call ended without a verdict on the provider; a half-open breaker may probe again."""
+        with self._lock:
+            self._probing = False
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        self._failures += failed
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._failures -= self._outcomes.popleft()[1]
+
+    def _open(self):
+        self.state = self.OPEN
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        print(f"[Circuit] {self.name} opened for {self.cooldown:g}s")
+
+    def _close(self):
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+        print(f"[Circuit] {self.name} closed")
+
+
+class RetryBudget:
+    """
+    Caps retries (and hedged requests) at a fraction of recent traffic: over the last `window`
+    seconds, at most `min_retries + ratio * requests` retries are spent. When a provider is
+    failing, this keeps retries from multiplying the load on it.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget. Returns False when it is used up."""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+    def _prune(self, now: float):
+        for times in (self._requests, self._retries):
+            while times and now - times[0] > self.window:
+                times.popleft()
+
+
+# Absolute time.monotonic() deadline of the current request, or None.
+# Context variables follow asyncio tasks; threads need contextvars.copy_context().
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Run a block under a deadline `seconds` from now (kept if an outer deadline is sooner)."""
+    current = _deadline.get()
+    at = time.monotonic() + seconds
+    token = _deadline.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float:
+    """Seconds left before the current deadline, or None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
@@ -0,0 +1,47 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional: several times faster than the json module, and emits UTF-8 directly
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(value) -> bytes:
+    """Compact UTF-8 JSON for a response body."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(value) -> str:
+    """dumps_bytes() as text, e.g. for server-sent events and NDJSON lines."""
+    return dumps_bytes(value).decode("utf-8")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider writing compact, unsorted UTF-8 JSON through orjson when installed.
+    Values orjson cannot encode fall back to the default provider, with the same settings.
+    """
+
+    sort_keys = False
+    ensure_ascii = False
+    compact = True
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            return super().dumps(obj)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = dumps_bytes(obj)
+        except TypeError:
+            body = super().dumps(obj).encode("utf-8")
+        return self._app.response_class(body, mimetype=self.mimetype)
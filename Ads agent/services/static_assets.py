@@ -0,0 +1,86 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from services.compression import brotli, negotiate, COMPRESSIBLE_TYPES
+
+# Precompression runs once per file, so it can afford the maximum levels
+ASSET_GZIP_LEVEL = 9
+ASSET_BROTLI_QUALITY = 11
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class Asset:
+    """One file held in memory: identity bytes, precompressed variants and a content fingerprint."""
+
+    def __init__(self, name: str, data: bytes, mimetype: str):
+        self.name = name
+        self.mimetype = mimetype
+        self.fingerprint = hashlib.blake2b(data, digest_size=8).hexdigest()
+        self.variants = {None: data}
+        if mimetype.startswith(COMPRESSIBLE_TYPES):
+            self.variants["gzip"] = gzip.compress(data, compresslevel=ASSET_GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(data, quality=ASSET_BROTLI_QUALITY)
+            # Drop encodings that do not pay for themselves on tiny files
+            for coding in [c for c in self.variants if c and len(self.variants[c]) >= len(data)]:
+                del self.variants[coding]
+
+    @property
+    def url_name(self) -> str:
+        """`css/style.css` -> `css/style.<fingerprint>.css`"""
+        stem, ext = os.path.splitext(self.name)
+        return f"{stem}.{self.fingerprint}{ext}"
+
+    def select(self, accept_encoding: str) -> tuple:
+        """(body, coding, etag) of the best variant the client accepts."""
+        coding = negotiate(accept_encoding)
+        if coding not in self.variants:
+            coding = None
+        etag = self.fingerprint if coding is None else f"{self.fingerprint}-{coding}"
+        return self.variants[coding], coding, etag
+
+
+class AssetStore:
+    """
+    Fingerprinted, precompressed copies of the files under a static directory.
+    Files are read and compressed once, on first use, so requests only pick a variant;
+    URLs carry the content hash, so they can be cached forever and change with every deploy.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._assets = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    assets = {}
+                    for folder, _, files in os.walk(self.root):
+                        for filename in files:
+                            path = os.path.join(folder, filename)
+                            name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                            with open(path, "rb") as f:
+                                data = f.read()
+                            mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                            assets[name] = Asset(name, data, mimetype)
+                    self._assets = assets
+        return self._assets
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL of a static file, or its plain /static/ URL when it is unknown."""
+        asset = self._load().get(name)
+        return f"/assets/{asset.url_name}" if asset else f"/static/{name}"
+
+    def resolve(self, url_name: str) -> tuple:
+        """(asset, current) for `css/style.<fingerprint>.css`; current is False for a stale fingerprint."""
+        stem, ext = os.path.splitext(url_name)
+        stem, _, fingerprint = stem.rpartition(".")
+        asset = self._load().get(f"{stem}{ext}")
+        return asset, bool(asset) and asset.fingerprint == fingerprint
+
+    def names(self) -> list:
+        return sorted(self._load())
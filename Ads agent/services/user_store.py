@@ -0,0 +1,169 @@
+import os
+import json
+import base64
+import sqlite3
+import threading
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_DB_PATH = os.getenv("USER_DB_PATH", os.path.join(APP_DIR, "users.sqlite3"))
+
+USER_FIELDS = ("email", "name", "picture", "provider", "sub", "last_login")
+
+
+class UserStore:
+    """
+    Signed-in users in SQLite (WAL mode, so every gunicorn worker on the host shares
+    one database). Each thread keeps its own pooled connection. Listing is ordered by
+    last_login, newest first, and paginated with an opaque keyset cursor.
+    save() group-commits: logins arriving while a write is in progress share the next transaction.
+    """
+
+    def __init__(self, path: str = USER_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._pending = {}  # email -> latest record, waiting for the next write
+        self._batch = _Batch()
+        self._pending_cond = threading.Condition()
+        self._writer_pid = None
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "email TEXT PRIMARY KEY, name TEXT, picture TEXT, provider TEXT, sub TEXT, "
+            "last_login TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_last_login ON users(last_login, email)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection opened before a fork (gunicorn --preload) must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def upsert_users(self, users: list) -> int:
+        """Insert or update many users in one transaction."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO users (email, name, picture, provider, sub, last_login) "
+                "VALUES (:email, :name, :picture, :provider, :sub, :last_login) "
+                "ON CONFLICT(email) DO UPDATE SET name = excluded.name, picture = excluded.picture, "
+                "provider = excluded.provider, sub = excluded.sub, last_login = excluded.last_login",
+                [{f: user.get(f, "") for f in USER_FIELDS} for user in users]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(users)
+
+    def save(self, user: dict):
+        """Upsert one user, batched with concurrent saves. Returns once it is committed."""
+        with self._pending_cond:
+            self._pending[user.get("email", "")] = user
+            batch = self._batch
+            # The writer thread does not survive a fork (gunicorn --preload)
+            if self._writer_pid != os.getpid():
+                self._writer_pid = os.getpid()
+                threading.Thread(target=self._write_pending, name="user-writer", daemon=True).start()
+            self._pending_cond.notify()
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+
+    def _write_pending(self):
+        while True:
+            with self._pending_cond:
+                while not self._pending:
+                    self._pending_cond.wait()
+                users, batch = list(self._pending.values()), self._batch
+                self._pending, self._batch = {}, _Batch()
+            try:
+                self.upsert_users(users)
+            except Exception as e:
+                print(f"User store write error: {e}")
+                batch.error = e
+            batch.done.set()
+
+    def get(self, email: str) -> dict:
+        row = self._conn().execute(
+            "SELECT email, name, picture, provider, sub, last_login FROM users WHERE email = ?", (email,)
+        ).fetchone()
+        return _row_to_user(row) if row else None
+
+    def list_users(self, limit: int = 50, cursor: str = None) -> tuple:
+        """
+        One page of users, most recent login first. Returns (users, next_cursor);
+        next_cursor is None on the last page. Cost depends on the page size, not the table size.
+        """
+        if cursor:
+            last_login, email = _decode_cursor(cursor)
+            rows = self._conn().execute(
+                "SELECT email, name, picture, provider, sub, last_login FROM users "
+                "WHERE (last_login, email) < (?, ?) ORDER BY last_login DESC, email DESC LIMIT ?",
+                (last_login, email, limit + 1)
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                "SELECT email, name, picture, provider, sub, last_login FROM users "
+                "ORDER BY last_login DESC, email DESC LIMIT ?", (limit + 1,)
+            ).fetchall()
+
+        users = [_row_to_user(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor(users[-1]["last_login"], users[-1]["email"])
+        return users, next_cursor
+
+
+class _Batch:
+    """Saves sharing one transaction: set once it is committed, or failed with `error`."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def _encode_cursor(last_login: str, email: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([last_login, email]).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        last_login, email = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(last_login), str(email)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+
+def _row_to_user(row) -> dict:
+    return {
+        "name": row["name"],
+        "email": row["email"],
+        "picture": row["picture"],
+        "provider": row["provider"],
+        "sub": row["sub"],
+        "last_login": row["last_login"]
+    }
+
+
+_user_store = None
+_user_store_lock = threading.Lock()
+
+
+def get_user_store() -> UserStore:
+    """Process-wide user store, opened on first use."""
+    global _user_store
+    with _user_store_lock:
+        if _user_store is None:
+            _user_store = UserStore()
+        return _user_store
@@ -0,0 +1,56 @@
+import os
+import time
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Sink:
+    """Write-only file for zipfile: no tell() or seek(), so every member gets a data descriptor."""
+
+    def __init__(self):
+        self._chunks = []
+        self.buffered = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.buffered += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.buffered = 0
+        return data
+
+
+def stream_zip(entries, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield a ZIP archive of `entries` while it is being written, in chunks of about chunk_size bytes.
+    Each entry is (arcname, source, compress): source is bytes, or the path of a file that is
+    copied chunk_size bytes at a time, so memory use does not grow with the archive.
+    CRCs and sizes follow each member in a data descriptor, so the output is never seeked.
+    """
+    sink = _Sink()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(sink, "w") as archive:
+        for arcname, source, compress in entries:
+            info = zipfile.ZipInfo(arcname, date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            info.file_size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+            with archive.open(info, "w") as member:
+                if isinstance(source, bytes):
+                    member.write(source)
+                else:
+                    with open(source, "rb") as f:
+                        for chunk in iter(lambda: f.read(chunk_size), b""):
+                            member.write(chunk)
+                            if sink.buffered >= chunk_size:
+                                yield sink.drain()
+            if sink.buffered >= chunk_size:
+                yield sink.drain()
+    # Central directory
+    yield sink.drain()
@@ -6,9 +6,13 @@
 let currentBrief = null;
 let currentResult = null;
 let selectedTone = "professional";
+// Static platform specs and tone hints from /api/platforms; results reference them by key
+let catalog = null;
+let catalogRequest = null;
 
 // ── Init ──
 document.addEventListener("DOMContentLoaded", () => {
+    loadCatalog().catch(err => console.error("Catalogue error:", err));
     initToneButtons();
     initForm();
     initScrollReveal();
@@ -68,23 +72,21 @@ async function runGeneration() {
     btnText.style.display = "none";
     btnLoader.style.display = "inline-flex";
 
-    // Animate pipeline
-    await animatePipeline();
+    // Mark all agents as working; each one completes as its result streams in
+    startPipeline();
 
     try {
-        const response = await fetch("/api/generate", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(currentBrief)
-        });
-
-        if (!response.ok) {
-            const err = await response.json();
-            throw new Error(err.error || "Generation failed");
+        await loadCatalog();
+        currentResult = window.EventSource
+            ? await streamGeneration(currentBrief)
+            : await fetchGeneration(currentBrief);
+        // The server moved to a newer catalogue mid-session: fetch it and re-render
+        if (currentResult.catalog_version && currentResult.catalog_version !== catalog.version) {
+            await loadCatalog(currentResult.catalog_version);
+            renderVariations(currentResult.variations);
+            renderPlatforms(currentResult.platforms);
         }
-
-        currentResult = await response.json();
-        renderResults(currentResult);
+        finishResults();
 
     } catch (err) {
         console.error("Generation error:", err);
@@ -97,17 +99,119 @@ async function runGeneration() {
     }
 }
 
-// ── Pipeline Animation ──
-async function animatePipeline() {
-    const agents = ["creative", "design", "variation", "platform"];
-    resetPipeline();
+// ── Platform Catalogue ──
+function loadCatalog(version) {
+    if (catalog && (!version || catalog.version === version)) return Promise.resolve(catalog);
+    if (!catalogRequest) {
+        // A versioned URL is immutable, so the browser cache serves it from then on
+        const url = version ? `/api/platforms?v=${encodeURIComponent(version)}` : "/api/platforms";
+        catalogRequest = fetch(url)
+            .then(r => {
+                if (!r.ok) throw new Error(`Catalogue request failed (${r.status})`);
+                return r.json();
+            })
+            .then(data => { catalog = data; return data; })
+            .finally(() => { catalogRequest = null; });
+    }
+    return catalogRequest;
+}
+
+function toneHint(variation) {
+    return variation.performance_hint || (catalog && catalog.tones[variation.tone]) || {};
+}
+
+// A platform result merged with its catalogue spec (results may also arrive already expanded)
+function platformView(key, entry) {
+    const spec = (catalog && catalog.platforms[key]) || {};
+    const formats = (entry.formats || spec.formats || []).map((f, i) =>
+        entry.format_urls ? { ...f, url: entry.format_urls[i] } : f
+    );
+    return { ...spec, ...entry, formats, primary_format: entry.primary_format || formats[0] || {} };
+}
+
+// ── Streaming Generation ──
+const STAGE_AGENTS = { copy: "creative", images: "design", variations: "variation", platforms: "platform" };
+
+function streamGeneration(brief) {
+    const params = new URLSearchParams({
+        product_name: brief.product_name,
+        description: brief.description,
+        audience: brief.audience,
+        tone: brief.tone,
+        platforms: brief.platforms.join(",")
+    });
+
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/generate/stream?${params}`);
+        const result = { brief };
+
+        source.addEventListener("start", (e) => {
+            Object.assign(result, JSON.parse(e.data));
+        });
+
+        // Images arrive one by one while the design agent works; the `images` event has them all
+        const streamedImages = [];
+        source.addEventListener("image", (e) => {
+            streamedImages.push(JSON.parse(e.data));
+            streamedImages.sort((a, b) => a.index - b.index);
+            renderImages(streamedImages, result.brief);
+            setVisible("results", true);
+        });
+
+        Object.keys(STAGE_AGENTS).forEach(stage => {
+            source.addEventListener(stage, (e) => {
+                result[stage] = JSON.parse(e.data);
+                renderStage(stage, result[stage], result);
+            });
+        });
+
+        source.addEventListener("done", (e) => {
+            source.close();
+            Object.assign(result, JSON.parse(e.data));
+            resolve(result);
+        });
+
+        source.addEventListener("error", (e) => {
+            source.close();
+            // Server-sent error events carry a payload; connection errors do not
+            const err = e.data ? JSON.parse(e.data).error : "Connection lost";
+            reject(new Error(err || "Generation failed"));
+        });
+    });
+}
+
+async function fetchGeneration(brief) {
+    const response = await fetch("/api/generate", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(brief)
+    });
+
+    if (!response.ok) {
+        const err = await response.json();
+        throw new Error(err.error || "Generation failed");
+    }
 
-    for (const agentKey of agents) {
+    const data = await response.json();
+    Object.keys(STAGE_AGENTS).forEach(stage => renderStage(stage, data[stage], data));
+    return data;
+}
+
+// ── Pipeline Progress ──
+function startPipeline() {
+    resetPipeline();
+    Object.values(STAGE_AGENTS).forEach(agentKey => {
         const el = document.getElementById(`agent-${agentKey}`);
         el.classList.add("active");
         el.querySelector(".agent-status-icon").textContent = "⚙️";
-        await sleep(700);
-    }
+    });
+}
+
+function completeAgent(agentKey) {
+    const el = document.getElementById(`agent-${agentKey}`);
+    el.classList.remove("active");
+    el.classList.add("done");
+    el.querySelector(".agent-status-icon").textContent = "✅";
 }
 
 function resetPipeline() {
@@ -118,34 +222,46 @@ function resetPipeline() {
     });
 }
 
-function completePipeline() {
-    ["creative", "design", "variation", "platform"].forEach(key => {
-        const el = document.getElementById(`agent-${key}`);
-        el.classList.remove("active");
-        el.classList.add("done");
-        el.querySelector(".agent-status-icon").textContent = "✅";
-    });
-}
-
 // ── Render Results ──
-function renderResults(data) {
-    completePipeline();
+function renderStage(stage, value, data) {
+    completeAgent(STAGE_AGENTS[stage]);
+
+    if (stage === "copy") {
+        document.getElementById("copyHeadline").textContent = value.headline;
+        document.getElementById("copyBody").textContent = value.body;
+        document.getElementById("copyCta").textContent = value.cta;
+
+        // First content: reveal results and bring them into view
+        setVisible("results", true);
+        setTimeout(() => {
+            document.getElementById("results").scrollIntoView({ behavior: "smooth", block: "start" });
+        }, 300);
+    } else if (stage === "images") {
+        renderImages(value, data.brief);
+    } else if (stage === "variations") {
+        renderVariations(value);
+    } else if (stage === "platforms") {
+        renderPlatforms(value);
+        setVisible("platforms", true);
+    }
+}
 
-    // Copy
-    document.getElementById("copyHeadline").textContent = data.copy.headline;
-    document.getElementById("copyBody").textContent = data.copy.body;
-    document.getElementById("copyCta").textContent = data.copy.cta;
+function finishResults() {
+    setVisible("results", true);
+    setVisible("platforms", true);
+    setVisible("chat", true);
+}
 
-    // Images
+function renderImages(images, brief) {
     const imageGrid = document.getElementById("imageGrid");
     imageGrid.innerHTML = "";
-    const productName = data.brief?.product_name || "ad-visual";
-    data.images.forEach((img, i) => {
+    const productName = brief?.product_name || "ad-visual";
+    images.forEach((img, i) => {
         const card = document.createElement("div");
         card.className = "image-card";
         const filename = `${productName.replace(/\s+/g, "-").toLowerCase()}-${i + 1}.jpg`;
         card.innerHTML = `
-      <img src="${img.url}" alt="Ad visual ${i + 1}" loading="lazy" />
+      <img src="${img.local_url || img.url}" alt="Ad visual ${i + 1}" loading="lazy" />
       <div class="image-overlay">
         <button class="download-btn" onclick="downloadImage('${img.url}', '${filename}')" title="Download image">
           ⬇ Download
@@ -154,22 +270,6 @@ function renderResults(data) {
     `;
         imageGrid.appendChild(card);
     });
-
-    // Variations
-    renderVariations(data.variations);
-
-    // Platforms
-    renderPlatforms(data.platforms);
-
-    // Show sections
-    setVisible("results", true);
-    setVisible("platforms", true);
-    setVisible("chat", true);
-
-    // Scroll to results
-    setTimeout(() => {
-        document.getElementById("results").scrollIntoView({ behavior: "smooth", block: "start" });
-    }, 300);
 }
 
 // ── Variations ──
@@ -180,10 +280,12 @@ function renderVariations(variations) {
     contentEl.innerHTML = "";
 
     variations.forEach((v, i) => {
+        const hint = toneHint(v);
+
         // Tab
         const tab = document.createElement("button");
         tab.className = `var-tab${i === 0 ? " active" : ""}`;
-        tab.textContent = `${v.performance_hint.icon} ${capitalize(v.tone)}${v.is_primary ? " ★" : ""}`;
+        tab.textContent = `${hint.icon || ""} ${capitalize(v.tone)}${v.is_primary ? " ★" : ""}`;
         tab.onclick = () => switchVariation(i);
         tabsEl.appendChild(tab);
 
@@ -208,9 +310,9 @@ function renderVariations(variations) {
       </div>
       <div class="var-perf">
         <div class="perf-title">📊 Performance Insights</div>
-        <div class="perf-row"><span class="perf-key">Best For</span><span class="perf-val">${v.performance_hint.best_for}</span></div>
-        <div class="perf-row"><span class="perf-key">Avg. CTR</span><span class="perf-val">${v.performance_hint.avg_ctr}</span></div>
-        <div class="perf-row"><span class="perf-key">Conversion</span><span class="perf-val">${v.performance_hint.conversion}</span></div>
+        <div class="perf-row"><span class="perf-key">Best For</span><span class="perf-val">${hint.best_for}</span></div>
+        <div class="perf-row"><span class="perf-key">Avg. CTR</span><span class="perf-val">${hint.avg_ctr}</span></div>
+        <div class="perf-row"><span class="perf-key">Conversion</span><span class="perf-val">${hint.conversion}</span></div>
       </div>
     `;
         contentEl.appendChild(card);
@@ -231,7 +333,7 @@ function renderPlatforms(platforms) {
 
     const keys = Object.keys(platforms);
     keys.forEach((key, i) => {
-        const p = platforms[key];
+        const p = platformView(key, platforms[key]);
 
         // Tab
         const tab = document.createElement("button");
@@ -247,7 +349,7 @@ function renderPlatforms(platforms) {
             `<span class="format-chip">${f.name} (${f.ratio})</span>`
         ).join("");
 
-        const imgSrc = p.primary_image || "https://images.unsplash.com/photo-1557804506-669a67965ba0?w=600&q=80";
+        const imgSrc = p.primary_format.url || p.primary_image || "https://images.unsplash.com/photo-1557804506-669a67965ba0?w=600&q=80";
 
         preview.innerHTML = `
       <div class="plat-info glass-card">
@@ -313,10 +415,12 @@ async function sendRefinement() {
     const typingId = addTypingIndicator();
 
     try {
+        // With a server-side session only the message is sent; otherwise the whole brief and copy
+        const sessionId = currentResult?.session_id;
         const response = await fetch("/api/refine", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
+            body: JSON.stringify(sessionId ? { session_id: sessionId, message } : {
                 message,
                 brief: currentBrief,
                 current_copy: currentResult?.copy || {}
@@ -332,16 +436,27 @@ async function sendRefinement() {
             document.getElementById("copyBody").textContent = data.copy.body;
             document.getElementById("copyCta").textContent = data.copy.cta;
 
-            // Update variations
-            if (data.variations) renderVariations(data.variations);
-
             // Update stored result
             if (currentResult) {
                 currentResult.copy = data.copy;
-                currentResult.variations = data.variations;
+                currentResult.variations = data.variation_order
+                    ? mergeVariations(currentResult.variations || [], data.variations, data.variation_order)
+                    : data.variations;
+                if (data.platform_copy && currentResult.platforms) {
+                    Object.entries(data.platform_copy).forEach(([key, adapted]) => {
+                        if (currentResult.platforms[key]) currentResult.platforms[key].adapted_copy = adapted;
+                    });
+                    renderPlatforms(currentResult.platforms);
+                }
             }
 
+            // Update variations
+            const variations = currentResult ? currentResult.variations : data.variations;
+            if (variations) renderVariations(variations);
+
             addChatMessage(data.message, "agent");
+        } else if (data.error) {
+            addChatMessage(data.error, "agent");
         }
     } catch (err) {
         removeTypingIndicator(typingId);
@@ -349,6 +464,14 @@ async function sendRefinement() {
     }
 }
 
+// Apply the changed variants from a session refinement and reorder by `order` (tones)
+function mergeVariations(current, changed, order) {
+    const byTone = {};
+    current.forEach(v => { byTone[v.tone] = v; });
+    changed.forEach(v => { byTone[v.tone] = v; });
+    return order.map(tone => byTone[tone]).filter(Boolean);
+}
+
 function addChatMessage(text, role) {
     const msgs = document.getElementById("chatMessages");
     const div = document.createElement("div");
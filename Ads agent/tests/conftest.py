@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# Tests run offline against demo output, with throwaway SQLite files
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+_TMP = tempfile.mkdtemp(prefix="ads-agent-tests-")
+os.environ.setdefault("DEMO_MODE", "true")
+os.environ.setdefault("IMAGE_DOWNLOAD", "false")
+os.environ.setdefault("USER_DB_PATH", os.path.join(_TMP, "users.sqlite3"))
+os.environ.setdefault("BLOB_STORE_DIR", os.path.join(_TMP, "blobs"))
+os.environ.setdefault("DERIVATIVES_DIR", os.path.join(_TMP, "derivatives"))
+# Every test client shares one address; the limiter tests build their own RateLimiter
+os.environ.setdefault("RATE_LIMIT_USER_PER_MIN", "0")
+os.environ.setdefault("RATE_LIMIT_IP_PER_MIN", "0")
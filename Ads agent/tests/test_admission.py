@@ -0,0 +1,83 @@
+import time
+import threading
+import pytest
+from services.admission import (AdmissionQueue, AdmissionRejected, MemoryBuckets, RateLimiter, SQLiteBuckets,
+                                BATCH, GENERATE, INTERACTIVE)
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _queue_in_thread(queue: AdmissionQueue, priority: int, outcomes: list) -> threading.Thread:
+    """acquire() on a thread, recording the priority or the rejection reason, then release."""
+    def run():
+        try:
+            with queue.acquire(priority):
+                outcomes.append(priority)
+        except AdmissionRejected as e:
+            outcomes.append(e.reason)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_waiters_are_admitted_most_urgent_first():
+    queue = AdmissionQueue(max_active=1, max_waiting=3, timeout=5)
+    slot = queue.acquire()
+    outcomes = []
+    threads = []
+    for count, priority in enumerate((BATCH, GENERATE, INTERACTIVE), 1):
+        threads.append(_queue_in_thread(queue, priority, outcomes))
+        _wait_for(lambda: queue.waiting == count)
+    slot.release()
+    for thread in threads:
+        thread.join()
+    assert outcomes == [INTERACTIVE, GENERATE, BATCH]
+    assert (queue.active, queue.waiting) == (0, 0)
+
+
+def test_full_queue_preempts_a_less_urgent_waiter():
+    queue = AdmissionQueue(max_active=1, max_waiting=1, timeout=5)
+    slot = queue.acquire()
+    outcomes = []
+    batch = _queue_in_thread(queue, BATCH, outcomes)
+    _wait_for(lambda: queue.waiting == 1)
+    interactive = _queue_in_thread(queue, INTERACTIVE, outcomes)
+    batch.join()
+    assert outcomes == ["preempted"]
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        queue.acquire(INTERACTIVE)
+    assert excinfo.value.reason == "queue_full"
+    slot.release()
+    interactive.join()
+    assert outcomes == ["preempted", INTERACTIVE]
+    assert (queue.active, queue.waiting) == (0, 0)
+
+
+def test_waiter_times_out():
+    queue = AdmissionQueue(max_active=1, max_waiting=1, timeout=0.05)
+    with queue.acquire():
+        with pytest.raises(AdmissionRejected) as excinfo:
+            queue.acquire()
+    assert excinfo.value.reason == "queue_timeout"
+    assert (queue.active, queue.waiting) == (0, 0)
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_ip_rejection_does_not_charge_the_user(backend, tmp_path):
+    buckets = MemoryBuckets() if backend == "memory" else SQLiteBuckets(str(tmp_path / "admission.sqlite3"))
+    # Slow refill, so no token comes back during the test
+    limiter = RateLimiter(buckets, user_limit=(0.6, 2), ip_limit=(0.6, 1))
+    limiter.check("alice", "10.0.0.1")
+    for _ in range(3):
+        with pytest.raises(AdmissionRejected):
+            limiter.check("alice", "10.0.0.1")
+    # alice still has her second token, from another address
+    limiter.check("alice", "10.0.0.2")
+    with pytest.raises(AdmissionRejected):
+        limiter.check("alice", "10.0.0.3")
@@ -0,0 +1,108 @@
+import io
+import json
+import zipfile
+import pytest
+from app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"briefs": [], "concurrency": "abc"}, "concurrency must be an integer"),
+    ({"briefs": [], "concurrency": []}, "concurrency must be an integer"),
+    ({"briefs": [], "concurrency": True}, "concurrency must be an integer"),
+    ({"briefs": [{"product_name": "Zap"}, "Zap"]}, "briefs[1] must be a JSON object"),
+    ({"briefs": "Zap"}, "Provide a JSON body with 'briefs' or a CSV upload"),
+    ([{"product_name": "Zap"}], "Provide a JSON body with 'briefs' or a CSV upload"),
+])
+def test_malformed_batch_requests_are_rejected(client, body, error):
+    response = client.post("/api/generate/batch", json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+
+
+def test_bad_concurrency_query_is_rejected(client):
+    response = client.post("/api/generate/batch?concurrency=abc", data="product_name\nZap\n", mimetype="text/csv")
+    assert response.status_code == 400
+
+
+def test_non_object_and_non_text_briefs_are_rejected(client):
+    assert client.post("/api/generate", json=["Zap"]).status_code == 400
+    response = client.post("/api/generate", json={"product_name": 7, "description": "Shoes", "audience": "Runners"})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Fields must be strings: product_name"}
+
+
+def test_batch_with_numeric_concurrency_streams(client):
+    brief = {"product_name": "Zap", "description": "Running shoes", "audience": "Runners"}
+    response = client.post("/api/generate/batch", json={"briefs": [brief, brief], "concurrency": "2"})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count("\n") == 3
+
+
+def test_export_streams_a_valid_archive(client):
+    result = client.post("/api/generate", json={"product_name": "EcoBottle Pro", "description": "Insulated bottle",
+                                                 "audience": "Hikers", "platforms": ["instagram"]}).get_json()
+    result["images"] = []
+    response = client.post("/api/export.zip?derivatives=false", json=result, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(b"".join(response.response))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["campaign.json", "copy.csv", "platforms.csv", "manifest.json"]
+        assert json.loads(archive.read("manifest.json"))["skipped"] == []
+
+
+def _batch_lines(client, briefs: list) -> list:
+    response = client.post("/api/generate/batch", json={"briefs": briefs})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+BATCH_BRIEF = {"product_name": "EcoBottle Pro", "description": "Insulated bottle", "audience": "Hikers",
+               "platforms": ["instagram"]}
+
+
+def test_batch_keeps_briefs_with_different_options_apart(client):
+    briefs = [BATCH_BRIEF, {**BATCH_BRIEF, "num_images": 1}, {**BATCH_BRIEF, "expand": True},
+              {**BATCH_BRIEF, "num_images": 1}]
+    lines = _batch_lines(client, briefs)
+    assert lines[-1]["unique"] == 3
+    results = {line["index"]: line for line in lines[:-1]}
+    assert len(results[1]["images"]) == 1
+    assert "duplicate_of" not in results[2]
+    assert results[3]["duplicate_of"] == 1
+
+
+def test_batch_entries_with_different_seeds_get_their_own_variants(client):
+    lines = _batch_lines(client, [{**BATCH_BRIEF, "seed": "1"}, {**BATCH_BRIEF, "seed": "2"}])
+    assert lines[-1]["unique"] == 2
+    for line in lines[:-1]:
+        assert "duplicate_of" not in line
+        single = client.post("/api/generate", json={**BATCH_BRIEF, "seed": str(line["index"] + 1)}).get_json()
+        assert line["variations"] == single["variations"]
+        assert line["copy"] == single["copy"]
+
+
+EXPORT_COPY = {"headline": "Cold for 24 hours", "body": "Insulated steel", "cta": "Shop Now"}
+
+
+@pytest.mark.parametrize("body", [
+    {"copy": "Cold for 24 hours"},
+    {"copy": EXPORT_COPY, "platforms": ["instagram"]},
+    {"copy": EXPORT_COPY, "platforms": {"instagram": "Cold"}},
+    {"copy": EXPORT_COPY, "platforms": {"instagram": {"adapted_copy": "Cold"}}},
+    {"images": ["https://images.unsplash.com/photo.jpg"]},
+    {"images": [{"index": 1}]},
+    {"images": [{"url": "https://images.unsplash.com/photo.jpg", "tone": 3}]},
+    {"copy": EXPORT_COPY, "variations": ["Cold"]},
+    {"copy": EXPORT_COPY, "brief": "EcoBottle"},
+    {"copy": EXPORT_COPY, "brief": {"platforms": [{"key": "instagram"}]}},
+])
+def test_malformed_export_bodies_are_rejected_before_streaming(client, body):
+    response = client.post("/api/export.zip", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
@@ -0,0 +1,58 @@
+import json
+import time
+import asyncio
+import asgi
+from asgi import ThreadedWsgiToAsgi
+
+SLOW_SECONDS = 1.0
+
+
+def _with_slow_route(environ, start_response):
+    """The Flask app plus a /slow route that holds its thread, like a long batch stream."""
+    if environ["PATH_INFO"] == "/slow":
+        time.sleep(SLOW_SECONDS)
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"slow"]
+    return asgi.flask_app(environ, start_response)
+
+
+async def _request(method: str, path: str, body: dict = None) -> tuple:
+    """(status, seconds) of one request through the ASGI app."""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"", "http_version": "1.1",
+             "root_path": "", "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+             "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]}
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    start = time.perf_counter()
+    await asgi.app(scope, receive, send)
+    return status, time.perf_counter() - start
+
+
+def test_flask_routes_are_served_in_parallel_with_native_routes(monkeypatch):
+    monkeypatch.setattr(asgi, "wsgi_app", ThreadedWsgiToAsgi(_with_slow_route))
+    brief = {"product_name": "Zap", "description": "Running shoes", "audience": "Runners"}
+
+    async def main():
+        slow = asyncio.ensure_future(_request("GET", "/slow"))
+        await asyncio.sleep(0.05)
+        fast = await asyncio.gather(*[_request("GET", "/api/health") for _ in range(8)],
+                                    _request("POST", "/api/generate", brief))
+        return await slow, fast
+
+    (slow_status, slow_seconds), fast = asyncio.run(main())
+    assert slow_status == 200 and slow_seconds >= SLOW_SECONDS
+    assert all(status == 200 for status, _ in fast)
+    # Nothing queued behind the slow WSGI request
+    assert max(seconds for _, seconds in fast) < SLOW_SECONDS / 2
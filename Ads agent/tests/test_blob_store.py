@@ -0,0 +1,94 @@
+import os
+import time
+import pytest
+import requests
+from services.blob_store import BlobStore, BlobTooLargeError
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.headers = {"Content-Type": "image/png"}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+
+class _FakeOrigin:
+    """Stands in for requests.get: serves `bodies` by URL and records every fetch."""
+
+    def __init__(self):
+        self.bodies = {}
+        self.fetched = []
+
+    def get(self, url, timeout=None, stream=False):
+        self.fetched.append(url)
+        return _FakeResponse(self.bodies[url])
+
+
+@pytest.fixture
+def origin(monkeypatch):
+    origin = _FakeOrigin()
+    monkeypatch.setattr(requests, "get", origin.get)
+    return origin
+
+
+def _index_files(store: BlobStore) -> list:
+    return os.listdir(os.path.join(store.root, "url"))
+
+
+def test_fetch_stores_once_and_dedupes_content(tmp_path, origin):
+    store = BlobStore(str(tmp_path))
+    origin.bodies["https://a/1"] = origin.bodies["https://a/2"] = b"x" * 100
+    first = store.fetch("https://a/1")
+    assert store.fetch("https://a/1")["path"] == first["path"]
+    assert store.fetch("https://a/2")["path"] == first["path"]
+    assert origin.fetched == ["https://a/1", "https://a/2"]
+    with open(first["path"], "rb") as f:
+        assert f.read() == b"x" * 100
+    assert first["content_type"] == "image/png" and first["size"] == 100
+
+
+def test_objects_over_the_size_cap_are_rejected(tmp_path, origin):
+    store = BlobStore(str(tmp_path), max_object_bytes=50)
+    origin.bodies["https://a/big"] = b"x" * 51
+    with pytest.raises(BlobTooLargeError):
+        store.fetch("https://a/big")
+    assert store.get("https://a/big") is None
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("tmp-")]
+    assert _index_files(store) == []
+
+
+def test_eviction_removes_least_recently_used_blobs_and_their_index_entries(tmp_path, origin):
+    store = BlobStore(str(tmp_path), max_bytes=250)
+    now = time.time()
+    for i, age in ((1, 100), (2, 50)):
+        origin.bodies[f"https://a/{i}"] = bytes([i]) * 100
+        path = store.fetch(f"https://a/{i}")["path"]
+        os.utime(path, (now - age, now - age))
+    origin.bodies["https://a/3"] = b"\x03" * 100
+    store.fetch("https://a/3")  # 300 bytes > 250: evicts down to 225
+
+    assert store.get("https://a/1") is None
+    assert store.get("https://a/2") is not None and store.get("https://a/3") is not None
+    assert len(_index_files(store)) == 2
+    assert store._total == 200
+
+
+def test_missing_content_is_a_miss_that_drops_the_entry(tmp_path, origin):
+    store = BlobStore(str(tmp_path))
+    origin.bodies["https://a/1"] = b"x" * 10
+    os.remove(store.fetch("https://a/1")["path"])
+    assert store.get("https://a/1") is None
+    assert _index_files(store) == []
+    assert store.fetch("https://a/1")["size"] == 10
@@ -0,0 +1,32 @@
+import time
+import sqlite3
+from services.cache import EVICT_INTERVAL, ResponseCache, make_key
+
+
+def test_key_ignores_whitespace_and_private_fields():
+    brief = {"product_name": "EcoBottle Pro", "description": "Insulated  steel\nbottle", "tone": "playful"}
+    assert make_key(brief) == make_key({**brief, "description": " Insulated steel bottle ", "_no_cache": True})
+
+
+def test_key_folds_case_only_in_case_insensitive_fields():
+    brief = {"product_name": "iPhone case", "tone": "playful", "platforms": ["instagram", "twitter"]}
+    assert make_key(brief) == make_key({**brief, "tone": "Playful", "platforms": ["Instagram", "TWITTER"]})
+    assert make_key(brief) != make_key({**brief, "product_name": "IPHONE CASE"})
+    assert make_key("gpt-4", "Write copy for iPhone") != make_key("gpt-4", "Write copy for IPHONE")
+
+
+def test_expired_rows_are_swept_from_the_disk_tier(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache("test", disk_path=path)
+    monkeypatch.setattr(cache, "_last_evict", time.monotonic())
+    cache.set("stale", {"copy": 1}, ttl=-1)
+    cache.set("fresh", {"copy": 2})
+    assert cache.evict_expired() == 1
+
+    # set() sweeps by itself once EVICT_INTERVAL has passed
+    cache.set("stale", {"copy": 1}, ttl=-1)
+    cache._last_evict -= EVICT_INTERVAL
+    cache.set("other", {"copy": 3})
+    with sqlite3.connect(path) as conn:
+        assert sorted(key for (key,) in conn.execute("SELECT key FROM cache")) == ["fresh", "other"]
+    assert ResponseCache("test", disk_path=path).get("fresh") == {"copy": 2}
@@ -0,0 +1,12 @@
+from benchmarks.bench_cold_start import BUDGETS, _run_once
+
+# Budgets are medians on a quiet machine; one run on a busy CI box gets plenty of slack
+MARGIN = 3
+
+
+def test_fresh_worker_defers_heavy_imports_and_stays_within_budget():
+    result = _run_once()
+    # numpy, Pillow and httpx load on first use, not at startup or on the first demo requests
+    assert result["loaded"] == []
+    for phase, budget in BUDGETS.items():
+        assert result[phase] <= budget * MARGIN, f"{phase} took {result[phase]:.0f}ms (budget {budget}ms)"
@@ -0,0 +1,26 @@
+from agents import creative_agent
+from agents.creative_agent import _generate_options_openai, _demo_options
+
+BRIEF = {"product_name": "Zap", "description": "Running shoes", "audience": "Runners", "_no_cache": True}
+
+
+def _completion(monkeypatch, options):
+    monkeypatch.setattr(creative_agent, "call_openai", lambda provider, agent, request, **kw: {"options": options})
+
+
+def test_valid_options_are_kept(monkeypatch):
+    _completion(monkeypatch, {"playful": {"headline": [" Run fast "], "body": ["Shoes that fly."], "cta": ["Go"]}})
+    assert _generate_options_openai(BRIEF, ["playful"], 1) == {
+        "playful": {"headline": ["Run fast"], "body": ["Shoes that fly."], "cta": ["Go"]}
+    }
+
+
+def test_malformed_options_fall_back_to_demo_copy(monkeypatch):
+    demo = _demo_options(BRIEF, "playful")
+    for entry in ({"headline": "Run fast", "body": ["Shoes"], "cta": ["Go"]},  # a string, not a list
+                  {"headline": 7, "body": ["Shoes"], "cta": ["Go"]},
+                  {"headline": None, "body": ["Shoes"], "cta": ["Go"]},
+                  {"headline": [3, None], "body": ["Shoes"], "cta": ["Go"]},
+                  ["Run fast"]):
+        _completion(monkeypatch, {"playful": entry})
+        assert _generate_options_openai(BRIEF, ["playful"], 1) == {"playful": demo}
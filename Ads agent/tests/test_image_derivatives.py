@@ -0,0 +1,36 @@
+import pytest
+from PIL import Image, ImageDraw
+from agents.image_derivatives import smart_crop_box
+
+SOURCES = [(1024, 1024), (1792, 1024), (1024, 1792), (640, 480), (3, 2000), (2000, 3), (1, 1)]
+TARGETS = [(1080, 1080), (1200, 628), (1080, 1920), (1500, 500), (1, 1000)]
+
+
+def _noise(width: int, height: int) -> Image.Image:
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for i in range(0, max(width, height), 7):
+        draw.line((i, 0, 0, i), fill="black")
+    return image
+
+
+@pytest.mark.parametrize("mode", ["smart", "center"])
+@pytest.mark.parametrize("source", SOURCES)
+@pytest.mark.parametrize("target", TARGETS)
+def test_crop_box_stays_inside_the_image(mode, source, target):
+    left, top, right, bottom = smart_crop_box(_noise(*source), *target, mode=mode)
+    assert 0 <= left < right <= source[0]
+    assert 0 <= top < bottom <= source[1]
+    # Full width or full height: the largest box with the target ratio
+    assert right - left == source[0] or bottom - top == source[1]
+    if min(right - left, bottom - top) >= 100:
+        assert (right - left) / (bottom - top) == pytest.approx(target[0] / target[1], rel=0.02)
+
+
+def test_smart_crop_follows_the_detail():
+    image = Image.new("RGB", (1792, 1024), "white")
+    ImageDraw.Draw(image).rectangle((1500, 300, 1700, 700), outline="black", width=8)
+    left, top, right, bottom = smart_crop_box(image, 1080, 1080, mode="smart")
+    assert (top, bottom) == (0, 1024)
+    assert left <= 1500 and right >= 1700
+    assert smart_crop_box(image, 1080, 1080, mode="center")[0] == (1792 - 1024) // 2
@@ -0,0 +1,40 @@
+import time
+from agents import pipeline, design_agent
+from agents.platform_agent import adapt_for_platforms
+
+DALLE_URL = "https://oaidalleapiprodscus.blob.core.windows.net/a.png"
+BRIEF = {"product_name": "Zap", "description": "Running shoes", "audience": "Runners", "tone": "professional"}
+
+
+class _Store:
+    def __init__(self, urls):
+        self.urls = set(urls)
+
+    def get(self, url):
+        return {"path": "/blob"} if url in self.urls else None
+
+
+def _match(age: float, local: bool) -> dict:
+    image = {"url": DALLE_URL}
+    if local:
+        image["local_url"] = "/api/download-image?url=a"
+    return {"created_at": time.time() - age, "images": [image]}
+
+
+def test_images_past_the_dalle_expiry_need_a_local_copy(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_image_store", lambda: _Store([DALLE_URL]))
+    fresh = design_agent.IMAGE_CACHE_TTL / 2
+    stale = design_agent.IMAGE_CACHE_TTL + 60
+    assert pipeline._images_servable(_match(fresh, local=False))
+    assert not pipeline._images_servable(_match(stale, local=False))
+    assert pipeline._images_servable(_match(stale, local=True))
+
+    monkeypatch.setattr(pipeline, "get_image_store", lambda: _Store([]))
+    assert not pipeline._images_servable(_match(stale, local=True))
+
+
+def test_platform_mockups_use_the_local_copy():
+    images = [{"url": DALLE_URL, "local_url": "/api/download-image?url=a"}]
+    copy = {"headline": "Run", "body": "Fast shoes", "cta": "Buy"}
+    platforms = adapt_for_platforms(BRIEF, copy, images, ["instagram"])
+    assert platforms["instagram"]["primary_image"] == "/api/download-image?url=a"
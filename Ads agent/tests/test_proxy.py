@@ -0,0 +1,68 @@
+import json
+import asyncio
+import dataclasses
+import pytest
+import asgi
+import app as app_module
+from services import admission
+from services.admission import MemoryBuckets, RateLimiter
+
+BRIEF = {"product_name": "Zap", "description": "Running shoes", "audience": "Runners"}
+ROUTER = "10.1.2.3"
+
+
+@pytest.fixture
+def one_request_per_ip(monkeypatch):
+    """Behind one proxy, with an IP limit of a single request."""
+    behind_proxy = dataclasses.replace(app_module.config, proxy_hops=1)
+    monkeypatch.setattr(app_module, "config", behind_proxy)
+    monkeypatch.setattr(asgi, "config", behind_proxy)
+    monkeypatch.setattr(admission, "limiter", RateLimiter(MemoryBuckets(), user_limit=(0, 0), ip_limit=(0.6, 1)))
+
+
+def test_forwarded_clients_get_their_own_flask_buckets(one_request_per_ip):
+    client = app_module.create_app().test_client()
+
+    def generate(forwarded_for: str) -> int:
+        return client.post("/api/generate", json=BRIEF, environ_base={"REMOTE_ADDR": ROUTER},
+                           headers={"X-Forwarded-For": forwarded_for}).status_code
+
+    assert generate("203.0.113.1") == 200
+    assert generate("203.0.113.2") == 200
+    assert generate("203.0.113.1") == 429
+    # A client-supplied entry in front of the router's does not buy a new bucket
+    assert generate("198.51.100.9, 203.0.113.2") == 429
+
+
+def _native_generate(forwarded_for: str) -> int:
+    payload = json.dumps(BRIEF).encode()
+    scope = {"type": "http", "method": "POST", "path": "/api/generate", "query_string": b"", "http_version": "1.1",
+             "root_path": "", "scheme": "http", "server": ("testserver", 80), "client": (ROUTER, 1234),
+             "headers": [(b"content-type", b"application/json"), (b"x-forwarded-for", forwarded_for.encode())]}
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    statuses = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    asyncio.run(asgi.app(scope, receive, send))
+    return statuses[0]
+
+
+def test_forwarded_clients_get_their_own_native_buckets(one_request_per_ip):
+    assert _native_generate("203.0.113.1") == 200
+    assert _native_generate("203.0.113.2") == 200
+    assert _native_generate("203.0.113.1") == 429
+    assert _native_generate("198.51.100.9, 203.0.113.2") == 429
+
+
+def test_without_proxy_hops_the_peer_address_is_used(monkeypatch):
+    scope = {"client": (ROUTER, 1234), "headers": [(b"x-forwarded-for", b"203.0.113.1")]}
+    assert asgi._client_ip(scope) == ROUTER
+    monkeypatch.setattr(asgi, "config", dataclasses.replace(asgi.config, proxy_hops=1))
+    assert asgi._client_ip(scope) == "203.0.113.1"
+    assert asgi._client_ip({**scope, "headers": []}) == ROUTER
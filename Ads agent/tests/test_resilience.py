@@ -0,0 +1,64 @@
+import time
+import asyncio
+import pytest
+from agents import openai_client
+from services.resilience import CircuitBreaker, DeadlineExceeded, deadline
+
+
+def _half_open_breaker(monkeypatch, **kwargs) -> CircuitBreaker:
+    """A chat breaker whose cooldown is over, so its next allow() is the half-open probe."""
+    breaker = CircuitBreaker("openai-chat", min_calls=1, cooldown=0, **kwargs)
+    breaker._open()
+    monkeypatch.setitem(openai_client.breakers, "chat", breaker)
+    return breaker
+
+
+def test_failed_probe_reopens_and_successful_probe_closes():
+    breaker = CircuitBreaker("test", min_calls=1, cooldown=0)
+    breaker._open()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_hitting_the_deadline_releases_the_breaker(monkeypatch):
+    breaker = _half_open_breaker(monkeypatch)
+    with deadline(0), pytest.raises(DeadlineExceeded):
+        openai_client.call_openai("chat", "test", lambda client, timeout: "unreachable")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker._probing
+    assert breaker.allow()
+
+
+def test_cancelled_async_probe_releases_the_breaker(monkeypatch):
+    breaker = _half_open_breaker(monkeypatch)
+
+    async def hang(client, timeout):
+        await asyncio.sleep(3600)
+
+    async def main():
+        task = asyncio.ensure_future(openai_client.call_openai_async("chat", "test", hang))
+        await asyncio.sleep(0.05)
+        assert breaker._probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert not breaker._probing
+    assert breaker.allow()
+
+
+def test_lost_probe_expires():
+    breaker = CircuitBreaker("test", min_calls=1, cooldown=0, probe_timeout=0.05)
+    breaker._open()
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
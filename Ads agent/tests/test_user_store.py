@@ -0,0 +1,46 @@
+import time
+import threading
+from services.user_store import UserStore
+
+
+def _user(i: int) -> dict:
+    return {"email": f"user{i}@example.com", "name": f"User {i}", "last_login": f"2026-01-01T00:00:{i:02d}Z"}
+
+
+def test_concurrent_saves_share_transactions(tmp_path):
+    store = UserStore(str(tmp_path / "users.sqlite3"))
+    batches = []
+    first_write = threading.Event()
+    release_first = threading.Event()
+    upsert_users = store.upsert_users
+
+    def recording_upsert(users):
+        batches.append(len(users))
+        first_write.set()
+        # Hold the first transaction until every other login is queued behind it
+        release_first.wait(5)
+        return upsert_users(users)
+
+    store.upsert_users = recording_upsert
+    threads = [threading.Thread(target=store.save, args=(_user(0),))]
+    threads[0].start()
+    assert first_write.wait(5)
+    threads += [threading.Thread(target=store.save, args=(_user(i),)) for i in range(1, 20)]
+    for thread in threads[1:]:
+        thread.start()
+    while len(store._pending) < 19:
+        time.sleep(0.005)
+    release_first.set()
+    for thread in threads:
+        thread.join()
+
+    assert batches == [1, 19]
+    assert len(store.list_users(limit=50)[0]) == 20
+
+
+def test_save_is_visible_on_return_and_keeps_the_latest_login(tmp_path):
+    store = UserStore(str(tmp_path / "users.sqlite3"))
+    store.save(_user(1))
+    assert store.get("user1@example.com")["name"] == "User 1"
+    store.save({**_user(1), "name": "Renamed"})
+    assert store.get("user1@example.com")["name"] == "Renamed"
@@ -0,0 +1,34 @@
+import io
+import os
+import zipfile
+from services.zip_stream import stream_zip
+
+
+def test_round_trip_through_zipfile(tmp_path):
+    big = os.urandom(300 * 1024)
+    path = tmp_path / "image.jpg"
+    path.write_bytes(big)
+    entries = [
+        ("campaign.json", '{"headline": "Cold for 24 hours ❄️"}'.encode("utf-8"), True),
+        ("copy.csv", b"tone,headline\r\n" * 1000, True),
+        ("images/image-1.jpg", str(path), False),
+        ("empty.txt", b"", True),
+    ]
+    chunks = list(stream_zip(entries, chunk_size=64 * 1024))
+
+    # The file is copied a chunk at a time rather than in one piece
+    assert len(chunks) > 4
+    assert max(len(chunk) for chunk in chunks[:-1]) < 2 * 64 * 1024
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [name for name, _, _ in entries]
+        assert archive.read("images/image-1.jpg") == big
+        assert archive.read("copy.csv") == b"tone,headline\r\n" * 1000
+        assert archive.read("empty.txt") == b""
+        assert archive.getinfo("images/image-1.jpg").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("copy.csv").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_empty_archive():
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([])))) as archive:
+        assert archive.namelist() == []